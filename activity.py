@@ -0,0 +1,197 @@
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from itertools import islice
+import pyodbc
+from database import get_db_connection
+from config import ACTIVITY_BUFFER_SIZE, ACTIVITY_FLUSH_INTERVAL, ACTIVITY_FLUSH_BATCH
+
+logger = logging.getLogger(__name__)
+
+# Longitudes de las columnas de eventos_actividad (migración 0004)
+_MAX_NOMBRE = 150
+_MAX_DETALLES = 300
+
+
+def _clip(value, length):
+    if value is None:
+        return None
+    value = str(value)
+    return value if len(value) <= length else value[:length - 1] + '…'
+
+
+class ActivityLog:
+    """Registro de actividad de solo anexado para el panel de administración.
+
+    Las escrituras de los blueprints llaman a record() después del commit: el
+    evento entra en un búfer circular en memoria (los N más recientes) y en
+    una cola que un hilo en segundo plano vuelca por lotes a la tabla
+    eventos_actividad. recent() lee del búfer sin consultar la base de datos;
+    la primera lectura lo completa con el historial de la tabla. Cada proceso
+    ve sus propios eventos más el historial que había al arrancar.
+    """
+
+    def __init__(self, capacity=None, flush_interval=None, batch_size=None):
+        self._capacity = capacity or ACTIVITY_BUFFER_SIZE
+        self._flush_interval = flush_interval or ACTIVITY_FLUSH_INTERVAL
+        self._batch_size = batch_size or ACTIVITY_FLUSH_BATCH
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._events = deque(maxlen=self._capacity)
+        self._pending = deque(maxlen=self._capacity)
+        self._wake = threading.Event()
+        self._thread = None
+        self._warmed = False
+        # Los eventos de la tabla posteriores a este instante son de este proceso
+        self._started_at = datetime.now().replace(microsecond=0)
+        self.recorded = 0
+        self.flushed = 0
+        self.flush_errors = 0
+        self.dropped = 0
+
+    def record(self, tipo, accion, id_entidad, nombre=None, detalles=None):
+        """Anexa un evento; no accede a la base de datos"""
+        event = (
+            tipo, accion, id_entidad,
+            _clip(nombre, _MAX_NOMBRE), _clip(detalles, _MAX_DETALLES),
+            datetime.now().replace(microsecond=0)
+        )
+        with self._lock:
+            self._events.append(event)
+            self._pending.append(event)
+            self.recorded += 1
+            pending = len(self._pending)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='activity-flush', daemon=True)
+                self._thread.start()
+        if pending >= self._batch_size:
+            self._wake.set()
+
+    def recent(self, limit=10):
+        """Los limit eventos más recientes, del más nuevo al más viejo"""
+        if not self._warmed:
+            self._warm()
+        with self._lock:
+            events = list(islice(reversed(self._events), max(0, limit)))
+        return [_format_event(event) for event in events]
+
+    def flush(self):
+        """Escribe en la tabla los eventos pendientes; devuelve cuántos se guardaron"""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+                self._pending.clear()
+            if not batch:
+                return 0
+
+            conn = get_db_connection()
+            try:
+                if not conn:
+                    raise ConnectionError("No se pudo conectar a la base de datos")
+                cursor = conn.cursor()
+                try:
+                    cursor.fast_executemany = True
+                    cursor.executemany("""
+                        INSERT INTO eventos_actividad
+                            (tipo, accion, id_entidad, nombre, detalles, fecha_evento)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, batch)
+                finally:
+                    cursor.close()
+                conn.commit()
+            except (pyodbc.Error, ConnectionError) as e:
+                if conn:
+                    conn.rollback()
+                with self._lock:
+                    # Se reintentan en el próximo volcado delante de los que
+                    # llegaron mientras tanto. Si no caben se descartan los más
+                    # viejos del lote (siguen en el búfer en memoria); extendleft
+                    # sobre la cola llena descartaría los más nuevos
+                    room = self._capacity - len(self._pending)
+                    keep = batch[len(batch) - room:] if room > 0 else []
+                    self._pending.extendleft(reversed(keep))
+                    self.dropped += len(batch) - len(keep)
+                    self.flush_errors += 1
+                logger.warning(f"No se pudieron guardar {len(batch)} eventos de actividad: {str(e)}")
+                return 0
+            finally:
+                if conn:
+                    conn.close()
+
+            with self._lock:
+                self.flushed += len(batch)
+            return len(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'buffered': len(self._events),
+                'capacity': self._capacity,
+                'pending': len(self._pending),
+                'recorded': self.recorded,
+                'flushed': self.flushed,
+                'flush_errors': self.flush_errors,
+                'dropped': self.dropped
+            }
+
+    def _run(self):
+        while True:
+            self._wake.wait(self._flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _warm(self):
+        """Completa el búfer con los eventos guardados antes de arrancar el proceso"""
+        conn = get_db_connection()
+        if not conn:
+            # Igual que un error de consulta: no se reintenta en cada lectura
+            # del panel, que esperaría una conexión del pool cada vez
+            logger.warning("No se pudo cargar el historial de actividad: sin conexión a la base de datos")
+            with self._lock:
+                self._warmed = True
+            return
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT TOP (?) tipo, accion, id_entidad, nombre, detalles, fecha_evento
+                    FROM eventos_actividad
+                    WHERE fecha_evento < ?
+                    ORDER BY id_evento DESC
+                """, (self._capacity, self._started_at))
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        except pyodbc.Error as e:
+            logger.warning(f"No se pudo cargar el historial de actividad: {str(e)}")
+            rows = []
+        finally:
+            conn.close()
+
+        with self._lock:
+            if self._warmed:
+                return
+            # Las filas llegan de la más nueva a la más vieja: van delante de
+            # los eventos de este proceso, sin pasar de la capacidad
+            room = self._capacity - len(self._events)
+            for row in rows[:room]:
+                self._events.appendleft(tuple(row))
+            self._warmed = True
+
+
+def _format_event(event):
+    tipo, accion, id_entidad, nombre, detalles, fecha = event
+    return {
+        'id': id_entidad,
+        'type': tipo,
+        'action': accion,
+        'name': nombre or f"{tipo} {id_entidad}",
+        'details': detalles,
+        'date': fecha.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+activity_log = ActivityLog()
+atexit.register(activity_log.flush)
@@ -2,6 +2,9 @@ from flask import Flask
 import logging
 import os
 from flask_cors import CORS
+import instrumentation
+from config import PATIENT_SEARCH_WARM
+from patient_search import patient_search
 
 
 # Import blueprints
@@ -13,6 +16,7 @@ from doctors import doctors_bp
 from patients import patients_bp
 from appointments import appointments_bp
 from schedules import schedules_bp
+from batch import batch_bp
 def create_app():
     app = Flask(__name__, template_folder='templates', static_folder='static')
     
@@ -32,6 +36,9 @@ def create_app():
         ]
     )
     
+    # Medición de consultas SQL por petición
+    instrumentation.init_app(app)
+    
     # Register blueprints
     app.register_blueprint(views_bp)
     app.register_blueprint(auth_bp)
@@ -41,6 +48,11 @@ def create_app():
     app.register_blueprint(patients_bp)
     app.register_blueprint(appointments_bp)
     app.register_blueprint(schedules_bp)
+    app.register_blueprint(batch_bp)
+    
+    # Índice de /api/pacientes/buscar: se carga sin esperar a la primera búsqueda
+    if PATIENT_SEARCH_WARM:
+        patient_search.warm()
     
     return app
 
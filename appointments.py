@@ -3,6 +3,10 @@ import pyodbc
 import logging
 import datetime
 from database import get_db_connection
+from booking import book_appointment, BookingError
+from activity import activity_log
+from availability import available_minutes, earliest_slots, to_hhmm
+from config import APPOINTMENT_SLOT_MINUTES
 
 appointments_bp = Blueprint('appointments', __name__)
 
@@ -12,6 +16,11 @@ def get_horarios_disponibles(id_medico):
     fecha = request.args.get('fecha')
     if not fecha:
         return jsonify({'error': 'Fecha no proporcionada'}), 400
+
+    try:
+        fecha_consulta = datetime.datetime.strptime(fecha, '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido'}), 400
         
     conn = get_db_connection()
     if not conn:
@@ -19,19 +28,17 @@ def get_horarios_disponibles(id_medico):
         
     try:
         with conn.cursor() as cursor:
-            # Obtener horario laboral del médico
+            # Todos los bloques de horario del médico para ese día (1=Lunes ... 7=Domingo)
             cursor.execute("""
                 SELECT hora_inicio, hora_fin 
                 FROM horarios_disponibles 
-                WHERE id_medico = ? AND dia_semana = DATENAME(WEEKDAY, ?)
-            """, (id_medico, fecha))
+                WHERE id_medico = ? AND dia_semana = ?
+                ORDER BY hora_inicio
+            """, (id_medico, fecha_consulta.isoweekday()))
             
-            horario = cursor.fetchone()
-            if not horario:
+            bloques = [(row[0], row[1]) for row in cursor.fetchall()]
+            if not bloques:
                 return jsonify({'error': 'El médico no trabaja ese día'}), 400
-                
-            hora_inicio = horario[0]
-            hora_fin = horario[1]
             
             # Obtener citas existentes para ese médico y fecha
             cursor.execute("""
@@ -39,17 +46,18 @@ def get_horarios_disponibles(id_medico):
                 FROM citas 
                 WHERE id_medico = ? AND fecha_cita = ?
                 ORDER BY hora_cita
-            """, (id_medico, fecha))
+            """, (id_medico, fecha_consulta))
             
             citas_existentes = [row[0] for row in cursor.fetchall()]
             
-            # Generar franjas horarias disponibles (cada 30 minutos)
-            horarios_disponibles = []
-            hora_actual = hora_inicio
-            while hora_actual < hora_fin:
-                if hora_actual not in citas_existentes:
-                    horarios_disponibles.append(hora_actual.strftime('%H:%M'))
-                hora_actual = (datetime.datetime.min + (hora_actual - datetime.datetime.min) + datetime.timedelta(minutes=30)).time()
+            # Franjas libres: bloques menos citas; hoy solo las que no han pasado
+            desde = None
+            if fecha_consulta == datetime.date.today():
+                desde = datetime.datetime.now().time()
+            horarios_disponibles = [
+                to_hhmm(inicio)
+                for inicio in available_minutes(bloques, citas_existentes, after=desde)
+            ]
             
             return jsonify(horarios_disponibles)
     except pyodbc.Error as e:
@@ -58,6 +66,95 @@ def get_horarios_disponibles(id_medico):
     finally:
         conn.close()
 
+# Rango máximo de días y resultados de la búsqueda de primeras franjas libres
+MAX_DIAS_BUSQUEDA = 62
+MAX_RESULTADOS_BUSQUEDA = 100
+MAX_DURACION_BUSQUEDA = 240
+
+# Endpoint para buscar las primeras franjas libres entre todos los médicos activos
+@appointments_bp.route('/api/citas/primeras-disponibles', methods=['GET'])
+def buscar_primeras_disponibles():
+    """Primeras franjas libres por especialidad en un rango de fechas.
+
+    Parámetros: especialidad (opcional), desde y hasta (YYYY-MM-DD; por
+    defecto hoy y 14 días después), duracion en minutos y limite.
+    """
+    especialidad = request.args.get('especialidad') or None
+    try:
+        hoy = datetime.date.today()
+        desde = request.args.get('desde')
+        desde = datetime.datetime.strptime(desde, '%Y-%m-%d').date() if desde else hoy
+        hasta = request.args.get('hasta')
+        hasta = datetime.datetime.strptime(hasta, '%Y-%m-%d').date() if hasta else desde + datetime.timedelta(days=14)
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido'}), 400
+
+    desde = max(desde, hoy)
+    if hasta < desde:
+        return jsonify({'error': 'El rango de fechas no es válido'}), 400
+    if (hasta - desde).days >= MAX_DIAS_BUSQUEDA:
+        return jsonify({'error': f'El rango no puede superar {MAX_DIAS_BUSQUEDA} días'}), 400
+
+    duracion = request.args.get('duracion', APPOINTMENT_SLOT_MINUTES, type=int)
+    if not duracion or duracion < 0 or duracion % APPOINTMENT_SLOT_MINUTES:
+        return jsonify({'error': f'La duración debe ser un múltiplo positivo de {APPOINTMENT_SLOT_MINUTES} minutos'}), 400
+    if duracion > MAX_DURACION_BUSQUEDA:
+        return jsonify({'error': f'La duración no puede superar {MAX_DURACION_BUSQUEDA} minutos'}), 400
+    limite = request.args.get('limite', 10, type=int) or 10
+    limite = max(1, min(limite, MAX_RESULTADOS_BUSQUEDA))
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+
+    try:
+        filtro = "m.estado = 'A'"
+        params = []
+        if especialidad:
+            filtro += " AND m.especialidad = ?"
+            params.append(especialidad)
+
+        with conn.cursor() as cursor:
+            # Una sola ida y vuelta: horarios de los médicos y sus citas del rango
+            cursor.execute(f"""
+                SELECT m.id_medico, m.nombre_completo, m.especialidad,
+                       h.dia_semana, h.hora_inicio, h.hora_fin
+                FROM medicos m
+                JOIN horarios_disponibles h ON h.id_medico = m.id_medico
+                WHERE {filtro};
+
+                SELECT c.id_medico, c.fecha_cita, c.hora_cita
+                FROM citas c
+                JOIN medicos m ON m.id_medico = c.id_medico
+                WHERE {filtro} AND c.fecha_cita BETWEEN ? AND ?
+            """, params + params + [desde, hasta])
+
+            medicos = {}
+            horarios = {}
+            for row in cursor.fetchall():
+                medicos[row[0]] = {'nombre_completo': row[1], 'especialidad': row[2]}
+                horarios.setdefault(row[0], {}).setdefault(int(row[3]), []).append((row[4], row[5]))
+
+            citas = {}
+            if cursor.nextset():
+                for row in cursor.fetchall():
+                    citas.setdefault((row[0], row[1]), []).append(row[2])
+
+        franjas = earliest_slots(horarios, citas, desde, hasta, limite, duracion,
+                                 now=datetime.datetime.now())
+        return jsonify([{
+            'id_medico': id_medico,
+            'nombre_completo': medicos[id_medico]['nombre_completo'],
+            'especialidad': medicos[id_medico]['especialidad'],
+            'fecha': fecha.strftime('%Y-%m-%d'),
+            'hora': to_hhmm(inicio)
+        } for fecha, inicio, id_medico in franjas])
+    except pyodbc.Error as e:
+        logging.error(f"Error en base de datos: {str(e)}")
+        return jsonify({'error': 'Error al buscar horarios disponibles'}), 500
+    finally:
+        conn.close()
+
 # Endpoint para crear nueva cita
 @appointments_bp.route('/api/citas', methods=['POST'])
 def crear_cita():
@@ -74,7 +171,7 @@ def crear_cita():
             return jsonify({'error': 'No se pueden programar citas en fechas pasadas'}), 400
             
         # Validar formato de hora
-        datetime.datetime.strptime(data['hora_cita'], '%H:%M')
+        hora_cita = datetime.datetime.strptime(data['hora_cita'], '%H:%M').time()
     except ValueError as e:
         return jsonify({'error': 'Formato de fecha u hora inválido'}), 400
         
@@ -83,47 +180,28 @@ def crear_cita():
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
         
     try:
-        with conn.cursor() as cursor:
-            # Verificar disponibilidad del médico
-            cursor.execute("""
-                SELECT 1 
-                FROM citas 
-                WHERE id_medico = ? AND fecha_cita = ? AND hora_cita = ?
-            """, (data['id_medico'], data['fecha_cita'], data['hora_cita']))
-            
-            if cursor.fetchone():
-                return jsonify({'error': 'El médico ya tiene una cita programada en ese horario'}), 400
-                
-            # Insertar nueva cita
-            cursor.execute("""
-                INSERT INTO citas (
-                    id_medico, 
-                    id_paciente, 
-                    fecha_cita, 
-                    hora_cita, 
-                    motivo_consulta,
-                    fecha_creacion
-                ) VALUES (?, ?, ?, ?, ?, GETDATE())
-            """, (
-                data['id_medico'],
-                data['id_paciente'],
-                data['fecha_cita'],
-                data['hora_cita'],
-                data['motivo_consulta']
-            ))
-            
-            conn.commit()
-            
-            # Obtener ID de la nueva cita
-            cursor.execute("SELECT SCOPE_IDENTITY()")
-            cita_id = cursor.fetchone()[0]
-            
-            return jsonify({
-                'message': 'Cita programada exitosamente',
-                'cita_id': cita_id
-            }), 201
+        # Reserva atómica: valida el horario del médico y la franja libre
+        # en la misma sentencia INSERT
+        cita_id = book_appointment(
+            conn,
+            data['id_medico'],
+            data['id_paciente'],
+            fecha_cita,
+            hora_cita,
+            data['motivo_consulta']
+        )
+        activity_log.record(
+            'Cita', 'programada', cita_id, f"Cita {cita_id}",
+            f"Paciente {data['id_paciente']}, Médico {data['id_medico']}, "
+            f"{fecha_cita.isoformat()} {hora_cita.strftime('%H:%M')}"
+        )
+        return jsonify({
+            'message': 'Cita programada exitosamente',
+            'cita_id': cita_id
+        }), 201
+    except BookingError as e:
+        return jsonify({'error': str(e)}), 400
     except pyodbc.Error as e:
-        conn.rollback()
         logging.error(f"Error en base de datos: {str(e)}")
         return jsonify({'error': 'Error al programar la cita'}), 500
     finally:
@@ -2,30 +2,35 @@ from flask import Blueprint, request, jsonify, url_for
 import pyodbc
 import logging
 from database import get_db_connection
+from reference_cache import ReferenceCache
+from http_cache import not_modified, with_etag
+from activity import activity_log
 from werkzeug.security import generate_password_hash, check_password_hash
 
 auth_bp = Blueprint('auth', __name__)
 
+def _load_roles(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id_rol, nombre_rol FROM roles ORDER BY id_rol")
+        return [{'id_rol': r[0], 'nombre_rol': r[1]} for r in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+# Los roles casi nunca cambian: se sirven desde memoria
+roles_cache = ReferenceCache('roles', _load_roles)
+
 # API to get roles
 @auth_bp.route('/api/roles', methods=['GET'])
 def get_roles():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-        
-    cursor = None
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id_rol, nombre_rol FROM roles ORDER BY id_rol")
-        roles = cursor.fetchall()
-        
-        return jsonify([{'id_rol': r[0], 'nombre_rol': r[1]} for r in roles])
+        roles, etag = roles_cache.entry()
+        return not_modified(request, etag) or with_etag(jsonify(roles), etag)
+    except ConnectionError:
+        return jsonify({'error': 'Database connection failed'}), 500
     except pyodbc.Error as e:
         logging.error(f"Database error in get_roles: {str(e)}")
         return jsonify({'error': 'Failed to fetch roles'}), 500
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
 # API for registration
 @auth_bp.route('/api/register', methods=['POST'])
@@ -79,6 +84,7 @@ def register():
         # Insertar nuevo usuario
         cursor.execute("""
             INSERT INTO usuarios (nombre_completo, usuario_login, contraseña, id_rol)
+            OUTPUT INSERTED.id_usuario
             VALUES (?, ?, ?, ?)
         """, (
             data['nombre_completo'], 
@@ -86,8 +92,10 @@ def register():
             hashed_password, 
             data['id_rol']
         ))
+        user_id = cursor.fetchone()[0]
         
         conn.commit()
+        activity_log.record('Usuario', 'registrado', user_id, data['nombre_completo'])
         
         return jsonify({
             'message': 'Usuario registrado exitosamente',
@@ -0,0 +1,196 @@
+"""Cálculo de franjas libres de un médico para un día.
+
+Módulo puro (sin Flask ni base de datos): recibe los bloques de
+horarios_disponibles del día y las horas de las citas ya reservadas y
+devuelve las horas de inicio libres. Las horas se manejan como minutos desde
+medianoche y la disponibilidad del día se guarda en un entero usado como
+mapa de bits (bit i = minuto i libre), de modo que comprobar una franja es
+una operación de desplazamiento y máscara en lugar de recorrer listas.
+"""
+import datetime
+import heapq
+import itertools
+from config import APPOINTMENT_SLOT_MINUTES
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def to_minutes(value):
+    """Minutos desde medianoche de un time (o 'HH:MM')"""
+    if isinstance(value, str):
+        value = datetime.datetime.strptime(value, '%H:%M').time()
+    return value.hour * 60 + value.minute
+
+
+def to_time(minutes):
+    return datetime.time(minutes // 60, minutes % 60)
+
+
+def to_hhmm(minutes):
+    """Texto 'HH:MM' de unos minutos desde medianoche"""
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def merge(intervals):
+    """Une intervalos [inicio, fin) solapados o contiguos; devuelve lista ordenada"""
+    merged = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [tuple(item) for item in merged]
+
+
+def subtract(intervals, removals):
+    """Resta los intervalos removals de intervals (ambos [inicio, fin))"""
+    removals = merge(removals)
+    result = []
+    index = 0
+    for start, end in merge(intervals):
+        # Saltar las restas que terminan antes del intervalo
+        while index < len(removals) and removals[index][1] <= start:
+            index += 1
+        current = start
+        position = index
+        while position < len(removals) and removals[position][0] < end:
+            cut_start, cut_end = removals[position]
+            if cut_start > current:
+                result.append((current, cut_start))
+            current = max(current, cut_end)
+            position += 1
+        if current < end:
+            result.append((current, end))
+    return result
+
+
+def _mask(start, end):
+    return ((1 << (end - start)) - 1) << start
+
+
+class DayBitmap:
+    """Disponibilidad de un día como mapa de bits de 1440 minutos"""
+
+    __slots__ = ('bits',)
+
+    def __init__(self, intervals=()):
+        self.bits = 0
+        for start, end in intervals:
+            self.add(start, end)
+
+    def add(self, start, end):
+        if start < end:
+            self.bits |= _mask(max(start, 0), min(end, MINUTES_PER_DAY))
+
+    def remove(self, start, end):
+        if start < end:
+            self.bits &= ~_mask(max(start, 0), min(end, MINUTES_PER_DAY))
+
+    def is_free(self, start, end):
+        if start < 0 or end > MINUTES_PER_DAY:
+            return False
+        mask = _mask(start, end)
+        return self.bits & mask == mask
+
+    def intervals(self):
+        """Intervalos [inicio, fin) libres reconstruidos del mapa"""
+        result = []
+        bits = self.bits
+        offset = 0
+        while bits:
+            # Saltar ceros: posición del bit menos significativo a 1
+            skip = (bits & -bits).bit_length() - 1
+            bits >>= skip
+            offset += skip
+            # Longitud del tramo de unos
+            run = (~bits & (bits + 1)).bit_length() - 1
+            result.append((offset, offset + run))
+            bits >>= run
+            offset += run
+        return result
+
+
+def free_intervals(blocks, booked, appointment_minutes=None):
+    """Intervalos libres del día: bloques de horario menos citas reservadas.
+
+    blocks son pares (hora_inicio, hora_fin) y booked horas de inicio de
+    cita; cada cita ocupa appointment_minutes.
+    """
+    appointment_minutes = appointment_minutes or APPOINTMENT_SLOT_MINUTES
+    work = [(to_minutes(start), to_minutes(end)) for start, end in blocks]
+    busy = []
+    for hora in booked:
+        start = to_minutes(hora)
+        busy.append((start, start + appointment_minutes))
+    return subtract(work, busy)
+
+
+def available_minutes(blocks, booked, slot_minutes=None, appointment_minutes=None, after=None,
+                      step_minutes=None):
+    """Inicios libres en minutos desde medianoche, ordenados.
+
+    Las franjas de slot_minutes se generan cada step_minutes (por defecto
+    slot_minutes) desde el inicio de cada bloque, la misma rejilla que acepta
+    booking.book_appointment, y se descartan las que se solapan con una cita.
+    after (time) excluye las franjas que empiezan antes de esa hora, p. ej.
+    para el día de hoy.
+    """
+    slot_minutes = slot_minutes or APPOINTMENT_SLOT_MINUTES
+    step_minutes = step_minutes or slot_minutes
+    bits = DayBitmap(free_intervals(blocks, booked, appointment_minutes)).bits
+    slot_mask = (1 << slot_minutes) - 1
+    earliest = to_minutes(after) if after is not None else 0
+
+    starts = set()
+    for block_start, block_end in ((to_minutes(s), to_minutes(e)) for s, e in blocks):
+        first = block_start
+        if earliest > block_start:
+            # Primera franja de la rejilla del bloque que no haya pasado
+            first += -(-(earliest - block_start) // step_minutes) * step_minutes
+        for start in range(first, block_end - slot_minutes + 1, step_minutes):
+            if (bits >> start) & slot_mask == slot_mask:
+                starts.add(start)
+    return sorted(starts)
+
+
+def available_slots(blocks, booked, slot_minutes=None, appointment_minutes=None, after=None):
+    """Igual que available_minutes pero con datetime.time"""
+    return [to_time(start) for start in
+            available_minutes(blocks, booked, slot_minutes, appointment_minutes, after)]
+
+
+def _doctor_slots(id_medico, weekly_blocks, booked, days, slot_minutes, now):
+    """Franjas libres de un médico en orden (fecha, minuto, id_medico)"""
+    for fecha in days:
+        blocks = weekly_blocks.get(fecha.isoweekday())
+        if not blocks:
+            continue
+        after = None
+        if now is not None:
+            if fecha < now.date():
+                continue
+            if fecha == now.date():
+                after = now.time()
+        citas = booked.get((id_medico, fecha), ())
+        for start in available_minutes(blocks, citas, slot_minutes, after=after,
+                                       step_minutes=APPOINTMENT_SLOT_MINUTES):
+            yield fecha, start, id_medico
+
+
+def earliest_slots(schedules, booked, start_date, end_date, limit, slot_minutes=None, now=None):
+    """Primeras franjas libres entre varios médicos en un rango de fechas.
+
+    schedules es {id_medico: {dia_semana: [(hora_inicio, hora_fin), ...]}} y
+    booked {(id_medico, fecha): [hora_cita, ...]}, tal como salen de una sola
+    lectura de la base de datos. Cada médico produce sus franjas en orden y
+    heapq.merge las intercala, así que solo se calculan los días necesarios
+    para llegar a limit. Devuelve una lista de (fecha, minutos, id_medico).
+    """
+    days = [start_date + datetime.timedelta(days=offset)
+            for offset in range((end_date - start_date).days + 1)]
+    streams = [_doctor_slots(id_medico, weekly, booked, days, slot_minutes, now)
+               for id_medico, weekly in schedules.items()]
+    return list(itertools.islice(heapq.merge(*streams), limit))
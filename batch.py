@@ -0,0 +1,139 @@
+from flask import Blueprint, request, jsonify, current_app, Response
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.test import EnvironBuilder
+from database import shared_connection
+from config import BATCH_MAX_REQUESTS, BATCH_MAX_WORKERS
+
+batch_bp = Blueprint('batch', __name__)
+logger = logging.getLogger(__name__)
+
+# Hilos para atender subpeticiones en paralelo; distinto del de fanout para
+# que un endpoint que use fan_out dentro de un lote no espere por sí mismo
+_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix='batch')
+
+# Cabeceras de la petición original que no pasan a las subpeticiones GET
+_SKIPPED_HEADERS = ('content-type', 'content-length')
+
+# Cabeceras de cada subrespuesta que se devuelven al cliente
+_RETURNED_HEADERS = ('ETag', 'Cache-Control', 'X-Cache')
+
+
+class BatchRequestError(ValueError):
+    """Lote mal formado"""
+
+
+def _parse_batch(data):
+    """Lista de subpeticiones [(id, ruta, cabeceras)] y si se atienden en paralelo"""
+    parallel = True
+    items = data
+    if isinstance(data, dict):
+        items = data.get('requests')
+        parallel = bool(data.get('parallel', True))
+    if not isinstance(items, list) or not items:
+        raise BatchRequestError('Se requiere una lista de subpeticiones en "requests"')
+    if len(items) > BATCH_MAX_REQUESTS:
+        raise BatchRequestError(f'Máximo {BATCH_MAX_REQUESTS} subpeticiones por lote')
+
+    parsed = []
+    for position, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'path': item}
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise BatchRequestError(f'Subpetición {position}: falta "path"')
+        path = item['path']
+        if not path.startswith('/api/') or path.startswith('/api/batch'):
+            raise BatchRequestError(f'Subpetición {position}: ruta no permitida')
+        if str(item.get('method', 'GET')).upper() != 'GET':
+            raise BatchRequestError(f'Subpetición {position}: solo se admiten subpeticiones GET')
+        headers = item.get('headers') or {}
+        if not isinstance(headers, dict):
+            raise BatchRequestError(f'Subpetición {position}: "headers" debe ser un objeto')
+        parsed.append((item.get('id', position), path, headers))
+    return parsed, parallel
+
+
+def _dispatch(app, base_url, base_headers, item):
+    """Atiende una subpetición dentro de la aplicación; devuelve su JSON ya serializado"""
+    item_id, path, headers = item
+    builder = EnvironBuilder(
+        path=path, base_url=base_url, method='GET',
+        headers={**base_headers, **{str(k): str(v) for k, v in headers.items()}}
+    )
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+
+    # Contexto de aplicación propio: g (y la medición de SQL) es de la subpetición
+    with app.app_context(), app.request_context(environ):
+        try:
+            response = app.full_dispatch_request()
+        except Exception as e:
+            logger.exception(f"Error en la subpetición {path}: {str(e)}")
+            response = jsonify({'error': 'Error interno del servidor'})
+            response.status_code = 500
+        try:
+            body = response.get_data(as_text=True)
+        finally:
+            response.close()
+
+    if not body:
+        body_json = 'null'
+    elif response.mimetype == 'application/json':
+        # El cuerpo ya es JSON: se inserta tal cual, sin volver a serializarlo
+        body_json = body
+    else:
+        body_json = json.dumps(body, ensure_ascii=False)
+
+    returned = {name: response.headers[name] for name in _RETURNED_HEADERS if name in response.headers}
+    head = json.dumps({'id': item_id, 'status': response.status_code, 'headers': returned},
+                      ensure_ascii=False, default=str)
+    return head[:-1] + ',"body":' + body_json + '}'
+
+
+def _dispatch_group(app, base_url, base_headers, group):
+    # Todas las subpeticiones del grupo comparten un único checkout del pool
+    with shared_connection():
+        return [_dispatch(app, base_url, base_headers, item) for item in group]
+
+
+# API para agrupar varias peticiones GET en un solo viaje
+@batch_bp.route('/api/batch', methods=['POST'])
+def batch():
+    """Atiende una lista de subpeticiones GET a rutas /api/ y devuelve todas las respuestas.
+
+    Cuerpo: {"requests": [{"id": "stats", "path": "/api/admin/stats",
+    "headers": {"If-None-Match": "..."}}, ...], "parallel": true}. Las
+    subpeticiones pasan por los mismos hooks que una petición normal y
+    reciben las cabeceras de la original (cookies de sesión incluidas). En
+    paralelo se reparten entre BATCH_MAX_WORKERS hilos; cada hilo usa una
+    sola conexión para todas las suyas. Con "parallel": false se atienden en
+    orden con una única conexión.
+    """
+    try:
+        items, parallel = _parse_batch(request.get_json(silent=True))
+    except BatchRequestError as e:
+        return jsonify({'error': str(e)}), 400
+
+    app = current_app._get_current_object()
+    base_url = request.url_root
+    base_headers = {
+        name: value for name, value in request.headers.items()
+        if name.lower() not in _SKIPPED_HEADERS
+    }
+
+    workers = min(BATCH_MAX_WORKERS, len(items)) if parallel else 1
+    if workers <= 1:
+        results = _dispatch_group(app, base_url, base_headers, items)
+    else:
+        groups = [items[i::workers] for i in range(workers)]
+        futures = [_executor.submit(_dispatch_group, app, base_url, base_headers, group) for group in groups]
+        grouped = [future.result() for future in futures]
+        # Se devuelven en el orden en que llegaron
+        results = [None] * len(items)
+        for i, group_results in enumerate(grouped):
+            results[i::workers] = group_results
+
+    return Response('{"responses":[' + ','.join(results) + ']}', mimetype='application/json')
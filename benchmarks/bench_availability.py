@@ -0,0 +1,74 @@
+"""Micro-benchmark de availability.available_slots.
+
+Compara el cálculo anterior de /api/medicos/<id>/horarios (pasos con
+timedelta y búsqueda lineal en la lista de citas, aplicado aquí a todos los
+bloques del día para que ambos hagan el mismo trabajo) con el motor de
+intervalos y mapa de bits, para distintas duraciones de franja. No necesita
+base de datos.
+
+Uso:
+    python benchmarks/bench_availability.py [--repeat 2000]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from availability import available_minutes, to_hhmm  # noqa: E402
+
+
+def legacy_slots(hora_inicio, hora_fin, citas_existentes, minutes):
+    """Algoritmo anterior del endpoint para un bloque"""
+    horarios = []
+    hora_actual = hora_inicio
+    while hora_actual < hora_fin:
+        if hora_actual not in citas_existentes:
+            horarios.append(hora_actual.strftime('%H:%M'))
+        hora_actual = (datetime.datetime.min + (
+            datetime.datetime.combine(datetime.date.min, hora_actual) - datetime.datetime.min
+        ) + datetime.timedelta(minutes=minutes)).time()
+    return horarios
+
+
+def build_day(slot_minutes, occupancy):
+    """Mañana y tarde de trabajo con una fracción de franjas reservadas"""
+    blocks = [(datetime.time(7, 0), datetime.time(12, 0)), (datetime.time(13, 0), datetime.time(19, 0))]
+    grid = []
+    for start, end in blocks:
+        current = datetime.datetime.combine(datetime.date.today(), start)
+        limit = datetime.datetime.combine(datetime.date.today(), end)
+        while current < limit:
+            grid.append(current.time())
+            current += datetime.timedelta(minutes=slot_minutes)
+    random.seed(slot_minutes)
+    booked = sorted(random.sample(grid, int(len(grid) * occupancy)))
+    return blocks, booked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--occupancy', type=float, default=0.6, help='fracción de franjas reservadas')
+    args = parser.parse_args()
+
+    print(f"repeticiones={args.repeat} ocupación={args.occupancy:.0%}")
+    for minutes in (10, 15, 30):
+        blocks, booked = build_day(minutes, args.occupancy)
+        legacy = timeit.timeit(
+            lambda: [slot for start, end in blocks for slot in legacy_slots(start, end, booked, minutes)],
+            number=args.repeat)
+        engine = timeit.timeit(
+            lambda: [to_hhmm(m) for m in available_minutes(blocks, booked, minutes, minutes)],
+            number=args.repeat)
+        legacy_us = legacy / args.repeat * 1e6
+        engine_us = engine / args.repeat * 1e6
+        print(f"  franja {minutes:>2} min, {len(booked):>3} citas: "
+              f"anterior {legacy_us:8.1f} µs  motor {engine_us:8.1f} µs ({legacy_us / engine_us:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Benchmark de month_calendar.build_month_calendar (200 médicos × 31 días).
+
+Genera horarios y citas sintéticos y compara la construcción con NumPy
+contra el mismo cálculo con los bucles por franja de datetime.combine /
+timedelta que usa schedules.get_available_time_slots. No necesita base de
+datos.
+
+Uso:
+    python benchmarks/bench_calendar.py [--doctors 200] [--repeat 5]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from month_calendar import build_month_calendar, month_days, LIBRE, OCUPADO  # noqa: E402
+
+YEAR, MONTH = 2030, 1
+
+
+def synthetic_data(doctors, occupancy):
+    random.seed(1)
+    blocks = []
+    for id_medico in range(1, doctors + 1):
+        for dia in random.sample(range(1, 7), 5):
+            blocks.append((id_medico, str(dia), datetime.time(7, 0), datetime.time(12, 0)))
+            blocks.append((id_medico, str(dia), datetime.time(13, 0), datetime.time(17, 30)))
+
+    working = {}
+    for id_medico, dia, inicio, fin in blocks:
+        working.setdefault((id_medico, int(dia)), []).append((inicio, fin))
+    citas = []
+    for day in month_days(YEAR, MONTH):
+        for id_medico in range(1, doctors + 1):
+            for inicio, fin in working.get((id_medico, day.isoweekday()), []):
+                current = datetime.datetime.combine(day, inicio)
+                end = datetime.datetime.combine(day, fin)
+                while current + datetime.timedelta(minutes=30) <= end:
+                    if random.random() < occupancy:
+                        citas.append((id_medico, day, current.time()))
+                    current += datetime.timedelta(minutes=30)
+    return blocks, citas
+
+
+def python_calendar(doctor_ids, blocks, citas, slot_minutes):
+    """Mismo resultado con bucles por franja: {(médico, día): {hh:mm: estado}}"""
+    booked = {(c[0], c[1], c[2].strftime('%H:%M')) for c in citas}
+    by_doctor_day = {}
+    for id_medico, dia, inicio, fin in blocks:
+        by_doctor_day.setdefault((id_medico, int(dia)), []).append((inicio, fin))
+    result = {}
+    free = {id_medico: 0 for id_medico in doctor_ids}
+    busy = {id_medico: 0 for id_medico in doctor_ids}
+    for day in month_days(YEAR, MONTH):
+        for id_medico in doctor_ids:
+            cells = {}
+            for inicio, fin in by_doctor_day.get((id_medico, day.isoweekday()), []):
+                current = datetime.datetime.combine(day, inicio)
+                end = datetime.datetime.combine(day, fin)
+                while current + datetime.timedelta(minutes=slot_minutes) <= end:
+                    key = current.strftime('%H:%M')
+                    if (id_medico, day, key) in booked:
+                        cells[key] = OCUPADO
+                        busy[id_medico] += 1
+                    else:
+                        cells[key] = LIBRE
+                        free[id_medico] += 1
+                    current += datetime.timedelta(minutes=slot_minutes)
+            result[(id_medico, day)] = cells
+    return result, free, busy
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--occupancy', type=float, default=0.5)
+    args = parser.parse_args()
+
+    doctor_ids = list(range(1, args.doctors + 1))
+    blocks, citas = synthetic_data(args.doctors, args.occupancy)
+
+    # Ambos métodos deben dar los mismos totales
+    month = build_month_calendar(doctor_ids, blocks, citas, YEAR, MONTH, 30)
+    _, free, busy = python_calendar(doctor_ids, blocks, citas, 30)
+    np_free, np_busy = month.counts()
+    assert list(np_free) == [free[d] for d in doctor_ids]
+    assert list(np_busy) == [busy[d] for d in doctor_ids]
+
+    print(f"médicos={args.doctors} días={len(month.days)} bloques={len(blocks)} citas={len(citas)}")
+    for minutes in (30, 15):
+        py_ms = best_of(lambda: python_calendar(doctor_ids, blocks, citas, minutes), args.repeat)
+        np_ms = best_of(lambda: build_month_calendar(doctor_ids, blocks, citas, YEAR, MONTH, minutes),
+                        args.repeat)
+        dict_ms = best_of(lambda: build_month_calendar(doctor_ids, blocks, citas, YEAR, MONTH, minutes)
+                          .to_dict(), args.repeat)
+        print(f"  franja {minutes} min: bucles {py_ms:8.1f} ms  numpy {np_ms:7.1f} ms "
+              f"({py_ms / np_ms:.0f}x)  numpy + codificación {dict_ms:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
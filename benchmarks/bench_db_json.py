@@ -0,0 +1,101 @@
+"""Compara el CPU por petición de la serialización en Python contra FOR JSON.
+
+Modo sintético (por defecto): genera N filas con los tipos que entrega pyodbc
+para /api/pacientes/detallados y mide, en tiempo de CPU del proceso:
+
+  - python: format_paciente_detallado (strftime incluido) + jsonify
+  - db_json: unir los fragmentos de 2033 caracteres que devuelve FOR JSON
+
+Modo --db: ejecuta contra la base de datos configurada las dos variantes de
+GET /api/medicos y GET /api/pacientes/<id> a través del cliente de pruebas.
+
+Uso:
+    python benchmarks/bench_db_json.py [--rows 5000] [--repeat 20] [--db]
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from patients import format_paciente_detallado  # noqa: E402
+
+FOR_JSON_CHUNK = 2033
+
+
+def synthetic_rows(count):
+    base = datetime.datetime(2024, 1, 1, 8, 30)
+    return [(
+        i, f'Paciente {i:06d}', '04141234567', f'paciente{i}@correo.com',
+        'Av. Principal, casa 12', f'{10000000 + i}', 'A',
+        datetime.date(1980, 1, 1) + datetime.timedelta(days=i % 9000),
+        'F' if i % 2 else 'M', 'O+', None, base + datetime.timedelta(minutes=i)
+    ) for i in range(count)]
+
+
+def cpu_per_call(func, repeat):
+    func()  # calentamiento
+    start = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - start) * 1000 / repeat
+
+
+def run_synthetic(rows, repeat):
+    app = create_app()
+    data = synthetic_rows(rows)
+
+    # Lo que devolvería SQL Server: el documento ya serializado y partido
+    document = json.dumps([format_paciente_detallado(r) for r in data], ensure_ascii=False)
+    chunks = [(document[i:i + FOR_JSON_CHUNK],) for i in range(0, len(document), FOR_JSON_CHUNK)]
+
+    def python_path():
+        with app.app_context():
+            response = app.json.response([format_paciente_detallado(r) for r in data])
+            response.get_data()
+
+    def db_json_path():
+        body = ''.join(row[0] for row in chunks)
+        body.encode('utf-8')
+
+    py_ms = cpu_per_call(python_path, repeat)
+    db_ms = cpu_per_call(db_json_path, repeat)
+    print(f"filas={rows} repeticiones={repeat}")
+    print(f"  python : {py_ms:8.3f} ms CPU/petición")
+    print(f"  db_json: {db_ms:8.3f} ms CPU/petición ({py_ms / db_ms:.1f}x menos CPU)"
+          if db_ms else f"  db_json: {db_ms:8.3f} ms CPU/petición")
+
+
+def run_db(repeat, paciente_id):
+    app = create_app()
+    client = app.test_client()
+    for url in ('/api/medicos', f'/api/pacientes/{paciente_id}', '/api/horarios/1/semanal'):
+        results = {}
+        for mode, query in (('python', ''), ('db_json', '?db_json=1')):
+            def call():
+                response = client.get(url + query)
+                response.get_data()
+            results[mode] = cpu_per_call(call, repeat)
+        print(f"{url}: python {results['python']:.3f} ms CPU, db_json {results['db_json']:.3f} ms CPU")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--db', action='store_true', help='medir contra la base de datos real')
+    parser.add_argument('--paciente', type=int, default=1, help='id de paciente para el modo --db')
+    args = parser.parse_args()
+
+    if args.db:
+        run_db(args.repeat, args.paciente)
+    else:
+        run_synthetic(args.rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Prueba de estrés de booking.book_appointment con reservas concurrentes.
+
+Varios hilos (como varias recepciones) intentan reservar todas las franjas de
+un médico para una fecha, en distinto orden. Al final se comprueba en la base
+de datos que ninguna franja quedó con más de una cita y se informa de las
+reservas por segundo.
+
+Requiere un médico con horario ese día de la semana y un paciente existente.
+Las citas creadas llevan el motivo MARCA y se borran con --cleanup.
+
+Uso:
+    python benchmarks/stress_booking.py --medico 1 --paciente 1 --fecha 2030-01-07
+        [--threads 8] [--cleanup]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyodbc  # noqa: E402
+from booking import book_appointment, SlotTakenError, OutsideScheduleError  # noqa: E402
+from config import APPOINTMENT_SLOT_MINUTES, DB_POOL_MAX_SIZE  # noqa: E402
+from database import db_connection, pool  # noqa: E402
+
+MARCA = 'stress-booking'
+
+
+def load_slots(id_medico, fecha):
+    """Franjas de la rejilla de cada bloque del médico para esa fecha"""
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT hora_inicio, hora_fin
+                FROM horarios_disponibles
+                WHERE id_medico = ? AND dia_semana = ?
+                ORDER BY hora_inicio
+            """, (id_medico, fecha.isoweekday()))
+            blocks = cursor.fetchall()
+
+    step = datetime.timedelta(minutes=APPOINTMENT_SLOT_MINUTES)
+    slots = []
+    for inicio, fin in blocks:
+        current = datetime.datetime.combine(fecha, inicio)
+        end = datetime.datetime.combine(fecha, fin)
+        while current + step <= end:
+            slots.append(current.time())
+            current += step
+    return slots
+
+
+def worker(id_medico, id_paciente, fecha, slots, counters, lock, barrier):
+    order = list(slots)
+    random.shuffle(order)
+    local = {'ok': 0, 'ocupada': 0, 'fuera': 0, 'error': 0}
+    barrier.wait()
+    for hora in order:
+        try:
+            with db_connection() as conn:
+                book_appointment(conn, id_medico, id_paciente, fecha, hora, MARCA)
+            local['ok'] += 1
+        except SlotTakenError:
+            local['ocupada'] += 1
+        except OutsideScheduleError:
+            local['fuera'] += 1
+        except pyodbc.Error:
+            local['error'] += 1
+    with lock:
+        for key, value in local.items():
+            counters[key] += value
+
+
+def duplicated_slots(id_medico, fecha):
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT COUNT(*) FROM (
+                    SELECT hora_cita
+                    FROM citas
+                    WHERE id_medico = ? AND fecha_cita = ?
+                    GROUP BY hora_cita
+                    HAVING COUNT(*) > 1
+                ) AS duplicadas
+            """, (id_medico, fecha))
+            return cursor.fetchone()[0]
+
+
+def cleanup(id_medico, fecha):
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                DELETE FROM citas
+                WHERE id_medico = ? AND fecha_cita = ? AND motivo_consulta = ?
+            """, (id_medico, fecha, MARCA))
+            return cursor.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--medico', type=int, required=True)
+    parser.add_argument('--paciente', type=int, required=True)
+    parser.add_argument('--fecha', required=True, help='YYYY-MM-DD, futura')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--cleanup', action='store_true', help='borrar las citas de la prueba al terminar')
+    args = parser.parse_args()
+
+    fecha = datetime.datetime.strptime(args.fecha, '%Y-%m-%d').date()
+    slots = load_slots(args.medico, fecha)
+    if not slots:
+        print("El médico no tiene horario ese día")
+        return 1
+    if args.threads > DB_POOL_MAX_SIZE:
+        print(f"Aviso: {args.threads} hilos comparten {DB_POOL_MAX_SIZE} conexiones (DB_POOL_MAX_SIZE)")
+
+    counters = {'ok': 0, 'ocupada': 0, 'fuera': 0, 'error': 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.threads + 1)
+    threads = [
+        threading.Thread(target=worker,
+                         args=(args.medico, args.paciente, fecha, slots, counters, lock, barrier))
+        for _ in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    attempts = sum(counters.values())
+    duplicates = duplicated_slots(args.medico, fecha)
+    print(f"franjas={len(slots)} hilos={args.threads} intentos={attempts} en {elapsed:.2f} s")
+    print(f"  reservadas={counters['ok']} ocupadas={counters['ocupada']} "
+          f"fuera_de_horario={counters['fuera']} errores={counters['error']}")
+    print(f"  {attempts / elapsed:.1f} intentos/s, {counters['ok'] / elapsed:.1f} reservas/s")
+    print(f"  franjas con más de una cita: {duplicates}")
+    print(f"  pool: {pool.stats()}")
+
+    if args.cleanup:
+        print(f"Citas de prueba borradas: {cleanup(args.medico, fecha)}")
+    return 0 if duplicates == 0 and counters['ok'] <= len(slots) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
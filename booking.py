@@ -0,0 +1,90 @@
+import datetime
+import logging
+import pyodbc
+from database import is_unique_violation
+from config import APPOINTMENT_SLOT_MINUTES
+
+logger = logging.getLogger(__name__)
+
+
+class BookingError(Exception):
+    """No se pudo reservar la cita solicitada"""
+
+
+class SlotTakenError(BookingError):
+    """El médico ya tiene una cita en esa fecha y hora"""
+
+
+class OutsideScheduleError(BookingError):
+    """La hora no corresponde a un turno del horario del médico"""
+
+
+# Inserción optimista: la fila solo se inserta si la franja cae completa
+# dentro de un bloque de horarios_disponibles de ese día y está alineada a
+# la rejilla del bloque. El índice único UX_citas_medico_fecha_hora resuelve
+# las reservas simultáneas: la segunda espera el bloqueo de la clave y falla
+# con 2627/2601 en lugar de duplicar la cita.
+_BOOK_SQL = """
+    INSERT INTO citas (
+        id_medico,
+        id_paciente,
+        fecha_cita,
+        hora_cita,
+        motivo_consulta,
+        fecha_creacion
+    )
+    OUTPUT INSERTED.id_cita
+    SELECT ?, ?, ?, ?, ?, GETDATE()
+    WHERE EXISTS (
+        SELECT 1
+        FROM horarios_disponibles
+        WHERE id_medico = ?
+          AND dia_semana = ?
+          AND hora_inicio <= ?
+          AND hora_fin >= ?
+          AND DATEDIFF(MINUTE, hora_inicio, ?) % ? = 0
+    )
+"""
+
+
+def slot_end(fecha_cita, hora_cita, slot_minutes=None):
+    """Hora de fin de la franja; None si pasa de medianoche"""
+    slot_minutes = slot_minutes or APPOINTMENT_SLOT_MINUTES
+    end = datetime.datetime.combine(fecha_cita, hora_cita) + datetime.timedelta(minutes=slot_minutes)
+    if end.date() != fecha_cita:
+        return None
+    return end.time()
+
+
+def book_appointment(conn, id_medico, id_paciente, fecha_cita, hora_cita, motivo_consulta,
+                     slot_minutes=None):
+    """Reserva una cita en una sola sentencia y una transacción.
+
+    fecha_cita y hora_cita son date y time. Devuelve el id de la cita o lanza
+    SlotTakenError / OutsideScheduleError; otros errores de pyodbc se propagan
+    tras deshacer la transacción.
+    """
+    slot_minutes = slot_minutes or APPOINTMENT_SLOT_MINUTES
+    hora_fin = slot_end(fecha_cita, hora_cita, slot_minutes)
+    if hora_fin is None:
+        raise OutsideScheduleError("La cita no puede terminar después de medianoche")
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(_BOOK_SQL, (
+            id_medico, id_paciente, fecha_cita, hora_cita, motivo_consulta,
+            id_medico, fecha_cita.isoweekday(), hora_cita, hora_fin, hora_cita, slot_minutes
+        ))
+        row = cursor.fetchone()
+        if row is None:
+            conn.rollback()
+            raise OutsideScheduleError("El médico no atiende en ese horario")
+        conn.commit()
+        return row[0]
+    except pyodbc.Error as e:
+        conn.rollback()
+        if is_unique_violation(e):
+            raise SlotTakenError("El médico ya tiene una cita programada en ese horario")
+        raise
+    finally:
+        cursor.close()
@@ -9,6 +9,67 @@ USE_WINDOWS_AUTH = os.getenv('USE_WINDOWS_AUTH', 'True').lower() == 'true'
 USERNAME = os.getenv('DB_USERNAME', '')
 PASSWORD = os.getenv('DB_PASSWORD', '')
 
+# Pool de conexiones (todos los tiempos en segundos)
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', 10))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300))
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', 1800))
+DB_POOL_PING_INTERVAL = float(os.getenv('DB_POOL_PING_INTERVAL', 30))
+
+# Log de consultas lentas (umbral en milisegundos)
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200))
+SLOW_QUERY_LOG_FILE = os.getenv('SLOW_QUERY_LOG_FILE', 'slow_queries.log')
+
+# Filas leídas por lote en las respuestas en streaming
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 500))
+
+# JSON generado por SQL Server (FOR JSON PATH) en los endpoints de lectura
+DB_JSON_PASSTHROUGH = os.getenv('DB_JSON_PASSTHROUGH', 'False').lower() == 'true'
+
+# Duración de cada cita en minutos; las citas se alinean a esta rejilla
+# desde la hora de inicio de cada bloque de horarios_disponibles
+APPOINTMENT_SLOT_MINUTES = int(os.getenv('APPOINTMENT_SLOT_MINUTES', 30))
+
+# Segundos antes de recargar completo el índice en memoria de horarios
+SCHEDULE_INDEX_MAX_AGE = float(os.getenv('SCHEDULE_INDEX_MAX_AGE', 300))
+
+# Segundos antes de recargar en segundo plano el índice de búsqueda de pacientes y
+# fracción mínima de trigramas compartidos para una coincidencia aproximada
+PATIENT_SEARCH_MAX_AGE = float(os.getenv('PATIENT_SEARCH_MAX_AGE', 600))
+PATIENT_SEARCH_MIN_SIMILARITY = float(os.getenv('PATIENT_SEARCH_MIN_SIMILARITY', 0.4))
+# Cargar el índice de búsqueda de pacientes al arrancar (en segundo plano)
+PATIENT_SEARCH_WARM = os.getenv('PATIENT_SEARCH_WARM', 'True').lower() == 'true'
+
+# Segundos que MedicalScheduleManager mantiene en caché los horarios de un médico
+SCHEDULE_CACHE_TTL = float(os.getenv('SCHEDULE_CACHE_TTL', 300))
+
+# Segundos máximos que se sirve una vista JSON de horarios ya serializada; las
+# escrituras de este proceso la invalidan antes, las de otros procesos no
+SCHEDULE_VIEW_MAX_AGE = float(os.getenv('SCHEDULE_VIEW_MAX_AGE', 60))
+
+# Segundos que se sirven sin recargar los catálogos (roles, especialidades, médicos
+# activos) y espera entre reintentos cuando la base de datos no responde
+REFERENCE_CACHE_TTL = float(os.getenv('REFERENCE_CACHE_TTL', 300))
+REFERENCE_CACHE_RETRY = float(os.getenv('REFERENCE_CACHE_RETRY', 15))
+
+# Segundos que se sirven desde memoria los contadores del panel de administración
+DASHBOARD_STATS_TTL = float(os.getenv('DASHBOARD_STATS_TTL', 30))
+
+# Registro de actividad: eventos recientes en memoria, segundos entre volcados a
+# eventos_actividad y número de eventos pendientes que adelanta el volcado
+ACTIVITY_BUFFER_SIZE = int(os.getenv('ACTIVITY_BUFFER_SIZE', 500))
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_FLUSH_INTERVAL', 5))
+ACTIVITY_FLUSH_BATCH = int(os.getenv('ACTIVITY_FLUSH_BATCH', 50))
+
+# Consultas de lectura en paralelo (fanout.py): hilos compartidos y segundos
+# máximos de espera por el grupo de consultas de una petición
+FANOUT_MAX_WORKERS = int(os.getenv('FANOUT_MAX_WORKERS', 4))
+FANOUT_QUERY_TIMEOUT = float(os.getenv('FANOUT_QUERY_TIMEOUT', 10))
+
+# /api/batch: subpeticiones por lote e hilos para atenderlas en paralelo
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 20))
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', 4))
+
 # Diccionario de nombres de días
 DAY_NAMES = {
     1: 'Lunes',
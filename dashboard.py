@@ -1,119 +1,112 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 import pyodbc
 import logging
-from database import get_db_connection
+from database import pool
+from instrumentation import query_stats
+from schema_cache import schema_cache
+from schedule_index import schedule_index
+from patient_search import patient_search
+from response_cache import cache_stats
+from reference_cache import invalidate_all as invalidate_reference_caches
+from http_cache import not_modified, with_etag
+import stats_service
+from activity import activity_log
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
 # API para obtener datos del dashboard de administrador
 @dashboard_bp.route('/api/admin/stats', methods=['GET'])
 def admin_stats():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-        
-    cursor = None
     try:
-        cursor = conn.cursor()
-        
-        stats = {}
-        
-        # Obtener conteo de médicos
-        cursor.execute("SELECT COUNT(*) FROM medicos WHERE estado = 'A'")
-        stats['doctors'] = cursor.fetchone()[0]
-        
-        # Obtener conteo de pacientes
-        cursor.execute("SELECT COUNT(*) FROM pacientes")
-        stats['patients'] = cursor.fetchone()[0]
-        
-        # Obtener citas para hoy
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM citas 
-            WHERE CONVERT(date, fecha_cita) = CONVERT(date, GETDATE())
-        """)
-        stats['appointments'] = cursor.fetchone()[0]
-        
-        # Obtener conteo de usuarios
-        cursor.execute("SELECT COUNT(*) FROM usuarios")
-        stats['users'] = cursor.fetchone()[0]
-        
-        return jsonify(stats)
+        counters, etag = stats_service.counters()
+    except ConnectionError:
+        return jsonify({'error': 'Database connection failed'}), 500
     except pyodbc.Error as e:
         logging.error(f"Database error in admin_stats: {str(e)}")
         return jsonify({'error': 'Failed to fetch stats'}), 500
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
 
-# API para obtener registros recientes
+    return not_modified(request, etag) or with_etag(jsonify({
+        'doctors': counters['doctors'],
+        'patients': counters['patients'],
+        'appointments': counters['appointments_today'],
+        'users': counters['users']
+    }), etag)
+
+# API con todos los contadores del panel (una consulta, en caché unos segundos);
+# pensada para consultarse periódicamente con If-None-Match
+@dashboard_bp.route('/api/admin/counters', methods=['GET'])
+def admin_counters():
+    try:
+        counters, etag = stats_service.counters()
+    except ConnectionError:
+        return jsonify({'error': 'Database connection failed'}), 500
+    except pyodbc.Error as e:
+        logging.error(f"Database error in admin_counters: {str(e)}")
+        return jsonify({'error': 'Failed to fetch stats'}), 500
+
+    return not_modified(request, etag) or with_etag(jsonify(counters), etag)
+
+# API para obtener registros recientes: los eventos que anotan las escrituras
+# de médicos, pacientes, usuarios y citas, leídos del búfer en memoria
 @dashboard_bp.route('/api/admin/recent-activity', methods=['GET'])
 def recent_activity():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-        
-    cursor = None
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    return jsonify(activity_log.recent(limit))
+
+@dashboard_bp.route('/api/admin/activity-stats', methods=['GET'])
+def activity_stats():
+    return jsonify(activity_log.stats())
+
+# API para consultar el estado del pool de conexiones
+@dashboard_bp.route('/api/admin/db-pool', methods=['GET'])
+def db_pool_stats():
+    return jsonify(pool.stats())
+
+# API para consultar las sentencias SQL que más tiempo consumen
+@dashboard_bp.route('/api/admin/sql-stats', methods=['GET'])
+def sql_stats():
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify(query_stats.snapshot(limit))
+
+# API para recargar la caché de metadatos del esquema (tras cambios de esquema)
+@dashboard_bp.route('/api/admin/schema/refresh', methods=['POST'])
+def refresh_schema():
     try:
-        cursor = conn.cursor()
-        
-        # Obtener últimos 5 médicos registrados
-        cursor.execute("""
-            SELECT TOP 5 id_medico, nombre_completo, especialidad, 
-                   CONVERT(varchar, GETDATE(), 120) as fecha
-            FROM medicos
-            ORDER BY id_medico DESC
-        """)
-        doctors = [{
-            'id': row[0],
-            'name': row[1],
-            'type': 'Médico',
-            'specialty': row[2],
-            'date': row[3]
-        } for row in cursor.fetchall()]
-        
-        # Obtener últimos 5 pacientes registrados
-        cursor.execute("""
-            SELECT TOP 5 id_paciente, nombre_completo, 
-                   CONVERT(varchar, GETDATE(), 120) as fecha
-            FROM pacientes
-            ORDER BY id_paciente DESC
-        """)
-        patients = [{
-            'id': row[0],
-            'name': row[1],
-            'type': 'Paciente',
-            'date': row[2]
-        } for row in cursor.fetchall()]
-        
-        # Obtener últimas 5 citas programadas
-        cursor.execute("""
-            SELECT TOP 5 c.id_cita, p.nombre_completo, m.nombre_completo,
-                   CONVERT(varchar, c.fecha_cita, 120) + ' ' + CONVERT(varchar, c.hora_cita, 108) as fecha
-            FROM citas c
-            JOIN pacientes p ON c.id_paciente = p.id_paciente
-            JOIN medicos m ON c.id_medico = m.id_medico
-            ORDER BY c.fecha_cita DESC, c.hora_cita DESC
-        """)
-        appointments = [{
-            'id': row[0],
-            'name': f"Cita {row[0]}",
-            'type': 'Cita',
-            'details': f"Paciente: {row[1]}, Médico: {row[2]}",
-            'date': row[3]
-        } for row in cursor.fetchall()]
-        
-        # Combinar todos los resultados y ordenar por fecha
-        recent_activity = doctors + patients + appointments
-        recent_activity.sort(key=lambda x: x['date'], reverse=True)
-        
-        return jsonify(recent_activity[:10])  # Devolver solo los 10 más recientes
-    except pyodbc.Error as e:
-        logging.error(f"Database error in recent_activity: {str(e)}")
-        return jsonify({'error': 'Failed to fetch recent activity'}), 500
-    finally:
-        if cursor: cursor.close()
-        if conn: conn.close()
+        tables = schema_cache.refresh()
+        return jsonify({'message': 'Metadatos de esquema recargados', 'tables': len(tables)})
+    except (pyodbc.Error, ConnectionError) as e:
+        logging.error(f"Database error in refresh_schema: {str(e)}")
+        return jsonify({'error': 'Failed to refresh schema metadata'}), 500
+
+@dashboard_bp.route('/api/admin/cache-stats', methods=['GET'])
+def response_cache_stats():
+    return jsonify(cache_stats())
+
+# API para descartar los catálogos en memoria (roles, especialidades, médicos
+# activos) cuando se modifican fuera de la aplicación
+@dashboard_bp.route('/api/admin/reference-cache/invalidate', methods=['POST'])
+def invalidate_reference_cache():
+    invalidate_reference_caches()
+    return jsonify({'message': 'Catálogos en memoria invalidados'})
+
+@dashboard_bp.route('/api/admin/schedule-index/refresh', methods=['POST'])
+def refresh_schedule_index():
+    try:
+        schedule_index.refresh()
+        return jsonify({'message': 'Índice de horarios recargado'})
+    except (pyodbc.Error, ConnectionError) as e:
+        logging.error(f"Database error in refresh_schedule_index: {str(e)}")
+        return jsonify({'error': 'Failed to refresh schedule index'}), 500
+
+# Recarga el índice de búsqueda de pacientes (p. ej. tras una importación masiva)
+@dashboard_bp.route('/api/admin/patient-search/refresh', methods=['POST'])
+def refresh_patient_search():
+    try:
+        patient_search.refresh()
+        return jsonify({'message': 'Índice de búsqueda de pacientes recargado', **patient_search.stats()})
+    except (pyodbc.Error, ConnectionError) as e:
+        logging.error(f"Database error in refresh_patient_search: {str(e)}")
+        return jsonify({'error': 'Failed to refresh patient search index'}), 500
 
 # API para obtener datos del usuario actual
 @dashboard_bp.route('/api/user-data', methods=['GET'])
@@ -1,30 +1,390 @@
 import pyodbc
 import logging
-from config import SERVER, DATABASE, USE_WINDOWS_AUTH, USERNAME, PASSWORD
+import threading
+import time
+from contextlib import contextmanager
+from instrumentation import InstrumentedCursor
+from config import (
+    SERVER, DATABASE, USE_WINDOWS_AUTH, USERNAME, PASSWORD,
+    DB_POOL_MAX_SIZE, DB_POOL_ACQUIRE_TIMEOUT, DB_POOL_IDLE_TIMEOUT,
+    DB_POOL_MAX_LIFETIME, DB_POOL_PING_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Se agotó el tiempo de espera por una conexión libre del pool"""
+
+
+def build_connection_string():
+    """Construye la cadena de conexión ODBC según el modo de autenticación"""
+    if USE_WINDOWS_AUTH:
+        return (
+            f'DRIVER={{ODBC Driver 17 for SQL Server}};'
+            f'SERVER={SERVER};DATABASE={DATABASE};'
+            'Trusted_Connection=yes;'
+        )
+
+    if not USERNAME or not PASSWORD:
+        return None
+
+    return (
+        f'DRIVER={{ODBC Driver 17 for SQL Server}};'
+        f'SERVER={SERVER};DATABASE={DATABASE};'
+        f'UID={USERNAME};PWD={PASSWORD}'
+    )
+
+
+class PooledConnection:
+    """Envoltura de una conexión pyodbc que vuelve al pool al cerrarse.
+
+    Expone la misma interfaz que la conexión original (cursor, commit,
+    rollback, ...), por lo que los blueprints pueden seguir llamando a
+    conn.close() en su bloque finally sin saber que la conexión es reutilizada.
+    """
+
+    def __init__(self, pool, raw_conn):
+        self._pool = pool
+        self._raw = raw_conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.checked_out = False
+        self._leases = 0
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def cursor(self):
+        """Cursor instrumentado: mide duración y filas de cada sentencia"""
+        return InstrumentedCursor(self._raw.cursor())
+
+    def retain(self):
+        """Suma un préstamo: la conexión vuelve al pool con el último close().
+
+        Lo usan las respuestas en streaming, que siguen leyendo filas después
+        de que el endpoint haya cerrado su referencia a la conexión.
+        """
+        self._leases += 1
+        return self
+
+    def close(self):
+        """Devuelve la conexión al pool (idempotente)"""
+        if not self.checked_out:
+            return
+        self._leases -= 1
+        if self._leases <= 0:
+            self._pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Igual que pyodbc: commit si el bloque terminó bien, rollback si no;
+        # además la conexión vuelve al pool.
+        try:
+            if exc_type is None:
+                self._raw.commit()
+            else:
+                self._raw.rollback()
+        finally:
+            self.close()
+        return False
+
+
+class ConnectionPool:
+    """Pool de conexiones acotado, seguro entre hilos y con verificación de salud.
+
+    - max_size: número máximo de conexiones físicas abiertas a la vez.
+    - acquire_timeout: segundos que se espera por una conexión libre.
+    - idle_timeout: las conexiones libres por más tiempo se cierran.
+    - max_lifetime: las conexiones más viejas se reciclan al devolverse.
+    - ping_interval: si una conexión estuvo libre más de este tiempo se
+      ejecuta un SELECT 1 antes de entregarla.
+    """
+
+    def __init__(self, connect, max_size=10, acquire_timeout=10.0,
+                 idle_timeout=300.0, max_lifetime=1800.0, ping_interval=30.0):
+        self._connect = connect
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+
+        self._idle = []  # LIFO: la conexión usada más recientemente sale primero
+        self._size = 0
+        self._cond = threading.Condition(threading.Lock())
+
+        self._checkouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._timeouts = 0
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def acquire(self, timeout=None, wait=True):
+        """Entrega una conexión viva del pool, creando una nueva si hay cupo.
+
+        Con wait=False no espera: devuelve None si no hay una libre ni cupo.
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            pooled = None
+            create = False
+            with self._cond:
+                self._prune_idle_locked()
+                while not self._idle and self._size >= self.max_size:
+                    if not wait:
+                        return None
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"No hay conexiones libres tras {timeout:.1f}s "
+                            f"(máximo {self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+                    self._prune_idle_locked()
+
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+
+            if create:
+                try:
+                    pooled = PooledConnection(self, self._connect())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created += 1
+            elif not self._is_alive(pooled):
+                self._discard(pooled)
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._checkouts += 1
+                if waited > 0.001:
+                    self._wait_count += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            pooled.checked_out = True
+            pooled._leases = 1
+            return pooled
+
+    def try_acquire(self):
+        """Una conexión libre o con cupo para crearla, o None sin esperar"""
+        return self.acquire(wait=False)
+
+    def release(self, pooled):
+        """Devuelve una conexión al pool descartando cualquier transacción abierta"""
+        pooled.checked_out = False
+        pooled.last_used = time.monotonic()
+
+        if pooled.last_used - pooled.created_at >= self.max_lifetime:
+            self._discard(pooled)
+            return
+
+        try:
+            pooled.raw.rollback()
+        except pyodbc.Error as e:
+            logger.warning(f"Conexión descartada al devolverse al pool: {str(e)}")
+            self._discard(pooled)
+            return
+
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager: entrega una conexión y la devuelve al salir.
+
+        Si el bloque lanza una excepción se hace rollback antes de devolverla.
+        """
+        pooled = self.acquire(timeout)
+        try:
+            yield pooled
+        except Exception:
+            try:
+                pooled.raw.rollback()
+            except pyodbc.Error:
+                pass
+            raise
+        finally:
+            pooled.close()
+
+    def stats(self):
+        """Métricas del pool: tamaño, conexiones libres, esperas y checkouts"""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                'checkouts': self._checkouts,
+                'created': self._created,
+                'discarded': self._discarded,
+                'timeouts': self._timeouts,
+                'waits': self._wait_count,
+                'wait_time_total_ms': round(self._wait_total * 1000, 3),
+                'wait_time_max_ms': round(self._wait_max * 1000, 3),
+                'wait_time_avg_ms': round(
+                    self._wait_total * 1000 / self._checkouts, 3
+                ) if self._checkouts else 0.0
+            }
+
+    def close_all(self):
+        """Cierra todas las conexiones libres (las prestadas se cierran al volver)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._discard(pooled)
+
+    def _is_alive(self, pooled):
+        if time.monotonic() - pooled.last_used < self.ping_interval:
+            return True
+        try:
+            cursor = pooled.raw.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except pyodbc.Error as e:
+            logger.warning(f"Conexión inválida descartada del pool: {str(e)}")
+            return False
+
+    def _prune_idle_locked(self):
+        now = time.monotonic()
+        keep = []
+        for pooled in self._idle:
+            if (now - pooled.last_used >= self.idle_timeout or
+                    now - pooled.created_at >= self.max_lifetime):
+                self._close_raw(pooled)
+                self._size -= 1
+                self._discarded += 1
+            else:
+                keep.append(pooled)
+        self._idle = keep
+
+    def _discard(self, pooled):
+        self._close_raw(pooled)
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_raw(pooled):
+        try:
+            pooled.raw.close()
+        except pyodbc.Error:
+            pass
+
+
+def _connect():
+    connection_string = build_connection_string()
+    if connection_string is None:
+        raise pyodbc.InterfaceError("Credenciales de base de datos no configuradas")
+    conn = pyodbc.connect(connection_string)
+    logging.info("Database connection established successfully")
+    return conn
+
+
+pool = ConnectionPool(
+    _connect,
+    max_size=DB_POOL_MAX_SIZE,
+    acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+    idle_timeout=DB_POOL_IDLE_TIMEOUT,
+    max_lifetime=DB_POOL_MAX_LIFETIME,
+    ping_interval=DB_POOL_PING_INTERVAL
+)
+
 
 # Function to get a database connection
+# Conexión compartida por hilo (ver shared_connection)
+_shared = threading.local()
+
+
 def get_db_connection():
+    """Obtiene una conexión del pool; conn.close() la devuelve al pool"""
+    slot = getattr(_shared, 'slot', None)
     try:
-        if USE_WINDOWS_AUTH:
-            connection_string = (
-                f'DRIVER={{ODBC Driver 17 for SQL Server}};'
-                f'SERVER={SERVER};DATABASE={DATABASE};'
-                'Trusted_Connection=yes;'
-            )
-        else:
-            if not USERNAME or not PASSWORD:
-                logging.error("Credenciales de base de datos no configuradas")
-                return None
-                
-            connection_string = (
-                f'DRIVER={{ODBC Driver 17 for SQL Server}};'
-                f'SERVER={SERVER};DATABASE={DATABASE};'
-                f'UID={USERNAME};PWD={PASSWORD}'
-            )
-        
-        conn = pyodbc.connect(connection_string)
-        logging.info("Database connection established successfully")
-        return conn
+        if slot is not None:
+            # Se vuelve a tomar si algún endpoint la devolvió al pool de más
+            if slot['conn'] is None or not slot['conn'].checked_out:
+                slot['conn'] = pool.acquire()
+            return slot['conn'].retain()
+        return pool.acquire()
+    except PoolTimeoutError as e:
+        logging.error(f"Database connection failed: {str(e)}")
+        return None
     except pyodbc.Error as e:
         logging.error(f"Database connection failed: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+
+@contextmanager
+def shared_connection():
+    """Dentro del bloque, get_db_connection() reutiliza una sola conexión en este hilo.
+
+    La conexión se toma del pool la primera vez que se pide y vuelve al salir
+    del bloque; cada close() de un endpoint solo suelta su préstamo. Lo usa
+    /api/batch para atender varias subpeticiones con un único checkout. Solo
+    para lecturas: una transacción sin confirmar se descarta al salir.
+    """
+    previous = getattr(_shared, 'slot', None)
+    slot = _shared.slot = {'conn': None}
+    try:
+        yield
+    finally:
+        _shared.slot = previous
+        conn = slot['conn']
+        if conn is not None and conn.checked_out:
+            try:
+                conn.raw.rollback()
+            except pyodbc.Error:
+                pass
+            conn.close()
+
+
+@contextmanager
+def db_connection(timeout=None):
+    """Context manager para usar una conexión del pool en un bloque with"""
+    with pool.connection(timeout) as conn:
+        yield conn
+
+
+# Errores nativos de SQL Server para claves duplicadas: 2627 restricción
+# UNIQUE/PRIMARY KEY, 2601 índice único
+UNIQUE_VIOLATION_CODES = (2627, 2601)
+
+
+def is_unique_violation(error):
+    """Indica si el error de pyodbc es una violación de unicidad.
+
+    Permite que las altas confíen en las restricciones de la base de datos en
+    lugar de consultar antes de insertar; pyodbc solo expone el número de
+    error nativo dentro del mensaje.
+    """
+    if not isinstance(error, pyodbc.IntegrityError):
+        return False
+    message = str(error)
+    return any(f'({code})' in message for code in UNIQUE_VIOLATION_CODES)
@@ -0,0 +1,112 @@
+from fanout import fan_out
+from pagination import count_total
+
+# Filas máximas por página; DataTables pide length=-1 para "todas"
+MAX_LENGTH = 500
+DEFAULT_LENGTH = 10
+
+
+def like_prefix(term):
+    """Patrón LIKE 'term%' con los comodines del usuario escapados.
+
+    Un prefijo sin comodín inicial permite a SQL Server buscar por rango en
+    el índice de la columna en lugar de recorrer la tabla.
+    """
+    escaped = term.replace('[', '[[]').replace('%', '[%]').replace('_', '[_]')
+    return escaped + '%'
+
+
+def parse_datatables_args(args, orderable):
+    """Lee draw, start, length, search[value] y order[i] del protocolo de DataTables.
+
+    orderable traduce el nombre de cada columna (columns[i][data]) a la
+    columna SQL; las columnas que no están en el diccionario no ordenan.
+    Devuelve (draw, start, length, búsqueda, [(columna, 'ASC'|'DESC')]).
+    """
+    draw = args.get('draw', 0, type=int)
+    start = max(0, args.get('start', 0, type=int))
+    length = args.get('length', DEFAULT_LENGTH, type=int)
+    if length is None or length < 0 or length > MAX_LENGTH:
+        length = MAX_LENGTH
+    search = (args.get('search[value]') or '').strip()
+
+    order = []
+    i = 0
+    while f'order[{i}][column]' in args:
+        index = args.get(f'order[{i}][column]', type=int)
+        column = orderable.get(args.get(f'columns[{index}][data]'))
+        if column and args.get(f'columns[{index}][orderable]', 'true') != 'false':
+            direction = 'DESC' if args.get(f'order[{i}][dir]') == 'desc' else 'ASC'
+            order.append((column, direction))
+        i += 1
+    return draw, start, length, search, order
+
+
+def datatables_page(conn, args, query, params, table, filtered, search_columns,
+                    orderable, id_column, default_order, formatter, extra_search=None):
+    """Respuesta del protocolo server-side de DataTables para un listado.
+
+    query es un SELECT terminado en una cláusula WHERE con los filtros fijos
+    del endpoint (p. ej. WHERE 1=1 más filtros) y filtered indica si tiene
+    alguno. La búsqueda global (y extra_search, la caja de filtros propia de
+    la página si la hay) es un prefijo sobre search_columns ('col LIKE x%'),
+    que deben tener índice para que cada condición sea una búsqueda por
+    rango; la búsqueda por palabra del nombre la ofrece
+    /api/pacientes/buscar (patient_search). La página
+    se pide con OFFSET/FETCH ordenada por las columnas elegidas más el id,
+    para que el orden sea estable. recordsTotal sale de sys.partitions y,
+    si hay filtros, el COUNT(*) filtrado corre en paralelo con la página.
+    """
+    draw, start, length, search, order = parse_datatables_args(args, orderable)
+
+    params = list(params)
+    for term in (search, (extra_search or '').strip()):
+        if term:
+            pattern = like_prefix(term)
+            query += " AND (" + " OR ".join(f"{column} LIKE ?" for column in search_columns) + ")"
+            params.extend([pattern] * len(search_columns))
+            filtered = True
+
+    order = order or [(default_order, 'ASC')]
+    order_by = ", ".join(f"{column} {direction}" for column, direction in order)
+    if id_column not in [column for column, _ in order]:
+        order_by += f", {id_column}"
+
+    def page(c):
+        cursor = c.cursor()
+        try:
+            cursor.execute(
+                f"{query} ORDER BY {order_by} OFFSET ? ROWS FETCH NEXT ? ROWS ONLY",
+                params + [start, length]
+            )
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def filtered_count(c):
+        cursor = c.cursor()
+        try:
+            return count_total(cursor, query, params, table, 'exact', True)[0]
+        finally:
+            cursor.close()
+
+    tasks = {'page': page}
+    if filtered:
+        tasks['filtered'] = filtered_count
+    result = fan_out(tasks, conn=conn, required=('filtered',))
+    rows = result.values['page']
+
+    cursor = conn.cursor()
+    try:
+        total, _ = count_total(cursor, None, [], table, 'approx', False)
+        if total is None:
+            total, _ = count_total(cursor, f"SELECT 1 AS fila FROM {table}", [], table, 'exact', False)
+    finally:
+        cursor.close()
+
+    return {
+        'draw': draw,
+        'recordsTotal': total,
+        'recordsFiltered': result.values['filtered'] if filtered else total,
+        'data': [formatter(row) for row in rows]
+    }
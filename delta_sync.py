@@ -0,0 +1,116 @@
+import base64
+import json
+from datetime import datetime
+from schema_cache import schema_cache
+from pagination import InvalidCursorError
+
+# En modo fecha el token se retrasa unos segundos para no perder filas de
+# transacciones que tomaron GETDATE() antes pero confirmaron después; las
+# filas repetidas son inocuas porque el cliente las aplica por id.
+_TIMESTAMP_OVERLAP_SECONDS = 5
+
+
+class InvalidSyncTokenError(InvalidCursorError):
+    """Token de sincronización mal formado o de otra tabla"""
+
+
+class DeltaSyncUnavailableError(Exception):
+    """La tabla no tiene columnas para detectar cambios"""
+
+
+def is_delta_request(args):
+    """El modo incremental se activa con ?since= (vacío para la copia inicial)"""
+    return 'since' in args
+
+
+def sync_mode(conn, table):
+    """'rowversion' con la columna version_fila (migración 0003, la misma de
+    los ETag de http_cache.table_version), 'fecha' con fecha_actualizacion,
+    o None si la tabla no permite detectar cambios"""
+    columns = schema_cache.columns(table, conn)
+    if 'version_fila' in columns:
+        return 'rowversion'
+    if 'fecha_actualizacion' in columns:
+        return 'fecha'
+    return None
+
+
+def encode_sync_token(table, mode, value):
+    payload = json.dumps([table, mode, value], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_sync_token(token, table, mode):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        token_table, token_mode, value = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise InvalidSyncTokenError(f"Token de sincronización inválido: {str(e)}")
+    if token_table != table:
+        raise InvalidSyncTokenError("El token no corresponde a este listado")
+    if token_mode != mode:
+        # La tabla cambió de modo (p. ej. se aplicó la migración): copia completa
+        return None
+    if mode == 'rowversion' and (not isinstance(value, int) or isinstance(value, bool)
+                                 or not 0 <= value < 2 ** 64):
+        # rowversion es un binary(8): fuera de rango no se puede convertir
+        raise InvalidSyncTokenError("Token de sincronización inválido")
+    if mode == 'fecha':
+        try:
+            value = datetime.fromisoformat(value)
+        except (ValueError, TypeError):
+            raise InvalidSyncTokenError("Token de sincronización inválido")
+    return value
+
+
+def _rowversion(value):
+    return value.to_bytes(8, 'big')
+
+
+def fetch_changes(conn, table, columns, id_column, token):
+    """Filas insertadas o modificadas (incluidas las inactivadas) desde token.
+
+    Sin token devuelve la tabla completa. Devuelve (filas, token_nuevo,
+    es_completa). Con rowversion el corte es MIN_ACTIVE_ROWVERSION(): las
+    filas de transacciones aún abiertas quedan para la siguiente llamada en
+    lugar de perderse.
+    """
+    mode = sync_mode(conn, table)
+    if mode is None:
+        raise DeltaSyncUnavailableError(
+            f"La tabla {table} no tiene version_fila ni fecha_actualizacion"
+        )
+    since = decode_sync_token(token, table, mode) if token else None
+
+    cursor = conn.cursor()
+    try:
+        params = []
+        if mode == 'rowversion':
+            cursor.execute("SELECT CONVERT(bigint, MIN_ACTIVE_ROWVERSION())")
+            upto = cursor.fetchone()[0]
+            query = f"SELECT {columns} FROM {table} WHERE version_fila < CAST(? AS binary(8))"
+            params.append(_rowversion(upto))
+            if since is not None:
+                query += " AND version_fila > CAST(? AS binary(8))"
+                params.append(_rowversion(since))
+            query += " ORDER BY version_fila"
+            new_value = upto - 1
+        else:
+            cursor.execute("SELECT DATEADD(second, ?, GETDATE())", (-_TIMESTAMP_OVERLAP_SECONDS,))
+            upto = cursor.fetchone()[0]
+            query = f"SELECT {columns} FROM {table}"
+            if since is not None:
+                changed = 'fecha_actualizacion'
+                if 'fecha_creacion' in schema_cache.columns(table, conn):
+                    changed = 'COALESCE(fecha_actualizacion, fecha_creacion)'
+                query += f" WHERE {changed} >= ?"
+                params.append(since)
+            query += f" ORDER BY {id_column}"
+            new_value = upto.isoformat()
+
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    return rows, encode_sync_token(table, mode, new_value), since is None
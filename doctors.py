@@ -1,91 +1,233 @@
 from flask import Blueprint, request, jsonify
 import pyodbc
 import logging
-from database import get_db_connection
+from database import get_db_connection, PoolTimeoutError
+from schema_cache import schema_cache
+from reference_cache import ReferenceCache
+import stats_service
+from activity import activity_log
+from delta_sync import is_delta_request, fetch_changes, DeltaSyncUnavailableError
+from http_cache import table_version, make_etag, request_variant, not_modified, etag_on_success, with_etag
+from streaming import stream_format, stream_query, wants_db_json, stream_for_json
+from datatables import datatables_page
+from pagination import (
+    is_keyset_request, parse_keyset_args, fetch_page_with_total, InvalidCursorError
+)
 
 doctors_bp = Blueprint('doctors', __name__)
 
+def _load_medicos_disponibles(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT id_medico, nombre_completo, especialidad 
+            FROM medicos 
+            WHERE estado = 'A'
+            ORDER BY nombre_completo
+        """)
+        return [{
+            'id_medico': row[0],
+            'nombre_completo': row[1],
+            'especialidad': row[2]
+        } for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+def _load_especialidades(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT DISTINCT especialidad 
+            FROM medicos 
+            WHERE especialidad IS NOT NULL
+            ORDER BY especialidad
+        """)
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+# Catálogos que usan los formularios; las escrituras de médicos los invalidan
+medicos_disponibles_cache = ReferenceCache('medicos_disponibles', _load_medicos_disponibles)
+especialidades_cache = ReferenceCache('especialidades', _load_especialidades)
+
+def invalidate_doctor_caches():
+    medicos_disponibles_cache.invalidate()
+    especialidades_cache.invalidate()
+    stats_service.invalidate()
+
 # Endpoint para obtener médicos disponibles
 @doctors_bp.route('/api/medicos/disponibles', methods=['GET'])
 def get_medicos_disponibles():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Error de conexión a la base de datos'}), 500
-        
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT id_medico, nombre_completo, especialidad 
-                FROM medicos 
-                WHERE estado = 'A'
-                ORDER BY nombre_completo
-            """)
-            medicos = [{
-                'id_medico': row[0],
-                'nombre_completo': row[1],
-                'especialidad': row[2]
-            } for row in cursor.fetchall()]
-            
-            return jsonify(medicos)
+        return jsonify(medicos_disponibles_cache.get())
+    except ConnectionError:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 500
     except pyodbc.Error as e:
         logging.error(f"Error en base de datos: {str(e)}")
         return jsonify({'error': 'Error al obtener médicos'}), 500
-    finally:
-        conn.close()
+
+def format_medico(row):
+    return {
+        'id_medico': row[0],
+        'nombre_completo': row[1],
+        'especialidad': row[2],
+        'telefono': row[3],
+        'correo': row[4],
+        'estado': row[5]
+    }
 
 # Endpoint para obtener todos los médicos
 @doctors_bp.route('/api/medicos', methods=['GET'])
 def get_medicos():
+    # Con limit/cursor se devuelve una página keyset sobre (nombre_completo, id_medico);
+    # con ?stream=1 o ?stream=ndjson la lista completa se escribe por lotes y
+    # con ?db_json=1 SQL Server genera el JSON (FOR JSON PATH) y con ?since=<token>
+    # solo los médicos creados o modificados desde el token. El ETag sale de la
+    # versión de la tabla: si el cliente ya la tiene se responde 304 sin consultar.
     conn = get_db_connection()
     if not conn:
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
         
     try:
+        etag = make_etag('medicos', table_version(conn, 'medicos'), request_variant(request))
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
+        etag_on_success(etag)
+
+        # Con ?since=<token> solo las filas que cambiaron desde ese token
+        if is_delta_request(request.args):
+            rows, sync_token, full = fetch_changes(conn, 'medicos', """
+                id_medico, nombre_completo, especialidad, telefono, correo, estado
+            """, 'id_medico', request.args.get('since'))
+            return jsonify({
+                'medicos': [format_medico(row) for row in rows],
+                'sync_token': sync_token,
+                'full': full
+            })
+
+        if wants_db_json(request) and not is_keyset_request(request.args):
+            return stream_for_json(conn, """
+                SELECT id_medico, nombre_completo, especialidad, telefono, correo, estado 
+                FROM medicos
+                ORDER BY nombre_completo
+                FOR JSON PATH, INCLUDE_NULL_VALUES
+            """, [])
+
+        fmt = stream_format(request)
+        if fmt:
+            return stream_query(conn, """
+                SELECT id_medico, nombre_completo, especialidad, telefono, correo, estado 
+                FROM medicos
+                ORDER BY nombre_completo
+            """, [], format_medico, fmt)
+
         with conn.cursor() as cursor:
+            if is_keyset_request(request.args):
+                limit, after, count_mode = parse_keyset_args(request.args)
+                query = """
+                    SELECT id_medico, nombre_completo, especialidad, telefono, correo, estado 
+                    FROM medicos
+                    WHERE 1=1
+                """
+                params = []
+                estado = request.args.get('estado')
+                if estado:
+                    query += " AND estado = ?"
+                    params.append(estado)
+
+                rows, next_cursor, total, total_exact = fetch_page_with_total(
+                    conn, query, params, 'nombre_completo', 'id_medico', 1, 0, after, limit,
+                    'medicos', count_mode, bool(estado)
+                )
+
+                return jsonify({
+                    'medicos': [format_medico(row) for row in rows],
+                    'limit': limit,
+                    'next_cursor': next_cursor,
+                    'has_more': next_cursor is not None,
+                    'total': total,
+                    'total_exact': total_exact
+                })
+
             cursor.execute("""
                 SELECT id_medico, nombre_completo, especialidad, telefono, correo, estado 
                 FROM medicos
                 ORDER BY nombre_completo
             """)
-            medicos = [{
-                'id_medico': row[0],
-                'nombre_completo': row[1],
-                'especialidad': row[2],
-                'telefono': row[3],
-                'correo': row[4],
-                'estado': row[5]
-            } for row in cursor.fetchall()]
+            medicos = [format_medico(row) for row in cursor.fetchall()]
             
             return jsonify(medicos)
+    except (InvalidCursorError, DeltaSyncUnavailableError) as e:
+        return jsonify({'error': str(e)}), 400
     except pyodbc.Error as e:
         logging.error(f"Error en base de datos: {str(e)}")
         return jsonify({'error': 'Error al obtener médicos'}), 500
     finally:
         conn.close()
 
-# Endpoint para obtener especialidades únicas
-@doctors_bp.route('/api/medicos/especialidades', methods=['GET'])
-def get_especialidades():
+# Columnas de la tabla de médicos que el cliente puede ordenar
+MEDICOS_ORDERABLE = {
+    'id_medico': 'id_medico',
+    'nombre_completo': 'nombre_completo',
+    'especialidad': 'especialidad',
+    'estado': 'estado'
+}
+
+# Endpoint server-side para la tabla de médicos (protocolo de DataTables)
+@doctors_bp.route('/api/medicos/datatables', methods=['GET'])
+def get_medicos_datatables():
+    # Recibe draw/start/length/search[value]/order[i] y devuelve solo la página
+    # visible con recordsTotal y recordsFiltered. La búsqueda es por prefijo
+    # del nombre o de la especialidad; ?estado= y ?especialidad= son los filtros
+    # de la página y se comparan por igualdad.
     conn = get_db_connection()
     if not conn:
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
-        
+
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT DISTINCT especialidad 
-                FROM medicos 
-                WHERE especialidad IS NOT NULL
-                ORDER BY especialidad
-            """)
-            especialidades = [row[0] for row in cursor.fetchall()]
-            return jsonify(especialidades)
+        query = """
+            SELECT id_medico, nombre_completo, especialidad, telefono, correo, estado 
+            FROM medicos
+            WHERE 1=1
+        """
+        params = []
+        estado = request.args.get('estado')
+        if estado:
+            query += " AND estado = ?"
+            params.append(estado)
+        especialidad = request.args.get('especialidad')
+        if especialidad:
+            query += " AND especialidad = ?"
+            params.append(especialidad)
+
+        return jsonify(datatables_page(
+            conn, request.args, query, params, 'medicos', bool(estado or especialidad),
+            ['nombre_completo', 'especialidad'], MEDICOS_ORDERABLE,
+            'id_medico', 'nombre_completo', format_medico
+        ))
+    except (TimeoutError, PoolTimeoutError, ConnectionError) as e:
+        # El COUNT filtrado corre en otra conexión y puede agotar el tiempo
+        logging.error(f"Tiempo agotado al listar médicos: {str(e)}")
+        return jsonify({'error': 'Error al obtener médicos'}), 500
     except pyodbc.Error as e:
         logging.error(f"Error en base de datos: {str(e)}")
-        return jsonify({'error': 'Error al obtener especialidades'}), 500
+        return jsonify({'error': 'Error al obtener médicos'}), 500
     finally:
         conn.close()
 
+# Endpoint para obtener especialidades únicas
+@doctors_bp.route('/api/medicos/especialidades', methods=['GET'])
+def get_especialidades():
+    try:
+        especialidades, etag = especialidades_cache.entry()
+        return not_modified(request, etag) or with_etag(jsonify(especialidades), etag)
+    except ConnectionError:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+    except pyodbc.Error as e:
+        logging.error(f"Error en base de datos: {str(e)}")
+        return jsonify({'error': 'Error al obtener especialidades'}), 500
+
 # Endpoint para obtener un médico específico
 @doctors_bp.route('/api/medicos/<int:id_medico>', methods=['GET'])
 def get_medico(id_medico):
@@ -137,12 +279,7 @@ def create_medico():
     try:
         with conn.cursor() as cursor:
             # Verificar si la tabla tiene la columna fecha_creacion
-            cursor.execute("""
-                SELECT COLUMN_NAME 
-                FROM INFORMATION_SCHEMA.COLUMNS 
-                WHERE TABLE_NAME = 'medicos' AND COLUMN_NAME = 'fecha_creacion'
-            """)
-            tiene_fecha_creacion = cursor.fetchone()
+            tiene_fecha_creacion = schema_cache.has_column('medicos', 'fecha_creacion', conn)
             
             if tiene_fecha_creacion:
                 cursor.execute("""
@@ -179,9 +316,11 @@ def create_medico():
                 ))
             
             conn.commit()
+            invalidate_doctor_caches()
             
             # Obtener ID del nuevo médico
             medico_id = cursor.execute("SELECT SCOPE_IDENTITY()").fetchone()[0]
+            activity_log.record('Médico', 'creado', medico_id, data['nombre_completo'], data['especialidad'])
             
             return jsonify({
                 'message': 'Médico creado exitosamente',
@@ -209,12 +348,7 @@ def update_medico(id_medico):
     try:
         with conn.cursor() as cursor:
             # Verificar si la tabla tiene la columna fecha_actualizacion
-            cursor.execute("""
-                SELECT COLUMN_NAME 
-                FROM INFORMATION_SCHEMA.COLUMNS 
-                WHERE TABLE_NAME = 'medicos' AND COLUMN_NAME = 'fecha_actualizacion'
-            """)
-            tiene_fecha_actualizacion = cursor.fetchone()
+            tiene_fecha_actualizacion = schema_cache.has_column('medicos', 'fecha_actualizacion', conn)
             
             if tiene_fecha_actualizacion:
                 cursor.execute("""
@@ -256,6 +390,8 @@ def update_medico(id_medico):
                 return jsonify({'error': 'Médico no encontrado'}), 404
                 
             conn.commit()
+            invalidate_doctor_caches()
+            activity_log.record('Médico', 'actualizado', id_medico, data['nombre_completo'], data['especialidad'])
             
             return jsonify({'message': 'Médico actualizado exitosamente'})
     except pyodbc.Error as e:
@@ -273,9 +409,12 @@ def toggle_medico_status(id_medico):
 
     try:
         with conn.cursor() as cursor:
+            # Verificar si la tabla tiene la columna fecha_actualizacion
+            tiene_fecha_actualizacion = schema_cache.has_column('medicos', 'fecha_actualizacion', conn)
+
             # Obtener el estado actual del médico
             cursor.execute("""
-                SELECT estado FROM medicos WHERE id_medico = ?
+                SELECT estado, nombre_completo FROM medicos WHERE id_medico = ?
             """, (id_medico,))
 
             row = cursor.fetchone()
@@ -290,14 +429,6 @@ def toggle_medico_status(id_medico):
             new_status = 'I' if current_status == 'A' else 'A'
             action_text = 'desactivado' if new_status == 'I' else 'activado'
 
-            # Verificar si la tabla tiene la columna fecha_actualizacion
-            cursor.execute("""
-                SELECT COLUMN_NAME
-                FROM INFORMATION_SCHEMA.COLUMNS
-                WHERE TABLE_NAME = 'medicos' AND COLUMN_NAME = 'fecha_actualizacion'
-            """)
-            tiene_fecha_actualizacion = cursor.fetchone()
-
             if tiene_fecha_actualizacion:
                 cursor.execute("""
                     UPDATE medicos SET
@@ -316,6 +447,8 @@ def toggle_medico_status(id_medico):
                 return jsonify({'error': 'Médico no encontrado'}), 404
 
             conn.commit()
+            invalidate_doctor_caches()
+            activity_log.record('Médico', action_text, id_medico, row[1])
 
             return jsonify({
                 'message': f'Médico {action_text} exitosamente',
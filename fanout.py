@@ -0,0 +1,106 @@
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import pyodbc
+from database import pool, PoolTimeoutError
+from config import FANOUT_MAX_WORKERS, FANOUT_QUERY_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Hilos compartidos por todas las peticiones. Debe ser menor que DB_POOL_MAX_SIZE
+# para que las consultas en paralelo no dejen sin conexiones al resto.
+_executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix='fanout')
+
+# Errores que se registran como resultado parcial en lugar de propagarse
+_QUERY_ERRORS = (pyodbc.Error, ConnectionError, PoolTimeoutError, TimeoutError)
+
+
+class FanOutResult:
+    """Resultados por nombre de tarea; errors guarda la excepción de las que fallaron"""
+
+    def __init__(self):
+        self.values = {}
+        self.errors = {}
+
+    @property
+    def complete(self):
+        return not self.errors
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+
+def _run_pooled(task, conn, timeout):
+    if conn is None:
+        conn = pool.acquire(timeout)
+    try:
+        # Tiempo límite de la sentencia en el servidor, para que el hilo y la
+        # conexión se liberen aunque nadie espere ya el resultado
+        raw = conn.raw
+        previous = raw.timeout
+        raw.timeout = max(1, math.ceil(timeout))
+        try:
+            return task(conn)
+        finally:
+            raw.timeout = previous
+    finally:
+        conn.close()
+
+
+def fan_out(tasks, conn=None, timeout=None, required=()):
+    """Ejecuta consultas de lectura independientes en paralelo.
+
+    tasks es un diccionario nombre -> función(conn); cada función recibe su
+    propia conexión del pool y corre en el grupo de hilos acotado. Si se pasa
+    conn, la primera tarea corre en el hilo actual con esa conexión (la del
+    endpoint) y sus excepciones se propagan tal cual; las demás solo van en
+    paralelo si hay una conexión libre en ese momento (pool.try_acquire) y si
+    no corren después, también con conn: quien ya tiene una conexión no
+    espera por otra, porque con el pool lleno cada petición retendría la suya
+    esperando una segunda hasta agotar el tiempo. timeout (segundos) se
+    aplica a todo el grupo: las tareas que no terminan a tiempo quedan en
+    errors como TimeoutError. Los errores de base de datos de las tareas en
+    paralelo no interrumpen a las demás y también quedan en errors, salvo
+    las nombradas en required, cuyo error se relanza. Las tareas no deben
+    llamar a fan_out: los hilos del grupo se agotarían.
+    """
+    timeout = FANOUT_QUERY_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    items = list(tasks.items())
+    inline = items.pop(0) if conn is not None else None
+
+    futures, deferred = [], []
+    for name, task in items:
+        pooled = None
+        if conn is not None:
+            pooled = pool.try_acquire()
+            if pooled is None:
+                deferred.append((name, task))
+                continue
+        futures.append((name, _executor.submit(_run_pooled, task, pooled, timeout)))
+
+    result = FanOutResult()
+    if inline:
+        name, task = inline
+        result.values[name] = task(conn)
+        for name, task in deferred:
+            try:
+                result.values[name] = task(conn)
+            except _QUERY_ERRORS as e:
+                result.errors[name] = e
+
+    for name, future in futures:
+        try:
+            result.values[name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            result.errors[name] = TimeoutError(f"La consulta '{name}' superó {timeout:g} s")
+        except _QUERY_ERRORS as e:
+            result.errors[name] = e
+
+    for name, error in result.errors.items():
+        if name in required:
+            raise error
+        logger.warning(f"Resultado parcial, la consulta '{name}' falló: {str(error)}")
+    return result
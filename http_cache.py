@@ -0,0 +1,79 @@
+import hashlib
+import json
+from flask import Response, after_this_request
+from schema_cache import schema_cache
+
+# Columnas candidatas para la versión de una tabla, de la más fiable a la menos;
+# se usa solo la primera que exista. version_fila (rowversion, migración 0003)
+# cambia con cualquier escritura; las fechas solo con las que las actualizan.
+_VERSION_COLUMNS = ('version_fila', 'fecha_actualizacion', 'fecha_creacion')
+
+# Parámetros que los clientes añaden para saltarse la caché (jQuery/DataTables)
+_IGNORED_ARGS = ('_',)
+
+
+def table_version(conn, table):
+    """Huella barata del contenido de la tabla: máximo de la columna de versión y número de filas.
+
+    Con version_fila el máximo sale de su índice (IX_<tabla>_version_fila) y
+    el número de filas, que detecta las bajas, de sys.partitions, así que no
+    se recorre la tabla. Sin ella se usa la fecha disponible y COUNT_BIG(*).
+    """
+    columns = schema_cache.columns(table, conn)
+    column = next((name for name in _VERSION_COLUMNS if name in columns), None)
+    params = ()
+    if column == 'version_fila':
+        query = f"""
+            SELECT CONVERT(bigint, MAX(version_fila)),
+                   (SELECT SUM(rows) FROM sys.partitions
+                    WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1))
+            FROM {table}
+        """
+        params = (f'dbo.{table}',)
+    elif column:
+        query = f"SELECT MAX({column}), COUNT_BIG(*) FROM {table}"
+    else:
+        query = f"SELECT COUNT_BIG(*) FROM {table}"
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        return tuple(cursor.fetchone())
+    finally:
+        cursor.close()
+
+
+def make_etag(*parts):
+    """ETag débil a partir de cualquier conjunto de valores serializables"""
+    payload = json.dumps(parts, default=str, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:20]
+
+
+def request_variant(request):
+    """Parámetros de la petición que cambian la representación, sin los anti-caché"""
+    return sorted(
+        (key, value) for key, value in request.args.items(multi=True)
+        if key not in _IGNORED_ARGS
+    )
+
+
+def not_modified(request, etag):
+    """Respuesta 304 si el cliente ya tiene la versión etag, si no None"""
+    if request.if_none_match.contains_weak(etag):
+        return with_etag(Response(status=304), etag)
+    return None
+
+
+def etag_on_success(etag):
+    """Añade el ETag a la respuesta que devuelva el endpoint si termina en 200"""
+    @after_this_request
+    def add_etag(response):
+        if response.status_code == 200:
+            with_etag(response, etag)
+        return response
+
+
+def with_etag(response, etag):
+    """Añade el ETag y obliga al navegador a revalidar antes de reutilizar"""
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
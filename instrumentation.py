@@ -0,0 +1,247 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from flask import g, has_request_context, request
+from config import SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_LOG_FILE
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('slow_queries')
+
+_STRING_LITERAL = re.compile(r"N?'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Normaliza una sentencia SQL para agrupar ejecuciones equivalentes.
+
+    Colapsa espacios y reemplaza literales de texto y números por '?', de
+    modo que la misma consulta con distintos valores produzca la misma huella.
+    """
+    text = _STRING_LITERAL.sub('?', sql)
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _WHITESPACE.sub(' ', text).strip()
+    digest = hashlib.md5(text.encode('utf-8')).hexdigest()[:8]
+    return digest, text
+
+
+class QueryStats:
+    """Acumulado por huella de todas las sentencias ejecutadas en el proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_fingerprint = {}
+
+    def record(self, digest, text, endpoint, duration_ms, rows):
+        with self._lock:
+            entry = self._by_fingerprint.get(digest)
+            if entry is None:
+                entry = self._by_fingerprint[digest] = {
+                    'fingerprint': digest,
+                    'sql': text,
+                    'endpoints': set(),
+                    'calls': 0,
+                    'rows': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0
+                }
+            entry['calls'] += 1
+            entry['rows'] += rows
+            entry['total_ms'] += duration_ms
+            entry['max_ms'] = max(entry['max_ms'], duration_ms)
+            if endpoint:
+                entry['endpoints'].add(endpoint)
+
+    def snapshot(self, limit=50):
+        """Sentencias ordenadas por tiempo total consumido"""
+        with self._lock:
+            entries = [dict(e, endpoints=sorted(e['endpoints']))
+                       for e in self._by_fingerprint.values()]
+        for entry in entries:
+            entry['avg_ms'] = round(entry['total_ms'] / entry['calls'], 3)
+            entry['total_ms'] = round(entry['total_ms'], 3)
+            entry['max_ms'] = round(entry['max_ms'], 3)
+        entries.sort(key=lambda e: e['total_ms'], reverse=True)
+        return entries[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._by_fingerprint.clear()
+
+
+query_stats = QueryStats()
+
+
+def _current_endpoint():
+    if has_request_context():
+        return request.endpoint
+    return None
+
+
+def _request_totals():
+    if not has_request_context():
+        return None
+    totals = g.get('_sql_totals')
+    if totals is None:
+        totals = g._sql_totals = {'queries': 0, 'db_time_ms': 0.0, 'rows': 0}
+    return totals
+
+
+class InstrumentedCursor:
+    """Envoltura de un cursor pyodbc que mide cada sentencia.
+
+    Cada sentencia se cierra (y se registra) cuando el cursor ejecuta la
+    siguiente, se cierra o sale de su bloque with. El tiempo de fetch se
+    suma al de ejecución porque también es tiempo de base de datos.
+    """
+
+    _OWN_ATTRIBUTES = ('_cursor', '_current', '_tracked')
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._current = None
+        self._tracked = False
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # Opciones del cursor como fast_executemany o arraysize van al cursor real
+        if name in self._OWN_ATTRIBUTES:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._finish()
+        return self._cursor.__exit__(exc_type, exc, tb)
+
+    def execute(self, sql, *params):
+        self._begin(sql)
+        start = time.perf_counter()
+        try:
+            self._cursor.execute(sql, *params)
+        finally:
+            self._add_time(start)
+        return self
+
+    def executemany(self, sql, params):
+        self._begin(sql)
+        start = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, params)
+        finally:
+            self._add_time(start)
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._add_time(start, 1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._add_time(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._add_time(start, len(rows))
+        return rows
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def _begin(self, sql):
+        self._finish()
+        self._current = {'sql': sql, 'elapsed': 0.0, 'rows': 0}
+        totals = _request_totals()
+        if totals is not None:
+            totals['queries'] += 1
+            if not self._tracked:
+                # after_request registra las sentencias de cursores sin cerrar
+                g.setdefault('_sql_open_cursors', []).append(self)
+                self._tracked = True
+
+    def _add_time(self, start, rows=0):
+        elapsed = time.perf_counter() - start
+        if self._current is not None:
+            self._current['elapsed'] += elapsed
+            self._current['rows'] += rows
+        totals = _request_totals()
+        if totals is not None:
+            totals['db_time_ms'] += elapsed * 1000
+            totals['rows'] += rows
+
+    def _finish(self):
+        current, self._current = self._current, None
+        if current is None:
+            return
+
+        digest, text = fingerprint(current['sql'])
+        duration_ms = current['elapsed'] * 1000
+        endpoint = _current_endpoint()
+        query_stats.record(digest, text, endpoint, duration_ms, current['rows'])
+
+        logger.debug(
+            f"sql fingerprint={digest} endpoint={endpoint} "
+            f"duration_ms={duration_ms:.2f} rows={current['rows']}"
+        )
+        if duration_ms >= SLOW_QUERY_THRESHOLD_MS:
+            slow_query_logger.warning(
+                f"fingerprint={digest} endpoint={endpoint} "
+                f"duration_ms={duration_ms:.2f} rows={current['rows']} sql={text}"
+            )
+
+
+def _before_request():
+    g._sql_totals = {'queries': 0, 'db_time_ms': 0.0, 'rows': 0}
+    g._sql_started = time.perf_counter()
+
+
+def _after_request(response):
+    for cursor in g.pop('_sql_open_cursors', []):
+        cursor._finish()
+
+    totals = g.get('_sql_totals')
+    if totals is None:
+        return response
+
+    response.headers['X-DB-Query-Count'] = str(totals['queries'])
+    response.headers['X-DB-Time-Ms'] = f"{totals['db_time_ms']:.2f}"
+
+    if totals['queries']:
+        total_ms = (time.perf_counter() - g.get('_sql_started', time.perf_counter())) * 1000
+        logger.info(
+            f"request endpoint={request.endpoint} status={response.status_code} "
+            f"queries={totals['queries']} db_time_ms={totals['db_time_ms']:.2f} "
+            f"rows={totals['rows']} total_ms={total_ms:.2f}"
+        )
+    return response
+
+
+def init_app(app):
+    """Registra los hooks de medición por petición y el log de consultas lentas"""
+    if SLOW_QUERY_LOG_FILE and not slow_query_logger.handlers:
+        handler = logging.FileHandler(SLOW_QUERY_LOG_FILE)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        slow_query_logger.addHandler(handler)
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -0,0 +1,28 @@
+DROP INDEX IF EXISTS IX_password_reset_tokens_token ON dbo.password_reset_tokens
+GO
+DROP INDEX IF EXISTS IX_usuarios_nombre ON dbo.usuarios
+GO
+DROP INDEX IF EXISTS IX_usuarios_gmail ON dbo.usuarios
+GO
+DROP INDEX IF EXISTS IX_usuarios_cedula ON dbo.usuarios
+GO
+DROP INDEX IF EXISTS IX_medicos_especialidad ON dbo.medicos
+GO
+DROP INDEX IF EXISTS IX_medicos_activos_nombre ON dbo.medicos
+GO
+DROP INDEX IF EXISTS IX_medicos_nombre ON dbo.medicos
+GO
+DROP INDEX IF EXISTS IX_pacientes_fecha_creacion ON dbo.pacientes
+GO
+DROP INDEX IF EXISTS IX_pacientes_estado_nombre ON dbo.pacientes
+GO
+DROP INDEX IF EXISTS IX_pacientes_nombre ON dbo.pacientes
+GO
+DROP INDEX IF EXISTS IX_horarios_medico_dia_inicio ON dbo.horarios_disponibles
+GO
+DROP INDEX IF EXISTS IX_citas_fecha_hora ON dbo.citas
+GO
+DROP INDEX IF EXISTS IX_citas_paciente_fecha ON dbo.citas
+GO
+DROP INDEX IF EXISTS IX_citas_medico_fecha_hora ON dbo.citas
+GO
@@ -0,0 +1,112 @@
+-- Índices para los predicados WHERE / ORDER BY de los blueprints.
+-- Ver "python migrations.py report" para el mapa consulta -> índice.
+
+-- citas: disponibilidad y reserva por médico/fecha/hora
+-- (appointments.get_horarios_disponibles, appointments.crear_cita)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_citas_medico_fecha_hora' AND object_id = OBJECT_ID('dbo.citas'))
+    CREATE NONCLUSTERED INDEX IX_citas_medico_fecha_hora
+        ON dbo.citas (id_medico, fecha_cita, hora_cita)
+GO
+
+-- citas: citas futuras de un paciente
+-- (patients.update_paciente_status, patients.delete_paciente)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_citas_paciente_fecha' AND object_id = OBJECT_ID('dbo.citas'))
+    CREATE NONCLUSTERED INDEX IX_citas_paciente_fecha
+        ON dbo.citas (id_paciente, fecha_cita)
+GO
+
+-- citas: citas del día y últimas citas programadas
+-- (dashboard.admin_stats, dashboard.recent_activity)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_citas_fecha_hora' AND object_id = OBJECT_ID('dbo.citas'))
+    CREATE NONCLUSTERED INDEX IX_citas_fecha_hora
+        ON dbo.citas (fecha_cita, hora_cita)
+        INCLUDE (id_medico, id_paciente)
+GO
+
+-- horarios_disponibles: horarios de un médico por día y detección de conflictos
+-- (schedules.*, utils/validators.check_schedule_conflict, appointments.get_horarios_disponibles)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_horarios_medico_dia_inicio' AND object_id = OBJECT_ID('dbo.horarios_disponibles'))
+    CREATE NONCLUSTERED INDEX IX_horarios_medico_dia_inicio
+        ON dbo.horarios_disponibles (id_medico, dia_semana, hora_inicio)
+        INCLUDE (hora_fin)
+GO
+
+-- pacientes: listados ordenados por nombre, filtrados o no por estado
+-- (patients.get_pacientes, patients.get_pacientes_detallados, patients.get_pacientes_stats)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_pacientes_nombre' AND object_id = OBJECT_ID('dbo.pacientes'))
+    CREATE NONCLUSTERED INDEX IX_pacientes_nombre
+        ON dbo.pacientes (nombre_completo)
+        INCLUDE (estado, cedula, telefono, correo, fecha_creacion)
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_pacientes_estado_nombre' AND object_id = OBJECT_ID('dbo.pacientes'))
+    CREATE NONCLUSTERED INDEX IX_pacientes_estado_nombre
+        ON dbo.pacientes (estado, nombre_completo)
+GO
+
+-- pacientes: filtros por fecha de registro y nuevos del mes
+-- (patients.get_pacientes_detallados, patients.get_pacientes_stats)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_pacientes_fecha_creacion' AND object_id = OBJECT_ID('dbo.pacientes'))
+    CREATE NONCLUSTERED INDEX IX_pacientes_fecha_creacion
+        ON dbo.pacientes (fecha_creacion)
+GO
+
+-- medicos: listado completo ordenado por nombre (cubriente)
+-- (doctors.get_medicos)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_medicos_nombre' AND object_id = OBJECT_ID('dbo.medicos'))
+    CREATE NONCLUSTERED INDEX IX_medicos_nombre
+        ON dbo.medicos (nombre_completo)
+        INCLUDE (especialidad, telefono, correo, estado)
+GO
+
+-- medicos: médicos activos ordenados por nombre y conteo de activos (filtrado)
+-- (doctors.get_medicos_disponibles, dashboard.admin_stats)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_medicos_activos_nombre' AND object_id = OBJECT_ID('dbo.medicos'))
+    CREATE NONCLUSTERED INDEX IX_medicos_activos_nombre
+        ON dbo.medicos (nombre_completo)
+        INCLUDE (especialidad)
+        WHERE estado = 'A'
+GO
+
+-- medicos: especialidades distintas (filtrado)
+-- (doctors.get_especialidades)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_medicos_especialidad' AND object_id = OBJECT_ID('dbo.medicos'))
+    CREATE NONCLUSTERED INDEX IX_medicos_especialidad
+        ON dbo.medicos (especialidad)
+        WHERE especialidad IS NOT NULL
+GO
+
+-- usuarios: login y validación de duplicados por cédula (filtrado)
+-- (auth.login, users.create_user, users.update_user)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_usuarios_cedula' AND object_id = OBJECT_ID('dbo.usuarios'))
+    CREATE NONCLUSTERED INDEX IX_usuarios_cedula
+        ON dbo.usuarios (cedula)
+        INCLUDE (id_usuario, nombre_completo, id_rol, [contraseña])
+        WHERE cedula IS NOT NULL
+GO
+
+-- usuarios: recuperación de contraseña por correo (filtrado)
+-- (users.request_password_recovery)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_usuarios_gmail' AND object_id = OBJECT_ID('dbo.usuarios'))
+    CREATE NONCLUSTERED INDEX IX_usuarios_gmail
+        ON dbo.usuarios (gmail)
+        INCLUDE (usuario_login)
+        WHERE gmail IS NOT NULL
+GO
+
+-- usuarios: listado paginado ordenado por nombre (cubriente)
+-- (users.get_users)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_usuarios_nombre' AND object_id = OBJECT_ID('dbo.usuarios'))
+    CREATE NONCLUSTERED INDEX IX_usuarios_nombre
+        ON dbo.usuarios (nombre_completo)
+        INCLUDE (usuario_login, cedula, telefono, gmail, id_rol, activo)
+GO
+
+-- password_reset_tokens: validación de tokens vigentes (filtrado)
+-- (users.reset_password)
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_password_reset_tokens_token' AND object_id = OBJECT_ID('dbo.password_reset_tokens'))
+    CREATE NONCLUSTERED INDEX IX_password_reset_tokens_token
+        ON dbo.password_reset_tokens (token)
+        INCLUDE (id_usuario, expiration)
+        WHERE used = 0
+GO
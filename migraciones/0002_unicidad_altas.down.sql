@@ -0,0 +1,17 @@
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_usuarios_cedula' AND object_id = OBJECT_ID('dbo.usuarios'))
+    CREATE NONCLUSTERED INDEX IX_usuarios_cedula
+        ON dbo.usuarios (cedula)
+        INCLUDE (id_usuario, nombre_completo, id_rol, [contraseña])
+        WHERE cedula IS NOT NULL
+GO
+
+DROP INDEX IF EXISTS UX_usuarios_cedula ON dbo.usuarios
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_citas_medico_fecha_hora' AND object_id = OBJECT_ID('dbo.citas'))
+    CREATE NONCLUSTERED INDEX IX_citas_medico_fecha_hora
+        ON dbo.citas (id_medico, fecha_cita, hora_cita)
+GO
+
+DROP INDEX IF EXISTS UX_citas_medico_fecha_hora ON dbo.citas
+GO
@@ -0,0 +1,25 @@
+-- Unicidad garantizada por la base de datos para las altas de una sola sentencia
+-- (INSERT ... OUTPUT). Los endpoints traducen la violación (2627/2601) a un 400.
+-- Si existen duplicados previos la migración falla y debe depurarse antes.
+
+-- citas: un médico no puede tener dos citas a la misma fecha y hora
+-- (appointments.crear_cita). Sustituye a IX_citas_medico_fecha_hora, misma clave.
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_citas_medico_fecha_hora' AND object_id = OBJECT_ID('dbo.citas'))
+    CREATE UNIQUE NONCLUSTERED INDEX UX_citas_medico_fecha_hora
+        ON dbo.citas (id_medico, fecha_cita, hora_cita)
+GO
+
+DROP INDEX IF EXISTS IX_citas_medico_fecha_hora ON dbo.citas
+GO
+
+-- usuarios: cédula única cuando está informada (users.create_user, users.update_user).
+-- Sustituye a IX_usuarios_cedula, mismas columnas incluidas para auth.login.
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_usuarios_cedula' AND object_id = OBJECT_ID('dbo.usuarios'))
+    CREATE UNIQUE NONCLUSTERED INDEX UX_usuarios_cedula
+        ON dbo.usuarios (cedula)
+        INCLUDE (id_usuario, nombre_completo, id_rol, [contraseña])
+        WHERE cedula IS NOT NULL
+GO
+
+DROP INDEX IF EXISTS IX_usuarios_cedula ON dbo.usuarios
+GO
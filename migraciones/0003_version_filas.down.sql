@@ -0,0 +1,13 @@
+DROP INDEX IF EXISTS IX_pacientes_version_fila ON dbo.pacientes
+GO
+
+IF COL_LENGTH('dbo.pacientes', 'version_fila') IS NOT NULL
+    ALTER TABLE dbo.pacientes DROP COLUMN version_fila
+GO
+
+DROP INDEX IF EXISTS IX_medicos_version_fila ON dbo.medicos
+GO
+
+IF COL_LENGTH('dbo.medicos', 'version_fila') IS NOT NULL
+    ALTER TABLE dbo.medicos DROP COLUMN version_fila
+GO
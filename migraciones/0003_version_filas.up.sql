@@ -0,0 +1,22 @@
+-- Versión de fila (rowversion) para los ETag de los catálogos (http_cache.table_version)
+-- y la sincronización incremental de listados. SQL Server la cambia en cada
+-- INSERT/UPDATE, aunque la sentencia no toque fecha_actualizacion.
+
+IF COL_LENGTH('dbo.medicos', 'version_fila') IS NULL
+    ALTER TABLE dbo.medicos ADD version_fila rowversion
+GO
+
+-- MAX(version_fila) se resuelve leyendo el último elemento del índice
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_medicos_version_fila' AND object_id = OBJECT_ID('dbo.medicos'))
+    CREATE NONCLUSTERED INDEX IX_medicos_version_fila
+        ON dbo.medicos (version_fila)
+GO
+
+IF COL_LENGTH('dbo.pacientes', 'version_fila') IS NULL
+    ALTER TABLE dbo.pacientes ADD version_fila rowversion
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_pacientes_version_fila' AND object_id = OBJECT_ID('dbo.pacientes'))
+    CREATE NONCLUSTERED INDEX IX_pacientes_version_fila
+        ON dbo.pacientes (version_fila)
+GO
@@ -0,0 +1,2 @@
+DROP TABLE IF EXISTS dbo.eventos_actividad
+GO
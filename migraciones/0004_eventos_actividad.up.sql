@@ -0,0 +1,15 @@
+-- Registro de actividad del panel de administración (activity.ActivityLog).
+-- Solo se anexan filas, por lotes; el panel lee los eventos recientes de memoria
+-- y esta tabla solo se consulta al arrancar para recuperar el historial.
+IF OBJECT_ID('dbo.eventos_actividad', 'U') IS NULL
+    CREATE TABLE dbo.eventos_actividad (
+        id_evento bigint IDENTITY(1,1) NOT NULL
+            CONSTRAINT PK_eventos_actividad PRIMARY KEY CLUSTERED,
+        tipo varchar(20) NOT NULL,
+        accion varchar(20) NOT NULL,
+        id_entidad int NULL,
+        nombre nvarchar(150) NULL,
+        detalles nvarchar(300) NULL,
+        fecha_evento datetime2(0) NOT NULL
+    )
+GO
@@ -0,0 +1,7 @@
+-- Búsqueda por prefijo de los listados server-side (datatables.datatables_page).
+-- nombre_completo y cedula ya tienen índice (IX_pacientes_nombre, UNIQUE(cedula));
+-- falta telefono para que "telefono LIKE '099%'" sea una búsqueda por rango.
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_pacientes_telefono' AND object_id = OBJECT_ID('dbo.pacientes'))
+    CREATE NONCLUSTERED INDEX IX_pacientes_telefono
+        ON dbo.pacientes (telefono)
+GO
@@ -0,0 +1,2 @@
+DROP INDEX IF EXISTS IX_pacientes_correo ON dbo.pacientes
+GO
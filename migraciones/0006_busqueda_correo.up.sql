@@ -0,0 +1,8 @@
+-- Búsqueda por prefijo de los listados server-side (datatables.datatables_page):
+-- correo es la única columna de la búsqueda de pacientes sin índice, y sin él el
+-- OR de prefijos no puede resolverse con búsquedas por rango.
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_pacientes_correo' AND object_id = OBJECT_ID('dbo.pacientes'))
+    CREATE NONCLUSTERED INDEX IX_pacientes_correo
+        ON dbo.pacientes (correo)
+        WHERE correo IS NOT NULL
+GO
@@ -0,0 +1,309 @@
+"""Ejecutor de migraciones versionadas del esquema.
+
+Cada migración es un par de scripts en migraciones/:
+
+    0001_descripcion.up.sql     cambios a aplicar
+    0001_descripcion.down.sql   cambios para revertirla
+
+Los scripts se dividen en lotes con líneas GO, igual que los respaldos de
+SQL Server Management Studio. Cada migración se aplica en una transacción y
+queda registrada en la tabla schema_migrations.
+
+Uso:
+    python migrations.py status
+    python migrations.py up [--to VERSION]
+    python migrations.py down [--to VERSION]
+    python migrations.py report
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+import pyodbc
+from database import db_connection
+from schema_cache import schema_cache
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migraciones')
+
+_FILE_PATTERN = re.compile(r'^(\d{4})_([\w-]+)\.(up|down)\.sql$')
+_GO_PATTERN = re.compile(r'^\s*GO\s*$', re.IGNORECASE | re.MULTILINE)
+
+# Mapa de cada consulta de los blueprints al índice que la resuelve.
+# "python migrations.py report" lo muestra junto con el estado del índice.
+QUERY_INDEX_MAP = [
+    ('appointments.get_horarios_disponibles', 'citas',
+     'id_medico = ? AND fecha_cita = ? ORDER BY hora_cita', 'UX_citas_medico_fecha_hora'),
+    ('appointments.get_horarios_disponibles', 'horarios_disponibles',
+     'id_medico = ? AND dia_semana = ?', 'IX_horarios_medico_dia_inicio'),
+    ('booking.book_appointment', 'citas',
+     'UNIQUE (id_medico, fecha_cita, hora_cita)', 'UX_citas_medico_fecha_hora'),
+    ('booking.book_appointment', 'horarios_disponibles',
+     'id_medico = ? AND dia_semana = ? AND hora_inicio <= ?', 'IX_horarios_medico_dia_inicio'),
+    ('appointments.buscar_primeras_disponibles', 'citas',
+     'fecha_cita BETWEEN ? AND ?', 'IX_citas_fecha_hora'),
+    ('appointments.buscar_primeras_disponibles', 'horarios_disponibles',
+     'JOIN medicos ON id_medico', 'IX_horarios_medico_dia_inicio'),
+    ('auth.login', 'usuarios',
+     'usuario_login = ? OR cedula = ?', 'UNIQUE(usuario_login) + UX_usuarios_cedula'),
+    ('activity.ActivityLog (historial al arrancar)', 'eventos_actividad',
+     'fecha_evento < ? ORDER BY id_evento DESC', 'PK_eventos_actividad'),
+    ('doctors.get_medicos', 'medicos',
+     'ORDER BY nombre_completo', 'IX_medicos_nombre'),
+    ('doctors.get_medicos_disponibles', 'medicos',
+     "estado = 'A' ORDER BY nombre_completo", 'IX_medicos_activos_nombre'),
+    ('doctors.get_medicos_datatables', 'medicos',
+     "especialidad = ? AND (nombre_completo LIKE 'x%' OR especialidad LIKE 'x%')",
+     'IX_medicos_nombre + IX_medicos_especialidad'),
+    ('doctors.get_especialidades', 'medicos',
+     'especialidad IS NOT NULL ORDER BY especialidad', 'IX_medicos_especialidad'),
+    ('doctors.get_medicos (ETag)', 'medicos',
+     'MAX(version_fila)', 'IX_medicos_version_fila'),
+    ('doctors.get_medicos (?since=)', 'medicos',
+     'version_fila > ? AND version_fila < ?', 'IX_medicos_version_fila'),
+    ('patients.get_pacientes', 'pacientes',
+     'ORDER BY nombre_completo', 'IX_pacientes_nombre'),
+    ('patients.get_pacientes_detallados', 'pacientes',
+     'estado = ? ORDER BY nombre_completo', 'IX_pacientes_estado_nombre'),
+    ('patients.get_pacientes_detallados', 'pacientes',
+     'fecha_creacion BETWEEN ? AND ?', 'IX_pacientes_fecha_creacion'),
+    ('patients.get_pacientes_datatables', 'pacientes',
+     "nombre_completo/cedula/telefono/correo LIKE 'x%'",
+     'IX_pacientes_nombre + UNIQUE(cedula) + IX_pacientes_telefono + IX_pacientes_correo'),
+    ('patients.get_pacientes_detallados (?since=)', 'pacientes',
+     'version_fila > ? AND version_fila < ?', 'IX_pacientes_version_fila'),
+    ('stats_service.counters', 'medicos',
+     "estado = 'A'", 'IX_medicos_activos_nombre'),
+    ('stats_service.counters', 'pacientes',
+     "estado = 'A'", 'IX_pacientes_estado_nombre'),
+    ('stats_service.counters', 'pacientes',
+     'fecha_creacion >= inicio de mes', 'IX_pacientes_fecha_creacion'),
+    ('stats_service.counters', 'citas',
+     'fecha_cita >= hoy AND fecha_cita < mañana', 'IX_citas_fecha_hora'),
+    ('patients.check_cedula / create_paciente / update_paciente', 'pacientes',
+     'cedula = ?', 'UNIQUE(cedula)'),
+    ('patients.update_paciente_status / delete_paciente', 'citas',
+     'id_paciente = ? AND fecha_cita >= hoy', 'IX_citas_paciente_fecha'),
+    ('schedules.get_doctor_schedules / get_weekly_schedule', 'horarios_disponibles',
+     'id_medico = ? ORDER BY dia_semana, hora_inicio', 'IX_horarios_medico_dia_inicio'),
+    ('schedules.get_month_calendar', 'citas',
+     'fecha_cita >= ? AND fecha_cita < ?', 'IX_citas_fecha_hora'),
+    ('schedules.get_available_time_slots', 'horarios_disponibles',
+     'id_medico = ? AND dia_semana = ? ORDER BY hora_inicio', 'IX_horarios_medico_dia_inicio'),
+    ('schedules.check_schedule_conflict', 'horarios_disponibles',
+     'id_medico = ? AND dia_semana = ? AND rango de horas', 'IX_horarios_medico_dia_inicio'),
+    ('users.get_users', 'usuarios',
+     'ORDER BY nombre_completo', 'IX_usuarios_nombre'),
+    ('users.get_users_datatables', 'usuarios',
+     "nombre_completo LIKE 'x%' OR usuario_login LIKE 'x%' OR cedula LIKE 'x%'",
+     'IX_usuarios_nombre + UNIQUE(usuario_login) + UX_usuarios_cedula'),
+    ('users.create_user / update_user', 'usuarios',
+     'UNIQUE (usuario_login), UNIQUE (cedula)', 'UNIQUE(usuario_login) + UX_usuarios_cedula'),
+    ('users.request_password_recovery', 'usuarios',
+     'usuario_login = ? OR gmail = ?', 'UNIQUE(usuario_login) + IX_usuarios_gmail'),
+    ('users.reset_password', 'password_reset_tokens',
+     'token = ? AND used = 0 AND expiration > ?', 'IX_password_reset_tokens_token'),
+]
+
+
+class MigrationError(Exception):
+    """Error al aplicar o revertir una migración"""
+
+
+class Migration:
+    def __init__(self, version, name):
+        self.version = version
+        self.name = name
+        self.up_path = None
+        self.down_path = None
+
+    def read(self, direction):
+        path = self.up_path if direction == 'up' else self.down_path
+        if not path:
+            raise MigrationError(f"La migración {self.version:04d} no tiene script {direction}")
+        with open(path, encoding='utf-8-sig') as f:
+            return f.read()
+
+    def checksum(self):
+        return hashlib.md5(self.read('up').encode('utf-8')).hexdigest()
+
+    def batches(self, direction):
+        """Lotes del script separados por líneas GO"""
+        return [b.strip() for b in _GO_PATTERN.split(self.read(direction)) if b.strip()]
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """Migraciones disponibles en disco ordenadas por versión"""
+    migrations = {}
+    for filename in os.listdir(directory):
+        match = _FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        version, name, direction = int(match.group(1)), match.group(2), match.group(3)
+        migration = migrations.setdefault(version, Migration(version, name))
+        if migration.name != name:
+            raise MigrationError(f"Nombres distintos para la versión {version:04d}")
+        setattr(migration, f'{direction}_path', os.path.join(directory, filename))
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def ensure_tracking_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            IF OBJECT_ID('dbo.schema_migrations', 'U') IS NULL
+                CREATE TABLE dbo.schema_migrations (
+                    version INT NOT NULL PRIMARY KEY,
+                    nombre NVARCHAR(200) NOT NULL,
+                    checksum CHAR(32) NOT NULL,
+                    aplicada_en DATETIME NOT NULL DEFAULT GETDATE()
+                )
+        """)
+    conn.commit()
+
+
+def applied_versions(conn):
+    """Diccionario versión -> checksum de las migraciones aplicadas"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT version, checksum FROM dbo.schema_migrations")
+        return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def _run(conn, migration, direction):
+    cursor = conn.cursor()
+    try:
+        for batch in migration.batches(direction):
+            cursor.execute(batch)
+        if direction == 'up':
+            cursor.execute("""
+                INSERT INTO dbo.schema_migrations (version, nombre, checksum)
+                VALUES (?, ?, ?)
+            """, (migration.version, migration.name, migration.checksum()))
+        else:
+            cursor.execute("DELETE FROM dbo.schema_migrations WHERE version = ?",
+                           (migration.version,))
+        conn.commit()
+    except pyodbc.Error as e:
+        conn.rollback()
+        raise MigrationError(
+            f"Error en migración {migration.version:04d}_{migration.name} ({direction}): {str(e)}"
+        )
+    finally:
+        cursor.close()
+    logger.info(f"Migración {migration.version:04d}_{migration.name} {direction} aplicada")
+
+
+def migrate_up(target=None):
+    """Aplica las migraciones pendientes hasta target (inclusive) o todas"""
+    done = []
+    with db_connection() as conn:
+        ensure_tracking_table(conn)
+        applied = applied_versions(conn)
+        for migration in discover():
+            if target is not None and migration.version > target:
+                break
+            if migration.version in applied:
+                continue
+            _run(conn, migration, 'up')
+            done.append(migration.version)
+    if done:
+        schema_cache.invalidate()
+    return done
+
+
+def migrate_down(target=None):
+    """Revierte migraciones aplicadas por encima de target; sin target, solo la última"""
+    done = []
+    with db_connection() as conn:
+        ensure_tracking_table(conn)
+        applied = applied_versions(conn)
+        for migration in reversed(discover()):
+            if migration.version not in applied:
+                continue
+            if target is not None and migration.version <= target:
+                break
+            _run(conn, migration, 'down')
+            done.append(migration.version)
+            if target is None:
+                break
+    if done:
+        schema_cache.invalidate()
+    return done
+
+
+def status():
+    """Estado de cada migración: aplicada, pendiente o modificada tras aplicarse"""
+    with db_connection() as conn:
+        ensure_tracking_table(conn)
+        applied = applied_versions(conn)
+    result = []
+    for migration in discover():
+        checksum = applied.get(migration.version)
+        if checksum is None:
+            state = 'pendiente'
+        elif checksum.strip() != migration.checksum():
+            state = 'modificada'
+        else:
+            state = 'aplicada'
+        result.append({'version': migration.version, 'nombre': migration.name, 'estado': state})
+    return result
+
+
+def index_report():
+    """Cruza QUERY_INDEX_MAP con sys.indexes para ver qué índices faltan"""
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT OBJECT_NAME(object_id), name
+                FROM sys.indexes
+                WHERE name IS NOT NULL AND OBJECTPROPERTY(object_id, 'IsUserTable') = 1
+            """)
+            existing = {(row[0].lower(), row[1]) for row in cursor.fetchall()}
+
+    report = []
+    for endpoint, table, predicate, index in QUERY_INDEX_MAP:
+        named = [part.strip() for part in index.split('+') if part.strip().startswith(('IX_', 'UX_', 'PK_'))]
+        present = all((table, name) in existing for name in named)
+        report.append({
+            'endpoint': endpoint,
+            'tabla': table,
+            'predicado': predicate,
+            'indice': index,
+            'estado': 'ok' if present else 'falta'
+        })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migraciones del esquema de la clínica')
+    parser.add_argument('command', choices=['status', 'up', 'down', 'report'])
+    parser.add_argument('--to', type=int, default=None, help='versión objetivo')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    try:
+        if args.command == 'up':
+            done = migrate_up(args.to)
+            print(f"Migraciones aplicadas: {done or 'ninguna'}")
+        elif args.command == 'down':
+            done = migrate_down(args.to)
+            print(f"Migraciones revertidas: {done or 'ninguna'}")
+        elif args.command == 'status':
+            for item in status():
+                print(f"{item['version']:04d}  {item['estado']:<11} {item['nombre']}")
+        else:
+            for item in index_report():
+                print(f"[{item['estado']:<5}] {item['endpoint']}\n"
+                      f"        {item['tabla']}: {item['predicado']}\n"
+                      f"        -> {item['indice']}")
+    except (MigrationError, pyodbc.Error) as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
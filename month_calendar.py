@@ -0,0 +1,132 @@
+"""Calendario mensual de ocupación médico × día × franja con NumPy.
+
+La matriz se construye a partir de dos lecturas (bloques de
+horarios_disponibles y citas del mes) sin bucles por franja: los bloques se
+marcan en una plantilla semanal con sumas acumuladas, la plantilla se
+expande a los días del mes por indexación y las citas se marcan con
+asignación por índices. Cada celda vale FUERA_DE_HORARIO, LIBRE u OCUPADO.
+"""
+import base64
+import calendar
+import datetime
+import numpy as np
+from config import APPOINTMENT_SLOT_MINUTES
+
+FUERA_DE_HORARIO = 0
+LIBRE = 1
+OCUPADO = 2
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def _minutes(values):
+    return np.array([v.hour * 60 + v.minute for v in values], dtype=np.int32)
+
+
+class MonthCalendar:
+    """Matriz uint8 (médicos, días, franjas) de un mes"""
+
+    def __init__(self, doctor_ids, days, slot_minutes, grid):
+        self.doctor_ids = doctor_ids
+        self.days = days
+        self.slot_minutes = slot_minutes
+        self.grid = grid
+
+    def counts(self):
+        """Franjas libres y ocupadas por médico (arreglos alineados con doctor_ids)"""
+        return (self.grid == LIBRE).sum(axis=(1, 2)), (self.grid == OCUPADO).sum(axis=(1, 2))
+
+    def slot_bounds(self):
+        """Primera y última franja (exclusiva) con horario o citas en todo el mes"""
+        used = np.flatnonzero(self.grid.any(axis=(0, 1)))
+        if not used.size:
+            return 0, 0
+        return int(used[0]), int(used[-1]) + 1
+
+    def encode(self, index, first_slot, last_slot):
+        """Días × franjas del médico en base64, 2 bits por celda (4 por byte, MSB primero)"""
+        cells = self.grid[index, :, first_slot:last_slot].reshape(-1)
+        padding = -cells.size % 4
+        if padding:
+            cells = np.concatenate([cells, np.zeros(padding, dtype=np.uint8)])
+        quads = cells.reshape(-1, 4)
+        packed = (quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]
+        return base64.b64encode(packed.astype(np.uint8).tobytes()).decode('ascii')
+
+    def to_dict(self, doctor_info=None):
+        """Representación para la interfaz: metadatos, totales y rejilla codificada"""
+        doctor_info = doctor_info or {}
+        first_slot, last_slot = self.slot_bounds()
+        free, booked = self.counts()
+        return {
+            'dias': [day.strftime('%Y-%m-%d') for day in self.days],
+            'minutos_franja': self.slot_minutes,
+            'primera_franja': _hhmm(first_slot * self.slot_minutes),
+            'franjas_por_dia': last_slot - first_slot,
+            'codificacion': '2 bits por franja (0 fuera de horario, 1 libre, 2 ocupado), '
+                            'días × franjas, 4 franjas por byte, base64',
+            'medicos': [{
+                'id_medico': id_medico,
+                **doctor_info.get(id_medico, {}),
+                'libres': int(free[i]),
+                'ocupadas': int(booked[i]),
+                'rejilla': self.encode(i, first_slot, last_slot)
+            } for i, id_medico in enumerate(self.doctor_ids)]
+        }
+
+
+def _hhmm(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def month_days(year, month):
+    return [datetime.date(year, month, day) for day in range(1, calendar.monthrange(year, month)[1] + 1)]
+
+
+def build_month_calendar(doctor_ids, blocks, citas, year, month, slot_minutes=None,
+                         appointment_minutes=None):
+    """Construye la matriz del mes.
+
+    blocks son filas (id_medico, dia_semana, hora_inicio, hora_fin) y citas
+    filas (id_medico, fecha_cita, hora_cita). Las franjas van cada
+    slot_minutes desde medianoche; una franja es laborable si cae completa
+    dentro de un bloque y queda ocupada si se solapa con una cita de
+    appointment_minutes.
+    """
+    slot_minutes = slot_minutes or APPOINTMENT_SLOT_MINUTES
+    appointment_minutes = appointment_minutes or APPOINTMENT_SLOT_MINUTES
+    slots = MINUTES_PER_DAY // slot_minutes
+    days = month_days(year, month)
+    position = {id_medico: i for i, id_medico in enumerate(doctor_ids)}
+
+    # Plantilla semanal (médico, día 1-7 -> 0-6, franja) por diferencias y cumsum
+    weekly = np.zeros((len(doctor_ids), 7, slots + 1), dtype=np.int16)
+    blocks = [b for b in blocks if b[0] in position]
+    if blocks:
+        doctor_idx = np.array([position[b[0]] for b in blocks], dtype=np.intp)
+        weekday_idx = np.array([int(b[1]) - 1 for b in blocks], dtype=np.intp)
+        first = -(-_minutes(b[2] for b in blocks) // slot_minutes)
+        last = _minutes(b[3] for b in blocks) // slot_minutes
+        valid = (first < last) & (weekday_idx >= 0) & (weekday_idx < 7)
+        np.add.at(weekly, (doctor_idx[valid], weekday_idx[valid], first[valid]), 1)
+        np.add.at(weekly, (doctor_idx[valid], weekday_idx[valid], last[valid]), -1)
+    works = np.cumsum(weekly, axis=2)[:, :, :slots] > 0
+
+    # Expandir la plantilla a los días del mes
+    weekday_of_day = np.array([day.weekday() for day in days], dtype=np.intp)
+    grid = works[:, weekday_of_day, :].astype(np.uint8)
+
+    # Marcar las franjas que se solapan con cada cita
+    day_position = {day: i for i, day in enumerate(days)}
+    citas = [c for c in citas if c[0] in position and c[1] in day_position]
+    if citas:
+        doctor_idx = np.array([position[c[0]] for c in citas], dtype=np.intp)
+        day_idx = np.array([day_position[c[1]] for c in citas], dtype=np.intp)
+        start = _minutes(c[2] for c in citas)
+        first = start // slot_minutes
+        last = np.minimum((start + appointment_minutes - 1) // slot_minutes, slots - 1)
+        for offset in range(int((last - first).max()) + 1):
+            covered = first + offset <= last
+            grid[doctor_idx[covered], day_idx[covered], first[covered] + offset] = OCUPADO
+
+    return MonthCalendar(list(doctor_ids), days, slot_minutes, grid)
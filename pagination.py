@@ -0,0 +1,138 @@
+import base64
+import json
+import logging
+import pyodbc
+from fanout import fan_out
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class InvalidCursorError(ValueError):
+    """Token de continuación mal formado o de otro listado"""
+
+
+def encode_cursor(sort_column, sort_value, row_id):
+    """Token opaco con la última clave (orden, id) entregada"""
+    payload = json.dumps([sort_column, sort_value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_column):
+    """Devuelve (valor_orden, id) del token; valida que sea del mismo orden"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        column, sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Cursor inválido: {str(e)}")
+    if column != sort_column or not isinstance(row_id, int):
+        raise InvalidCursorError("El cursor no corresponde a este listado")
+    return sort_value, row_id
+
+
+def is_keyset_request(args):
+    """El modo keyset se activa al recibir limit o cursor en la petición"""
+    return 'limit' in args or 'cursor' in args
+
+
+def parse_keyset_args(args):
+    """Lee limit, cursor y count de la petición.
+
+    count puede ser 'approx' (por defecto, desde sys.partitions), 'exact'
+    (COUNT(*) con los mismos filtros) o 'none'.
+    """
+    limit = args.get('limit', DEFAULT_LIMIT, type=int) or DEFAULT_LIMIT
+    limit = max(1, min(limit, MAX_LIMIT))
+    count_mode = args.get('count', 'approx')
+    if count_mode not in ('approx', 'exact', 'none'):
+        count_mode = 'approx'
+    return limit, args.get('cursor') or None, count_mode
+
+
+def fetch_keyset_page(cursor, query, params, sort_column, id_column, sort_index, id_index,
+                      after_token, limit):
+    """Ejecuta una página keyset sobre (sort_column, id_column).
+
+    query debe ser un SELECT terminado en una cláusula WHERE (p. ej. WHERE 1=1
+    más filtros), sin ORDER BY. Se lee una fila de más para saber si existe
+    página siguiente. Devuelve (filas, token_siguiente).
+    """
+    params = list(params)
+    if after_token:
+        last_value, last_id = decode_cursor(after_token, sort_column)
+        query += f" AND ({sort_column} > ? OR ({sort_column} = ? AND {id_column} > ?))"
+        params.extend([last_value, last_value, last_id])
+
+    query += f" ORDER BY {sort_column}, {id_column} OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY"
+    params.append(limit + 1)
+
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+
+    next_token = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_token = encode_cursor(sort_column, last[sort_index], last[id_index])
+    return rows, next_token
+
+
+def count_total(cursor, query, params, table, count_mode, filtered):
+    """Total de filas según el modo pedido; devuelve (total, es_exacto).
+
+    El modo aproximado lee el número de filas de sys.partitions en tiempo
+    constante, por lo que solo aplica cuando no hay filtros.
+    """
+    if count_mode == 'exact':
+        cursor.execute(f"SELECT COUNT(*) FROM ({query}) AS total", params)
+        return cursor.fetchone()[0], True
+
+    if count_mode == 'approx' and not filtered:
+        try:
+            cursor.execute("""
+                SELECT SUM(rows)
+                FROM sys.partitions
+                WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)
+            """, (f'dbo.{table}',))
+            row = cursor.fetchone()
+            return (int(row[0]) if row and row[0] is not None else None), False
+        except pyodbc.Error as e:
+            logger.warning(f"No se pudo obtener el conteo aproximado de {table}: {str(e)}")
+
+    return None, False
+
+
+def fetch_page_with_total(conn, query, params, sort_column, id_column, sort_index, id_index,
+                          after_token, limit, table, count_mode, filtered):
+    """Página keyset y total; devuelve (filas, token_siguiente, total, es_exacto).
+
+    Con count=exact el COUNT(*) corre en paralelo en otra conexión del pool
+    (fanout), así que la latencia es la de la consulta más lenta. Si el
+    conteo falla o no termina a tiempo la página se entrega con total None.
+    """
+    def page(c):
+        cursor = c.cursor()
+        try:
+            return fetch_keyset_page(cursor, query, params, sort_column, id_column,
+                                     sort_index, id_index, after_token, limit)
+        finally:
+            cursor.close()
+
+    def total(c):
+        cursor = c.cursor()
+        try:
+            return count_total(cursor, query, params, table, count_mode, filtered)
+        finally:
+            cursor.close()
+
+    if count_mode != 'exact':
+        # El conteo aproximado es una lectura de metadatos: no compensa otro hilo
+        rows, next_token = page(conn)
+        return (rows, next_token) + total(conn)
+
+    result = fan_out({'page': page, 'total': total}, conn=conn)
+    rows, next_token = result.values['page']
+    total_value, total_exact = result.get('total', (None, False))
+    return rows, next_token, total_value, total_exact
@@ -0,0 +1,424 @@
+import bisect
+import heapq
+from collections import Counter
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from database import get_db_connection
+from config import PATIENT_SEARCH_MAX_AGE, PATIENT_SEARCH_MIN_SIMILARITY
+
+logger = logging.getLogger(__name__)
+
+MIN_QUERY_LENGTH = 2
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def normalize(text):
+    """Minúsculas sin tildes ni signos: 'Peña Núñez' -> 'pena nunez'"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', stripped.lower()).split())
+
+
+def digits(text):
+    """Solo los dígitos de una cédula o teléfono ('099-123 456' -> '099123456')"""
+    return re.sub(r'\D', '', str(text)) if text else ''
+
+
+def trigrams(text):
+    """Trigramas de cada palabra con relleno, como pg_trgm: 'ana' -> '  a', ' an', 'ana', 'na '"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _prefix_range(entries, prefix):
+    """Posiciones [inicio, fin) de las entradas (clave, id) cuya clave empieza por prefix"""
+    start = bisect.bisect_left(entries, (prefix,))
+    end = bisect.bisect_left(entries, (prefix + '\uffff',), start)
+    return start, end
+
+
+def _discard(entries, entry):
+    position = bisect.bisect_left(entries, entry)
+    if position < len(entries) and entries[position] == entry:
+        del entries[position]
+
+
+class PatientSearchIndex:
+    """Índice en memoria de pacientes para la búsqueda mientras se escribe.
+
+    Guarda en listas ordenadas (prefijo = búsqueda binaria) el vocabulario
+    de palabras y los nombres normalizados y las cédulas y los teléfonos
+    como dígitos; por cada palabra, sus pacientes en orden de presentación
+    (rank: activos primero, luego por nombre), y los trigramas del
+    vocabulario para las coincidencias aproximadas.
+    Se carga con una sola consulta al arrancar la aplicación (warm) o al
+    primer uso, y patients.py lo actualiza en cada
+    alta, modificación y cambio de estado. Pasados PATIENT_SEARCH_MAX_AGE
+    segundos se recarga en segundo plano por si otro proceso modificó la
+    tabla, sin bloquear las búsquedas.
+    """
+
+    def __init__(self, max_age=PATIENT_SEARCH_MAX_AGE, min_similarity=PATIENT_SEARCH_MIN_SIMILARITY):
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._max_age = max_age
+        self._min_similarity = min_similarity
+        self._docs = None
+        self._pending = None
+        self._loaded_at = 0
+        self._refreshing = False
+
+    def refresh(self, conn=None):
+        """Recarga el índice; usa la conexión dada o toma una del pool"""
+        with self._load_lock:
+            self._reload(conn)
+
+    def _reload(self, conn):
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+            if not conn:
+                raise ConnectionError("No se pudo conectar a la base de datos")
+        # Los cambios que lleguen mientras corre la consulta se anotan y se
+        # aplican sobre el índice nuevo, para no perder un alta reciente
+        with self._lock:
+            self._pending = []
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT id_paciente, nombre_completo, cedula, telefono, estado
+                    FROM pacientes
+                """)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        finally:
+            if own_conn:
+                conn.close()
+
+        # Se arma fuera del candado y se publica de una vez
+        docs, postings, names, cedulas, telefonos = {}, {}, [], [], []
+        for id_paciente, nombre, cedula, telefono, estado in rows:
+            doc = self._make_doc(id_paciente, nombre, cedula, telefono, estado)
+            docs[id_paciente] = doc
+            for word in doc['words']:
+                postings.setdefault(word, []).append(doc['rank'])
+            names.append((doc['name'], id_paciente))
+            if doc['cedula']:
+                cedulas.append((doc['cedula'], id_paciente))
+            if doc['telefono']:
+                telefonos.append((doc['telefono'], id_paciente))
+        for entries in (names, cedulas, telefonos, *postings.values()):
+            entries.sort()
+        vocab = sorted(postings)
+        grams = {}
+        for word in vocab:
+            for gram in trigrams(word):
+                grams.setdefault(gram, set()).add(word)
+
+        with self._lock:
+            self._docs, self._names = docs, names
+            self._cedulas, self._telefonos = cedulas, telefonos
+            self._vocab, self._postings, self._grams = vocab, postings, grams
+            for id_paciente, doc in self._pending:
+                self._apply(id_paciente, doc)
+            self._pending = None
+            self._loaded_at = time.monotonic()
+        logger.info(f"Índice de búsqueda de pacientes cargado: {len(rows)} pacientes")
+
+    def _ensure_loaded(self, conn=None):
+        if self._docs is None:
+            with self._load_lock:
+                if self._docs is None:
+                    self._reload(conn)
+        elif time.monotonic() - self._loaded_at > self._max_age and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._background_refresh, name='patient-search-refresh',
+                             daemon=True).start()
+
+    def warm(self):
+        """Carga el índice en segundo plano para que la primera búsqueda no espere"""
+        if self._docs is None and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._background_refresh, name='patient-search-warm',
+                             daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # Se sigue sirviendo el índice anterior; se reintenta en la próxima búsqueda
+            logger.warning(f"No se pudo recargar el índice de pacientes: {str(e)}")
+        finally:
+            self._refreshing = False
+
+    @staticmethod
+    def _make_doc(id_paciente, nombre, cedula, telefono, estado):
+        name = normalize(nombre)
+        return {
+            'nombre_completo': nombre,
+            'cedula_original': cedula,
+            'telefono_original': telefono,
+            'cedula': digits(cedula),
+            'telefono': digits(telefono),
+            'estado': estado,
+            'name': name,
+            'words': set(name.split()),
+            'rank': (estado != 'A', name, id_paciente)
+        }
+
+    def _add(self, id_paciente, doc):
+        self._docs[id_paciente] = doc
+        for word in doc['words']:
+            ranks = self._postings.get(word)
+            if ranks is None:
+                # Palabra nueva: entra al vocabulario
+                ranks = self._postings[word] = []
+                bisect.insort(self._vocab, word)
+                for gram in trigrams(word):
+                    self._grams.setdefault(gram, set()).add(word)
+            bisect.insort(ranks, doc['rank'])
+        bisect.insort(self._names, (doc['name'], id_paciente))
+        if doc['cedula']:
+            bisect.insort(self._cedulas, (doc['cedula'], id_paciente))
+        if doc['telefono']:
+            bisect.insort(self._telefonos, (doc['telefono'], id_paciente))
+
+    def _remove(self, id_paciente):
+        doc = self._docs.pop(id_paciente, None)
+        if doc is None:
+            return
+        for word in doc['words']:
+            ranks = self._postings[word]
+            _discard(ranks, doc['rank'])
+            if not ranks:
+                # Última aparición: la palabra sale del vocabulario
+                del self._postings[word]
+                _discard(self._vocab, word)
+                for gram in trigrams(word):
+                    words = self._grams.get(gram)
+                    if words is not None:
+                        words.discard(word)
+                        if not words:
+                            del self._grams[gram]
+        _discard(self._names, (doc['name'], id_paciente))
+        if doc['cedula']:
+            _discard(self._cedulas, (doc['cedula'], id_paciente))
+        if doc['telefono']:
+            _discard(self._telefonos, (doc['telefono'], id_paciente))
+
+    def _apply(self, id_paciente, doc):
+        # doc es el paciente completo o solo el estado nuevo (str)
+        if isinstance(doc, str):
+            current = self._docs.get(id_paciente)
+            if current is None:
+                return
+            doc = self._make_doc(id_paciente, current['nombre_completo'], current['cedula_original'],
+                                 current['telefono_original'], doc)
+        self._remove(id_paciente)
+        self._add(id_paciente, doc)
+
+    def _record(self, id_paciente, doc):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((id_paciente, doc))
+            if self._docs is not None:
+                self._apply(id_paciente, doc)
+
+    def add(self, id_paciente, nombre, cedula, telefono, estado):
+        """Registra un paciente recién insertado o reemplaza sus datos"""
+        self._record(id_paciente, self._make_doc(id_paciente, nombre, cedula, telefono, estado))
+
+    def update(self, id_paciente, nombre, cedula, telefono, estado):
+        """Refleja la modificación de un paciente existente"""
+        self.add(id_paciente, nombre, cedula, telefono, estado)
+
+    def set_estado(self, id_paciente, estado):
+        """Cambio de estado (activar, inactivar o eliminación lógica)"""
+        self._record(id_paciente, estado)
+
+    def _walk(self, ids, accept, limit, taken):
+        """Los primeros limit ids de la secuencia ordenada ids que cumplen accept.
+
+        Se recorre en orden en lugar de armar el conjunto completo del
+        prefijo, así que un prefijo corto y frecuente ('ma', '09') cuesta
+        lo que tarda en aparecer limit coincidencias.
+        """
+        found = []
+        if limit <= 0:
+            return found
+        for id_paciente in ids:
+            if id_paciente not in taken and accept(self._docs[id_paciente]):
+                taken.add(id_paciente)
+                found.append(id_paciente)
+                if len(found) == limit:
+                    break
+        return found
+
+    def _similar_words(self, word):
+        """Palabras del vocabulario que comparten al menos min_similarity de los trigramas de word.
+
+        Quien comparte m de los n trigramas tiene al menos uno de los n-m+1
+        más raros, así que los candidatos salen solo de esas listas.
+        """
+        wanted = trigrams(word)
+        needed = max(1, math.ceil(self._min_similarity * len(wanted)))
+        rarest = sorted(wanted, key=lambda gram: len(self._grams.get(gram, ())))
+        candidates = set()
+        for gram in rarest[:len(wanted) - needed + 1]:
+            candidates.update(self._grams.get(gram, ()))
+
+        shared = Counter()
+        for gram in wanted:
+            shared.update(candidates.intersection(self._grams.get(gram, ())))
+        return {similar: count / len(wanted) for similar, count in shared.items() if count >= needed}
+
+    def _fuzzy_matches(self, text):
+        """Ids cuya similitud con text es al menos min_similarity.
+
+        Cada palabra buscada se compara con el vocabulario (unas miles de
+        palabras, no los pacientes) y aporta, según su peso en trigramas, la
+        mejor similitud entre las palabras del paciente.
+        """
+        words = text.split()
+        total = sum(len(trigrams(word)) for word in words)
+        scores = {}
+        for word in words:
+            weight = len(trigrams(word)) / total
+            best = {}
+            # De menor a mayor similitud: cada paciente queda con la de su mejor palabra
+            for similar, value in sorted(self._similar_words(word).items(), key=lambda item: item[1]):
+                best.update(dict.fromkeys((rank[2] for rank in self._postings[similar]), weight * value))
+            if not scores:
+                scores = best
+                continue
+            for id_paciente, value in best.items():
+                scores[id_paciente] = scores.get(id_paciente, 0) + value
+        return {id_paciente: score for id_paciente, score in scores.items() if score >= self._min_similarity}
+
+    def _vocab_range(self, prefix):
+        """Palabras del vocabulario que empiezan por prefix"""
+        start = bisect.bisect_left(self._vocab, prefix)
+        end = bisect.bisect_left(self._vocab, prefix + '\uffff', start)
+        return self._vocab[start:end]
+
+    def search(self, term, limit=DEFAULT_LIMIT, estado=None, conn=None):
+        """Los limit pacientes que mejor coinciden con term, ya ordenados.
+
+        Un término de solo dígitos, o con la letra de nacionalidad delante
+        como se escribe la cédula ('V-12345678'), se busca como prefijo de
+        cédula y teléfono (primero las coincidencias completas, luego por
+        número). El resto,
+        por prefijo de las palabras del nombre sin tildes: primero los nombres
+        que empiezan con lo escrito, luego los que tienen todas las palabras
+        completas y luego el resto, cada grupo con los activos primero y por
+        nombre. Si ninguno coincide, por similitud de trigramas. Cada
+        resultado indica en 'coincidencia' qué regla lo encontró.
+        """
+        text = normalize(term)
+        compact = text.replace(' ', '')
+        if compact[:1] in ('v', 'e') and compact[1:].isdigit():
+            compact = compact[1:]
+        if len(compact) < MIN_QUERY_LENGTH:
+            return []
+
+        def allowed(doc):
+            return estado is None or doc['estado'] == estado
+
+        self._ensure_loaded(conn)
+        with self._lock:
+            result = []
+            taken = set()
+
+            number = digits(term)
+            if number and number == compact:
+                for exact in (True, False):
+                    for entries, field in ((self._cedulas, 'cedula'), (self._telefonos, 'telefono')):
+                        start, end = _prefix_range(entries, number)
+                        if exact:
+                            end = bisect.bisect_left(entries, (number + '\x00',), start, end)
+                        ids = (entries[position][1] for position in range(start, end))
+                        result.extend((id_paciente, field) for id_paciente in
+                                      self._walk(ids, allowed, limit - len(result), taken))
+                return [self._format(id_paciente, field) for id_paciente, field in result]
+
+            # Nombres que empiezan con lo escrito: _names ya viene por nombre
+            start, end = _prefix_range(self._names, text)
+            for active in (True, False):
+                if estado is not None and (estado == 'A') != active:
+                    continue
+                result.extend(self._walk(
+                    (self._names[position][1] for position in range(start, end)),
+                    lambda doc: allowed(doc) and (doc['estado'] == 'A') == active,
+                    limit - len(result), taken
+                ))
+
+            # El resto se recorre desde la palabra buscada con menos pacientes,
+            # mezclando sus listas para verlos en orden de presentación
+            words = text.split()
+            prefixed = {word: self._vocab_range(word) for word in words}
+            driver = min(words, key=lambda word: sum(len(self._postings[token]) for token in prefixed[word]))
+
+            def whole_words(doc):
+                return allowed(doc) and all(word in doc['words'] for word in words)
+
+            def word_prefixes(doc):
+                return allowed(doc) and all(
+                    any(token.startswith(word) for token in doc['words']) for word in words)
+
+            tiers = ((self._postings.get(driver, ()), whole_words),
+                     (heapq.merge(*(self._postings[token] for token in prefixed[driver])), word_prefixes))
+            for ranks, accept in tiers:
+                result.extend(self._walk((rank[2] for rank in ranks), accept, limit - len(result), taken))
+
+            if result or len(text) < 3:
+                return [self._format(id_paciente, 'nombre') for id_paciente in result]
+
+            # rank termina en el id, así que se ordena por tuplas sin funciones clave
+            best = heapq.nsmallest(limit, (
+                (-score, self._docs[id_paciente]['rank'])
+                for id_paciente, score in self._fuzzy_matches(text).items()
+                if estado is None or self._docs[id_paciente]['estado'] == estado
+            ))
+            return [self._format(rank[2], 'aproximada') for _, rank in best]
+
+    def _format(self, id_paciente, field):
+        doc = self._docs[id_paciente]
+        return {
+            'id_paciente': id_paciente,
+            'nombre_completo': doc['nombre_completo'],
+            'cedula': doc['cedula_original'],
+            'telefono': doc['telefono_original'],
+            'estado': doc['estado'],
+            'coincidencia': field
+        }
+
+    def stats(self):
+        with self._lock:
+            if self._docs is None:
+                return {'loaded': False}
+            return {
+                'loaded': True,
+                'patients': len(self._docs),
+                'words': len(self._vocab),
+                'trigrams': len(self._grams),
+                'age_seconds': round(time.monotonic() - self._loaded_at, 1)
+            }
+
+
+patient_search = PatientSearchIndex()
@@ -2,11 +2,27 @@ from flask import Blueprint, request, jsonify
 import pyodbc
 import logging
 from datetime import datetime
-from database import get_db_connection
+from database import get_db_connection, is_unique_violation, PoolTimeoutError
+from delta_sync import is_delta_request, fetch_changes, DeltaSyncUnavailableError
+from http_cache import not_modified, with_etag
+import stats_service
+from activity import activity_log
+from patient_search import patient_search, DEFAULT_LIMIT, MAX_LIMIT
+from streaming import stream_format, stream_query, wants_db_json, stream_for_json
+from datatables import datatables_page
+from pagination import (
+    is_keyset_request, parse_keyset_args, fetch_page_with_total, InvalidCursorError
+)
 
 patients_bp = Blueprint('patients', __name__)
 logger = logging.getLogger(__name__)
 
+def format_paciente(row):
+    return {
+        'id_paciente': row[0],
+        'nombre_completo': row[1]
+    }
+
 # Endpoint para obtener pacientes
 @patients_bp.route('/api/pacientes', methods=['GET'])
 def get_pacientes():
@@ -15,16 +31,20 @@ def get_pacientes():
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
         
     try:
+        query = """
+            SELECT id_paciente, nombre_completo 
+            FROM pacientes 
+            ORDER BY nombre_completo
+        """
+
+        # Con ?stream=1 o ?stream=ndjson las filas se escriben por lotes
+        fmt = stream_format(request)
+        if fmt:
+            return stream_query(conn, query, [], format_paciente, fmt)
+
         with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT id_paciente, nombre_completo 
-                FROM pacientes 
-                ORDER BY nombre_completo
-            """)
-            pacientes = [{
-                'id_paciente': row[0],
-                'nombre_completo': row[1]
-            } for row in cursor.fetchall()]
+            cursor.execute(query)
+            pacientes = [format_paciente(row) for row in cursor.fetchall()]
             
             return jsonify(pacientes)
     except pyodbc.Error as e:
@@ -33,123 +53,247 @@ def get_pacientes():
     finally:
         conn.close()
 
+def format_paciente_detallado(row):
+    return {
+        'id_paciente': row[0],
+        'nombre_completo': row[1],
+        'telefono': row[2],
+        'correo': row[3],
+        'direccion': row[4],
+        'cedula': row[5],
+        'estado': row[6],
+        'fecha_nacimiento': row[7].strftime('%Y-%m-%d') if row[7] else None,
+        'genero': row[8],
+        'tipo_sangre': row[9],
+        'observaciones': row[10],
+        'fecha_creacion': row[11].strftime('%Y-%m-%d %H:%M:%S') if row[11] else None
+    }
+
 # Cambia el nombre de la segunda función get_pacientes a get_pacientes_detallados
 @patients_bp.route('/api/pacientes/detallados', methods=['GET'])
 def get_pacientes_detallados():
-    """Obtiene todos los pacientes con opciones de filtrado"""
+    """Obtiene todos los pacientes con opciones de filtrado.
+
+    Con limit/cursor devuelve una página keyset sobre (nombre_completo,
+    id_paciente) en lugar de la tabla completa; con ?stream=1 o
+    ?stream=ndjson escribe la tabla completa por lotes. Con ?since=<token>
+    devuelve solo los pacientes creados, modificados o inactivados desde el
+    token (sin filtros) y un token nuevo; ?since= vacío da la copia inicial.
+    """
     conn = get_db_connection()
     if not conn:
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
 
     try:
+        if is_delta_request(request.args):
+            rows, sync_token, full = fetch_changes(conn, 'pacientes', """
+                id_paciente, nombre_completo, telefono, correo, 
+                direccion, cedula, estado, fecha_nacimiento,
+                genero, tipo_sangre, observaciones, fecha_creacion
+            """, 'id_paciente', request.args.get('since'))
+            return jsonify({
+                'pacientes': [format_paciente_detallado(row) for row in rows],
+                'sync_token': sync_token,
+                'full': full
+            })
+
         # Obtener parámetros de filtrado
         estado = request.args.get('estado')
         search = request.args.get('search')
         fecha_desde = request.args.get('fecha_desde')
         fecha_hasta = request.args.get('fecha_hasta')
 
-        with conn.cursor() as cursor:
-            # Construir consulta base
-            query = """
-                SELECT 
-                    id_paciente, nombre_completo, telefono, correo, 
-                    direccion, cedula, estado, fecha_nacimiento,
-                    genero, tipo_sangre, observaciones, fecha_creacion
-                FROM pacientes
-                WHERE 1=1
+        # Construir consulta base
+        query = """
+            SELECT 
+                id_paciente, nombre_completo, telefono, correo, 
+                direccion, cedula, estado, fecha_nacimiento,
+                genero, tipo_sangre, observaciones, fecha_creacion
+            FROM pacientes
+            WHERE 1=1
+        """
+        params = []
+
+        # Aplicar filtros
+        if estado:
+            query += " AND estado = ?"
+            params.append(estado)
+        
+        if search:
+            query += """
+                AND (nombre_completo LIKE ? OR 
+                     telefono LIKE ? OR 
+                     cedula LIKE ? OR 
+                     correo LIKE ?)
             """
-            params = []
+            search_term = f"%{search}%"
+            params.extend([search_term, search_term, search_term, search_term])
+        
+        if fecha_desde:
+            # Agregar componente de tiempo para incluir todo el día desde el inicio en el filtro fecha_desde
+            fecha_desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d')
+            fecha_desde_dt = fecha_desde_dt.replace(hour=0, minute=0, second=0)
+            query += " AND fecha_creacion >= ?"
+            params.append(fecha_desde_dt)
+        
+        if fecha_hasta:
+            # Agregar componente de tiempo para incluir todo el día en el filtro fecha_hasta
+            fecha_hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d')
+            fecha_hasta_dt = fecha_hasta_dt.replace(hour=23, minute=59, second=59)
+            query += " AND fecha_creacion <= ?"
+            params.append(fecha_hasta_dt)
 
-            # Aplicar filtros
-            if estado:
-                query += " AND estado = ?"
-                params.append(estado)
-            
-            if search:
-                query += """
-                    AND (nombre_completo LIKE ? OR 
-                         telefono LIKE ? OR 
-                         cedula LIKE ? OR 
-                         correo LIKE ?)
-                """
-                search_term = f"%{search}%"
-                params.extend([search_term, search_term, search_term, search_term])
-            
-            if fecha_desde:
-                # Agregar componente de tiempo para incluir todo el día desde el inicio en el filtro fecha_desde
-                fecha_desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d')
-                fecha_desde_dt = fecha_desde_dt.replace(hour=0, minute=0, second=0)
-                query += " AND fecha_creacion >= ?"
-                params.append(fecha_desde_dt)
-            
-            if fecha_hasta:
-                # Agregar componente de tiempo para incluir todo el día en el filtro fecha_hasta
-                fecha_hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d')
-                fecha_hasta_dt = fecha_hasta_dt.replace(hour=23, minute=59, second=59)
-                query += " AND fecha_creacion <= ?"
-                params.append(fecha_hasta_dt)
+        # Con ?stream=1 o ?stream=ndjson el resultado completo se escribe por lotes
+        fmt = stream_format(request)
+        if fmt:
+            return stream_query(conn, query + " ORDER BY nombre_completo", params,
+                                format_paciente_detallado, fmt)
+
+        with conn.cursor() as cursor:
+            if is_keyset_request(request.args):
+                limit, after, count_mode = parse_keyset_args(request.args)
+                filtered = bool(estado or search or fecha_desde or fecha_hasta)
+
+                rows, next_cursor, total, total_exact = fetch_page_with_total(
+                    conn, query, params, 'nombre_completo', 'id_paciente', 1, 0, after, limit,
+                    'pacientes', count_mode, filtered
+                )
+
+                return jsonify({
+                    'pacientes': [format_paciente_detallado(row) for row in rows],
+                    'limit': limit,
+                    'next_cursor': next_cursor,
+                    'has_more': next_cursor is not None,
+                    'total': total,
+                    'total_exact': total_exact
+                })
 
             query += " ORDER BY nombre_completo"
 
             cursor.execute(query, params)
             
-            pacientes = [{
-                'id_paciente': row[0],
-                'nombre_completo': row[1],
-                'telefono': row[2],
-                'correo': row[3],
-                'direccion': row[4],
-                'cedula': row[5],
-                'estado': row[6],
-                'fecha_nacimiento': row[7].strftime('%Y-%m-%d') if row[7] else None,
-                'genero': row[8],
-                'tipo_sangre': row[9],
-                'observaciones': row[10],
-                'fecha_creacion': row[11].strftime('%Y-%m-%d %H:%M:%S') if row[11] else None
-            } for row in cursor.fetchall()]
+            pacientes = [format_paciente_detallado(row) for row in cursor.fetchall()]
             
             return jsonify(pacientes)
+    except (InvalidCursorError, DeltaSyncUnavailableError) as e:
+        return jsonify({'error': str(e)}), 400
     except pyodbc.Error as e:
         logger.error(f"Error en la base de datos: {str(e)}")
         return jsonify({'error': 'Error al obtener pacientes'}), 500
     finally:
         conn.close()
 
-@patients_bp.route('/api/pacientes/stats', methods=['GET'])
-def get_pacientes_stats():
-    """Obtiene estadísticas de pacientes"""
+# Columnas de la tabla de pacientes que el cliente puede ordenar
+PACIENTES_ORDERABLE = {
+    'id_paciente': 'id_paciente',
+    'nombre_completo': 'nombre_completo',
+    'cedula': 'cedula',
+    'telefono': 'telefono',
+    'correo': 'correo',
+    'fecha_nacimiento': 'fecha_nacimiento',
+    'estado': 'estado',
+    'fecha_creacion': 'fecha_creacion'
+}
+
+@patients_bp.route('/api/pacientes/datatables', methods=['GET'])
+def get_pacientes_datatables():
+    """Tabla de pacientes en modo server-side de DataTables.
+
+    Devuelve solo la página pedida (start/length) con recordsTotal y
+    recordsFiltered, ordenada en SQL. Acepta los filtros estado, fecha_desde
+    y fecha_hasta de /api/pacientes/detallados; la búsqueda (search[value] o
+    busqueda) es por prefijo del nombre, la cédula, el teléfono o el correo.
+    """
     conn = get_db_connection()
     if not conn:
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
 
     try:
-        with conn.cursor() as cursor:
-            # Total pacientes activos
-            cursor.execute("SELECT COUNT(*) FROM pacientes WHERE estado = 'A'")
-            active = cursor.fetchone()[0]
-            
-            # Total pacientes
-            cursor.execute("SELECT COUNT(*) FROM pacientes")
-            total = cursor.fetchone()[0]
-            
-            # Nuevos este mes
-            cursor.execute("""
-                SELECT COUNT(*) FROM pacientes 
-                WHERE fecha_creacion >= DATEADD(month, DATEDIFF(month, 0, GETDATE()), 0)
-            """)
-            new_this_month = cursor.fetchone()[0]
-            
-            return jsonify({
-                'active': active,
-                'total': total,
-                'new_this_month': new_this_month
-            })
+        estado = request.args.get('estado')
+        fecha_desde = request.args.get('fecha_desde')
+        fecha_hasta = request.args.get('fecha_hasta')
+
+        query = """
+            SELECT 
+                id_paciente, nombre_completo, telefono, correo, 
+                direccion, cedula, estado, fecha_nacimiento,
+                genero, tipo_sangre, observaciones, fecha_creacion
+            FROM pacientes
+            WHERE 1=1
+        """
+        params = []
+
+        if estado:
+            query += " AND estado = ?"
+            params.append(estado)
+
+        if fecha_desde:
+            query += " AND fecha_creacion >= ?"
+            params.append(datetime.strptime(fecha_desde, '%Y-%m-%d'))
+
+        if fecha_hasta:
+            # Hasta el final del día indicado
+            fecha_hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d')
+            query += " AND fecha_creacion <= ?"
+            params.append(fecha_hasta_dt.replace(hour=23, minute=59, second=59))
+
+        return jsonify(datatables_page(
+            conn, request.args, query, params, 'pacientes',
+            bool(estado or fecha_desde or fecha_hasta),
+            ['nombre_completo', 'cedula', 'telefono', 'correo'], PACIENTES_ORDERABLE,
+            'id_paciente', 'nombre_completo', format_paciente_detallado,
+            extra_search=request.args.get('busqueda')
+        ))
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido, use YYYY-MM-DD'}), 400
+    except (TimeoutError, PoolTimeoutError, ConnectionError) as e:
+        # El COUNT filtrado corre en otra conexión y puede agotar el tiempo
+        logger.error(f"Tiempo agotado al listar pacientes: {str(e)}")
+        return jsonify({'error': 'Error al obtener pacientes'}), 500
     except pyodbc.Error as e:
         logger.error(f"Error en la base de datos: {str(e)}")
-        return jsonify({'error': 'Error al obtener estadísticas'}), 500
+        return jsonify({'error': 'Error al obtener pacientes'}), 500
     finally:
         conn.close()
 
+@patients_bp.route('/api/pacientes/stats', methods=['GET'])
+def get_pacientes_stats():
+    """Obtiene estadísticas de pacientes (desde los contadores del panel)"""
+    try:
+        counters, etag = stats_service.counters()
+    except ConnectionError:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+    except pyodbc.Error as e:
+        logger.error(f"Error en la base de datos: {str(e)}")
+        return jsonify({'error': 'Error al obtener estadísticas'}), 500
+
+    return not_modified(request, etag) or with_etag(jsonify({
+        'active': counters['active_patients'],
+        'total': counters['patients'],
+        'new_this_month': counters['new_patients_this_month']
+    }), etag)
+
+@patients_bp.route('/api/pacientes/buscar', methods=['GET'])
+def buscar_pacientes():
+    """Búsqueda mientras se escribe (typeahead) sobre el índice en memoria.
+
+    ?q= es parte del nombre (sin importar tildes) o el comienzo de la cédula
+    o del teléfono; ?limit= (máx. 50) y ?estado= opcionales. Devuelve los
+    mejores resultados ya ordenados; con menos de 2 caracteres, una lista vacía.
+    """
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int) or DEFAULT_LIMIT
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    try:
+        return jsonify(patient_search.search(
+            request.args.get('q', ''), limit, request.args.get('estado') or None
+        ))
+    except ConnectionError:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+    except pyodbc.Error as e:
+        logger.error(f"Error en la base de datos: {str(e)}")
+        return jsonify({'error': 'Error al buscar pacientes'}), 500
+
 @patients_bp.route('/api/pacientes/check-cedula', methods=['GET'])
 def check_cedula():
     """Verifica si una cédula ya está registrada"""
@@ -198,11 +342,8 @@ def create_paciente():
 
     try:
         with conn.cursor() as cursor:
-            # Verificar cédula única
-            cursor.execute("SELECT 1 FROM pacientes WHERE cedula = ?", (data['cedula'],))
-            if cursor.fetchone():
-                return jsonify({'error': 'La cédula ya está registrada'}), 400
-
+            # La restricción UNIQUE(cedula) rechaza duplicados; OUTPUT devuelve
+            # el id generado en la misma sentencia
             cursor.execute("""
                 INSERT INTO pacientes (
                     nombre_completo, 
@@ -216,7 +357,9 @@ def create_paciente():
                     tipo_sangre,
                     observaciones,
                     fecha_creacion
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETDATE())
+                )
+                OUTPUT INSERTED.id_paciente
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETDATE())
             """, (
                 data['nombre_completo'],
                 data.get('fecha_nacimiento'),
@@ -229,9 +372,12 @@ def create_paciente():
                 data.get('tipo_sangre'),
                 data.get('observaciones')
             ))
-            
+            paciente_id = cursor.fetchone()[0]
             conn.commit()
-            paciente_id = cursor.execute("SELECT SCOPE_IDENTITY()").fetchone()[0]
+            stats_service.invalidate()
+            patient_search.add(paciente_id, data['nombre_completo'], data['cedula'],
+                               data.get('telefono'), data['estado'])
+            activity_log.record('Paciente', 'creado', paciente_id, data['nombre_completo'])
             
             return jsonify({
                 'message': 'Paciente creado exitosamente',
@@ -239,6 +385,8 @@ def create_paciente():
             }), 201
     except pyodbc.Error as e:
         conn.rollback()
+        if is_unique_violation(e):
+            return jsonify({'error': 'La cédula ya está registrada'}), 400
         logger.error(f"Error en la base de datos: {str(e)}")
         return jsonify({'error': 'Error al crear paciente'}), 500
     finally:
@@ -252,6 +400,24 @@ def get_paciente(id_paciente):
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
 
     try:
+        if wants_db_json(request):
+            # SQL Server arma el JSON con los mismos formatos de fecha
+            response = stream_for_json(conn, """
+                SELECT 
+                    id_paciente, nombre_completo,
+                    CONVERT(varchar(10), fecha_nacimiento, 23) AS fecha_nacimiento,
+                    telefono, correo, direccion, cedula, estado, genero, tipo_sangre,
+                    observaciones,
+                    CONVERT(varchar(19), fecha_creacion, 120) AS fecha_creacion,
+                    CONVERT(varchar(19), fecha_actualizacion, 120) AS fecha_actualizacion
+                FROM pacientes 
+                WHERE id_paciente = ?
+                FOR JSON PATH, WITHOUT_ARRAY_WRAPPER, INCLUDE_NULL_VALUES
+            """, (id_paciente,), single=True)
+            if response is None:
+                return jsonify({'error': 'Paciente no encontrado'}), 404
+            return response
+
         with conn.cursor() as cursor:
             cursor.execute("""
                 SELECT 
@@ -303,15 +469,7 @@ def update_paciente(id_paciente):
 
     try:
         with conn.cursor() as cursor:
-            # Verificar cédula única excluyendo el paciente actual
-            cursor.execute("""
-                SELECT 1 FROM pacientes 
-                WHERE cedula = ? AND id_paciente != ?
-            """, (data['cedula'], id_paciente))
-            
-            if cursor.fetchone():
-                return jsonify({'error': 'La cédula ya está registrada para otro paciente'}), 400
-
+            # La cédula duplicada la rechaza la restricción UNIQUE(cedula)
             cursor.execute("""
                 UPDATE pacientes SET
                     nombre_completo = ?,
@@ -344,9 +502,15 @@ def update_paciente(id_paciente):
                 return jsonify({'error': 'Paciente no encontrado'}), 404
                 
             conn.commit()
+            stats_service.invalidate()
+            patient_search.update(id_paciente, data['nombre_completo'], data['cedula'],
+                                  data.get('telefono'), data['estado'])
+            activity_log.record('Paciente', 'actualizado', id_paciente, data.get('nombre_completo'))
             return jsonify({'message': 'Paciente actualizado exitosamente'})
     except pyodbc.Error as e:
         conn.rollback()
+        if is_unique_violation(e):
+            return jsonify({'error': 'La cédula ya está registrada para otro paciente'}), 400
         logger.error(f"Error en la base de datos: {str(e)}")
         return jsonify({'error': 'Error al actualizar paciente'}), 500
     finally:
@@ -388,6 +552,9 @@ def update_paciente_status(id_paciente):
                 return jsonify({'error': 'Paciente no encontrado'}), 404
                 
             conn.commit()
+            stats_service.invalidate()
+            patient_search.set_estado(id_paciente, data['estado'])
+            activity_log.record('Paciente', 'activado' if data['estado'] == 'A' else 'inactivado', id_paciente)
             return jsonify({
                 'message': f"Paciente marcado como {'activo' if data['estado'] == 'A' else 'inactivo'} exitosamente"
             })
@@ -429,6 +596,9 @@ def delete_paciente(id_paciente):
                 return jsonify({'error': 'Paciente no encontrado'}), 404
                 
             conn.commit()
+            stats_service.invalidate()
+            patient_search.set_estado(id_paciente, 'I')
+            activity_log.record('Paciente', 'inactivado', id_paciente)
             return jsonify({'message': 'Paciente marcado como inactivo exitosamente'})
     except pyodbc.Error as e:
         conn.rollback()
@@ -0,0 +1,148 @@
+import logging
+import threading
+import time
+import pyodbc
+from database import get_db_connection
+from response_cache import register_cache
+from http_cache import make_etag
+from config import REFERENCE_CACHE_TTL, REFERENCE_CACHE_RETRY
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+_caches = []
+
+
+class ReferenceCache:
+    """Caché en memoria de un catálogo pequeño (roles, especialidades...).
+
+    loader(conn) devuelve el valor a servir. Pasado el TTL el valor se sigue
+    entregando mientras un hilo en segundo plano lo recarga, así que solo la
+    primera petición espera a la base de datos. invalidate() descarta el valor
+    tras una escritura para que la siguiente lectura lo vea; la última copia
+    se conserva y se sirve si la base de datos no está disponible. Cada valor
+    lleva un ETag calculado al cargarlo, para responder 304 sin consultar.
+    """
+
+    def __init__(self, name, loader, ttl=None, retry_after=None):
+        self.name = name
+        self._loader = loader
+        self._ttl = REFERENCE_CACHE_TTL if ttl is None else ttl
+        self._retry_after = REFERENCE_CACHE_RETRY if retry_after is None else retry_after
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._value = _MISSING
+        self._fallback = _MISSING
+        self._loaded_at = 0.0
+        self._next_attempt = 0.0
+        self._generation = 0
+        self._refreshing = False
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.invalidations = 0
+        _caches.append(self)
+        register_cache(name, self)
+
+    def get(self):
+        """Valor actual; lanza pyodbc.Error o ConnectionError solo si no hay copia"""
+        return self.entry()[0]
+
+    def entry(self):
+        """Par (valor, etag) actual, con las mismas reglas que get()"""
+        now = time.monotonic()
+        with self._lock:
+            if self._value is not _MISSING:
+                if now - self._loaded_at < self._ttl:
+                    self.hits += 1
+                    return self._value
+                self.stale_hits += 1
+                if not self._refreshing and now >= self._next_attempt:
+                    self._refreshing = True
+                    threading.Thread(
+                        target=self._refresh, args=(self._generation,),
+                        name=f'refresh-{self.name}', daemon=True
+                    ).start()
+                return self._value
+
+        # Sin valor: una sola petición consulta y las demás esperan su resultado
+        with self._load_lock:
+            with self._lock:
+                if self._value is not _MISSING:
+                    self.hits += 1
+                    return self._value
+                self.misses += 1
+                generation = self._generation
+            try:
+                return self._load(generation)
+            except (pyodbc.Error, ConnectionError) as e:
+                with self._lock:
+                    if self._fallback is _MISSING:
+                        raise
+                    self.fallbacks += 1
+                    logger.warning(f"Sirviendo copia anterior de {self.name}: {str(e)}")
+                    return self._fallback
+
+    def _load(self, generation):
+        conn = get_db_connection()
+        if not conn:
+            raise ConnectionError("No se pudo conectar a la base de datos")
+        try:
+            value = self._loader(conn)
+        finally:
+            conn.close()
+
+        entry = (value, make_etag(self.name, value))
+        with self._lock:
+            # Una invalidación durante la consulta deja este resultado como viejo
+            if generation == self._generation:
+                self._value = entry
+                self._fallback = entry
+                self._loaded_at = time.monotonic()
+            self.refreshes += 1
+        return entry
+
+    def _refresh(self, generation):
+        try:
+            self._load(generation)
+        except (pyodbc.Error, ConnectionError) as e:
+            with self._lock:
+                self.refresh_errors += 1
+                self._next_attempt = time.monotonic() + self._retry_after
+            logger.warning(f"No se pudo recargar {self.name}, se mantiene la copia anterior: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def invalidate(self):
+        with self._lock:
+            self._value = _MISSING
+            self._generation += 1
+            self._next_attempt = 0.0
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'entries': 0 if self._value is _MISSING else 1,
+                'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._value is not _MISSING else None,
+                'ttl_seconds': self._ttl,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else None,
+                'fallbacks': self.fallbacks,
+                'refreshes': self.refreshes,
+                'refresh_errors': self.refresh_errors,
+                'invalidations': self.invalidations
+            }
+
+
+def invalidate_all():
+    """Invalida todas las cachés de catálogos (p. ej. tras editar roles a mano)"""
+    for cache in _caches:
+        cache.invalidate()
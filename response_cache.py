@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+_registry = {}
+
+
+class ResponseCache:
+    """Caché en memoria de respuestas JSON ya serializadas.
+
+    Guarda el cuerpo listo para enviar, de modo que un acierto no abre
+    conexión ni vuelve a serializar. Las escrituras invalidan claves
+    concretas; cada clave lleva una generación para que una lectura que
+    empezó antes de una invalidación no vuelva a guardar datos viejos.
+    Con max_age (segundos) las entradas además caducan, para acotar cuánto
+    se sirve un dato modificado por otro proceso o fuera de la aplicación.
+    """
+
+    def __init__(self, name, max_entries=1024, max_age=None):
+        self.name = name
+        self._max_entries = max_entries
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.expirations = 0
+        register_cache(name, self)
+
+    def get(self, key):
+        """Cuerpo guardado para la clave o None; cuenta aciertos y fallos"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._max_age is not None \
+                    and time.monotonic() - entry[1] > self._max_age:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def generation(self, key):
+        """Marca a pasar a put() tomada antes de leer de la base de datos"""
+        with self._lock:
+            return self._epoch, self._generations.get(key, 0)
+
+    def put(self, key, body, generation):
+        """Guarda el cuerpo salvo que la clave se haya invalidado desde generation"""
+        with self._lock:
+            if generation != (self._epoch, self._generations.get(key, 0)):
+                return False
+            self._entries[key] = (body, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._epoch += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self._max_entries,
+                'max_age': self._max_age,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'invalidations': self.invalidations,
+                'expirations': self.expirations
+            }
+
+
+def register_cache(name, cache):
+    """Publica las métricas de una caché en /api/admin/cache-stats"""
+    _registry[name] = cache
+
+
+def cache_stats():
+    """Métricas de todas las cachés de respuestas registradas"""
+    return {name: cache.stats() for name, cache in _registry.items()}
@@ -0,0 +1,259 @@
+import bisect
+import datetime
+import logging
+import threading
+import time
+from database import get_db_connection
+from config import SCHEDULE_INDEX_MAX_AGE
+
+logger = logging.getLogger(__name__)
+
+
+def to_minutes(value):
+    """Minutos desde medianoche de un time o de 'HH:MM' / 'HH:MM:SS'"""
+    if isinstance(value, (datetime.time, datetime.datetime)):
+        return value.hour * 60 + value.minute
+    parts = str(value).strip().split(':')
+    if len(parts) < 2:
+        raise ValueError(f"Hora inválida: {value}")
+    return int(parts[0]) * 60 + int(parts[1])
+
+
+def validate_day_of_week(day):
+    """Validate that day is an integer between 1-7"""
+    if not isinstance(day, int):
+        try:
+            day = int(day)
+        except (ValueError, TypeError):
+            return False
+    return 1 <= day <= 7
+
+
+class _DayBlocks:
+    """Bloques de un médico en un día, ordenados por hora de inicio.
+
+    max_end[i] es el mayor fin entre los bloques 0..i; permite cortar la
+    búsqueda hacia la izquierda aunque existan solapes heredados en los datos.
+    """
+
+    __slots__ = ('starts', 'ends', 'ids', 'max_end')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+        self.max_end = []
+
+    def insert(self, start, end, id_horario):
+        position = bisect.bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.ids.insert(position, id_horario)
+        self._rebuild_max(position)
+
+    def delete(self, id_horario):
+        position = self.ids.index(id_horario)
+        del self.starts[position], self.ends[position], self.ids[position]
+        self._rebuild_max(position)
+
+    def _rebuild_max(self, position):
+        del self.max_end[position:]
+        current = self.max_end[-1] if self.max_end else -1
+        for end in self.ends[position:]:
+            current = max(current, end)
+            self.max_end.append(current)
+
+    def overlapping(self, start, end, exclude_id=None):
+        """Ids de los bloques que se solapan con [start, end)"""
+        found = []
+        # Solo pueden solaparse los bloques que empiezan antes de end
+        position = bisect.bisect_left(self.starts, end) - 1
+        while position >= 0 and self.max_end[position] > start:
+            if self.ends[position] > start and self.ids[position] != exclude_id:
+                found.append(self.ids[position])
+            position -= 1
+        return found
+
+
+class ScheduleIndex:
+    """Índice en memoria de horarios_disponibles para detectar solapes.
+
+    Guarda los bloques por (médico, día) ordenados por inicio, de modo que
+    una consulta de solape es una búsqueda binaria más los bloques que se
+    solapan. Se carga con una sola consulta al primer uso, el blueprint de
+    horarios lo mantiene al día en cada alta, modificación y baja, y se
+    recarga completo cada SCHEDULE_INDEX_MAX_AGE segundos por si otro
+    proceso modificó la tabla. La recarga consulta fuera del candado y solo
+    reemplaza el índice bajo él; la periódica corre en segundo plano, así
+    que las validaciones no esperan a la base de datos.
+    """
+
+    def __init__(self, max_age=SCHEDULE_INDEX_MAX_AGE):
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._max_age = max_age
+        self._days = None
+        self._by_id = {}
+        self._pending = None
+        self._loaded_at = None
+        self._refreshing = False
+
+    def refresh(self, conn=None):
+        """Recarga el índice; usa la conexión dada o toma una del pool"""
+        with self._load_lock:
+            self._reload(conn)
+
+    def _reload(self, conn):
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+            if not conn:
+                raise ConnectionError("No se pudo conectar a la base de datos")
+        # Las escrituras que lleguen durante la consulta se repiten sobre el
+        # índice nuevo para no perderlas
+        with self._lock:
+            self._pending = []
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT id_horario, id_medico, dia_semana, hora_inicio, hora_fin
+                    FROM horarios_disponibles
+                """)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        finally:
+            if own_conn:
+                conn.close()
+
+        days, by_id = {}, {}
+        for id_horario, id_medico, dia_semana, hora_inicio, hora_fin in rows:
+            # Las filas heredadas con un día no numérico o fuera de 1-7 (o una
+            # hora ilegible) se omiten, igual que en el listado de horarios
+            if not validate_day_of_week(dia_semana):
+                logger.warning(f"Horario {id_horario} omitido del índice: día inválido {dia_semana!r}")
+                continue
+            try:
+                start, end = to_minutes(hora_inicio), to_minutes(hora_fin)
+            except ValueError:
+                logger.warning(f"Horario {id_horario} omitido del índice: hora inválida "
+                               f"{hora_inicio!r}-{hora_fin!r}")
+                continue
+            self._insert(days, by_id, id_horario, id_medico, int(dia_semana), start, end)
+
+        with self._lock:
+            self._days, self._by_id = days, by_id
+            for args in self._pending:
+                self._apply(*args)
+            self._pending = None
+            self._loaded_at = time.monotonic()
+        logger.info(f"Índice de horarios cargado: {len(rows)} bloques")
+
+    def invalidate(self):
+        """Obliga a recargar antes de la próxima validación"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_loaded(self, conn=None):
+        # Se llama sin tener self._lock: la consulta no bloquea a los demás
+        if self._days is None or self._loaded_at is None:
+            with self._load_lock:
+                if self._days is None or self._loaded_at is None:
+                    self._reload(conn)
+        elif time.monotonic() - self._loaded_at > self._max_age and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._background_refresh, name='schedule-index-refresh',
+                             daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # Se sigue usando el índice anterior; se reintenta en la próxima validación
+            logger.warning(f"No se pudo recargar el índice de horarios: {str(e)}")
+        finally:
+            self._refreshing = False
+
+    @staticmethod
+    def _insert(days, by_id, id_horario, id_medico, dia_semana, start, end):
+        days.setdefault((id_medico, dia_semana), _DayBlocks()).insert(start, end, id_horario)
+        by_id[id_horario] = (id_medico, dia_semana)
+
+    def _add(self, id_horario, id_medico, dia_semana, start, end):
+        self._insert(self._days, self._by_id, id_horario, id_medico, dia_semana, start, end)
+
+    def _remove(self, id_horario):
+        key = self._by_id.pop(id_horario, None)
+        if key is not None:
+            self._days[key].delete(id_horario)
+
+    def _apply(self, id_horario, block=None):
+        # block es (id_medico, dia_semana, inicio, fin) o None para una baja
+        self._remove(id_horario)
+        if block is not None:
+            self._add(id_horario, *block)
+
+    def _record(self, id_horario, block=None):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((id_horario, block))
+            if self._days is not None:
+                self._apply(id_horario, block)
+
+    def conflicts(self, id_medico, dia_semana, hora_inicio, hora_fin, exclude_id=None, conn=None):
+        """Ids de los horarios del médico que se solapan con el bloque propuesto"""
+        start, end = to_minutes(hora_inicio), to_minutes(hora_fin)
+        self._ensure_loaded(conn)
+        with self._lock:
+            blocks = self._days.get((int(id_medico), int(dia_semana)))
+            return blocks.overlapping(start, end, exclude_id) if blocks else []
+
+    def has_conflict(self, id_medico, dia_semana, hora_inicio, hora_fin, exclude_id=None, conn=None):
+        return bool(self.conflicts(id_medico, dia_semana, hora_inicio, hora_fin, exclude_id, conn))
+
+    def check_many(self, proposals, conn=None, ignore_existing=False):
+        """Valida varios bloques propuestos a la vez.
+
+        proposals es una lista de (id_medico, dia_semana, hora_inicio, hora_fin).
+        Devuelve una lista paralela con los conflictos de cada bloque: ids de
+        horarios existentes y ('propuesta', i) para solapes con otro bloque
+        de la misma lista. Con ignore_existing solo se comparan entre sí.
+        """
+        result = [[] for _ in proposals]
+        pending = {}
+        if not ignore_existing:
+            self._ensure_loaded(conn)
+        with self._lock:
+            for i, (id_medico, dia_semana, hora_inicio, hora_fin) in enumerate(proposals):
+                key = (int(id_medico), int(dia_semana))
+                start, end = to_minutes(hora_inicio), to_minutes(hora_fin)
+                blocks = None if ignore_existing else self._days.get(key)
+                if blocks:
+                    result[i].extend(blocks.overlapping(start, end))
+                batch = pending.setdefault(key, _DayBlocks())
+                for other in batch.overlapping(start, end):
+                    result[i].append(('propuesta', other))
+                    result[other].append(('propuesta', i))
+                batch.insert(start, end, i)
+        return result
+
+    def add(self, id_horario, id_medico, dia_semana, hora_inicio, hora_fin):
+        """Registra un horario recién insertado"""
+        self._record(id_horario, (int(id_medico), int(dia_semana),
+                                  to_minutes(hora_inicio), to_minutes(hora_fin)))
+
+    def update(self, id_horario, id_medico, dia_semana, hora_inicio, hora_fin):
+        """Refleja la modificación de un horario existente"""
+        self.add(id_horario, id_medico, dia_semana, hora_inicio, hora_fin)
+
+    def remove(self, id_horario):
+        """Quita un horario eliminado"""
+        self._record(id_horario)
+
+
+schedule_index = ScheduleIndex()
@@ -1,180 +1,363 @@
-import pyodbc
+import threading
+import time as clock
+from contextlib import contextmanager
 from datetime import datetime, time
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable, Tuple
+from database import pool as default_pool
+from schedule_index import schedule_index
+from response_cache import ResponseCache
+from config import SCHEDULE_CACHE_TTL, SCHEDULE_VIEW_MAX_AGE
+
+# Vistas JSON ya serializadas de /api/horarios/<id> y /api/horarios/<id>/semanal,
+# por ('lista' | 'semanal', id_medico); se invalidan junto con la caché del gestor
+# y caducan a los SCHEDULE_VIEW_MAX_AGE segundos
+schedule_views = ResponseCache('horarios', max_age=SCHEDULE_VIEW_MAX_AGE)
+
+
+class ScheduleError(Exception):
+    """Error de validación, conflicto o base de datos al gestionar horarios"""
+
+
+def _hhmm(value) -> str:
+    return value.strftime('%H:%M') if isinstance(value, time) else str(value)[:5]
+
+
+def insert_blocks(cursor, blocks: List[Tuple[int, int, time, time]]):
+    """Inserta muchos bloques (id_medico, dia_semana, hora_inicio, hora_fin) de una vez.
+
+    Carga el lote en una tabla temporal con fast_executemany y lo pasa a
+    horarios_disponibles con un único INSERT ... SELECT ... OUTPUT. Los bloques
+    de médicos inexistentes no se insertan. Devuelve ({(id_medico, dia,
+    'HH:MM'): id_horario}, {ids de médicos inexistentes}). No hace commit.
+    """
+    cursor.execute("""
+        DROP TABLE IF EXISTS #horarios_lote;
+        CREATE TABLE #horarios_lote (
+            id_medico INT NOT NULL,
+            dia_semana INT NOT NULL,
+            hora_inicio TIME NOT NULL,
+            hora_fin TIME NOT NULL
+        )
+    """)
+    cursor.fast_executemany = True
+    cursor.executemany(
+        "INSERT INTO #horarios_lote (id_medico, dia_semana, hora_inicio, hora_fin) VALUES (?, ?, ?, ?)",
+        blocks
+    )
+
+    cursor.execute("""
+        SELECT DISTINCT t.id_medico
+        FROM #horarios_lote t
+        LEFT JOIN medicos m ON m.id_medico = t.id_medico
+        WHERE m.id_medico IS NULL
+    """)
+    missing = {row[0] for row in cursor.fetchall()}
+
+    cursor.execute("""
+        INSERT INTO horarios_disponibles (id_medico, dia_semana, hora_inicio, hora_fin)
+        OUTPUT INSERTED.id_horario, INSERTED.id_medico, INSERTED.dia_semana, INSERTED.hora_inicio
+        SELECT t.id_medico, t.dia_semana, t.hora_inicio, t.hora_fin
+        FROM #horarios_lote t
+        JOIN medicos m ON m.id_medico = t.id_medico
+    """)
+    # Sin solapes en el lote, (médico, día, inicio) identifica cada fila
+    created = {(row[1], int(row[2]), _hhmm(row[3])): row[0] for row in cursor.fetchall()}
+    cursor.execute("DROP TABLE IF EXISTS #horarios_lote")
+    return created, missing
+
+
+class UnitOfWork:
+    """Una conexión del pool y una transacción para toda una operación.
+
+    Los cambios al índice de horarios y a la caché se registran durante la
+    operación y solo se aplican si la transacción se confirma.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.touched_doctors = set()
+        self._after_commit = []
+
+    @contextmanager
+    def cursor(self):
+        # Sin el with del cursor pyodbc, que haría commit al salir del bloque
+        cursor = self.conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    def on_commit(self, callback):
+        self._after_commit.append(callback)
+
+    def run_after_commit(self):
+        for callback in self._after_commit:
+            callback()
+
 
 class MedicalScheduleManager:
-    def __init__(self, connection_string: str):
-        self.connection_string = connection_string
-        
-    def get_connection(self):
-        return pyodbc.connect(self.connection_string)
-    
-    def get_doctor_schedules(self, doctor_id: int) -> List[Dict]:
-        query = """
-        SELECT id_horario, id_medico, dia_semana, hora_inicio, hora_fin
-        FROM asistencia_medica_clinica.dbo.horarios_disponibles
-        WHERE id_medico = ?
-        ORDER BY dia_semana, hora_inicio
-        """
-        
+    """Servicio de horarios de larga vida.
+
+    Todas las operaciones corren dentro de unit_of_work(), que reutiliza una
+    sola conexión del pool y una transacción; las llamadas anidadas en el
+    mismo hilo comparten la unidad de trabajo exterior. Las lecturas de
+    horarios por médico pasan por una caché que se invalida en cada escritura
+    confirmada y caduca a los SCHEDULE_CACHE_TTL segundos.
+    """
+
+    def __init__(self, connection_pool=None, cache_ttl: float = SCHEDULE_CACHE_TTL):
+        self._pool = connection_pool or default_pool
+        self._cache_ttl = cache_ttl
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def unit_of_work(self):
+        current = getattr(self._local, 'uow', None)
+        if current is not None:
+            yield current
+            return
+
+        conn = self._pool.acquire()
+        uow = UnitOfWork(conn)
+        self._local.uow = uow
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, (doctor_id,))
-                
-                schedules = []
-                for row in cursor.fetchall():
-                    schedules.append({
-                        'id_horario': row.id_horario,
-                        'id_medico': row.id_medico,
-                        'dia_semana': row.dia_semana,
-                        'hora_inicio': str(row.hora_inicio),
-                        'hora_fin': str(row.hora_fin)
-                    })
-                
-                return schedules
-                
-        except Exception as e:
-            raise Exception(f"Error al obtener horarios: {str(e)}")
-    
-    def create_schedule(self, doctor_id: int, day_of_week: int, 
-                       start_time: str, end_time: str) -> int:
+            yield uow
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._local.uow = None
+            conn.close()
+
+        for doctor_id in uow.touched_doctors:
+            self.invalidate(doctor_id)
+        uow.run_after_commit()
+
+    # Caché de lectura por médico
+
+    def invalidate(self, doctor_id: Optional[int] = None):
+        """Descarta los horarios en caché (datos y vistas) de un médico o de todos"""
+        with self._cache_lock:
+            if doctor_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(int(doctor_id), None)
+        if doctor_id is None:
+            schedule_views.clear()
+        else:
+            schedule_views.invalidate(('lista', int(doctor_id)), ('semanal', int(doctor_id)))
+
+    def get_doctor_schedules(self, doctor_id: int) -> List[Dict]:
+        doctor_id = int(doctor_id)
+        with self._cache_lock:
+            cached = self._cache.get(doctor_id)
+        if cached and clock.monotonic() - cached[0] < self._cache_ttl:
+            return [dict(item) for item in cached[1]]
+
+        with self.unit_of_work() as uow:
+            with uow.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id_horario, id_medico, dia_semana, hora_inicio, hora_fin
+                    FROM horarios_disponibles
+                    WHERE id_medico = ?
+                    ORDER BY dia_semana, hora_inicio
+                """, (doctor_id,))
+                schedules = [{
+                    'id_horario': row.id_horario,
+                    'id_medico': row.id_medico,
+                    'dia_semana': int(row.dia_semana),
+                    'hora_inicio': _hhmm(row.hora_inicio),
+                    'hora_fin': _hhmm(row.hora_fin)
+                } for row in cursor.fetchall()]
+
+        with self._cache_lock:
+            self._cache[doctor_id] = (clock.monotonic(), schedules)
+        return [dict(item) for item in schedules]
+
+    def get_schedule_by_id(self, schedule_id: int) -> Optional[Dict]:
+        with self.unit_of_work() as uow:
+            with uow.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id_horario, id_medico, dia_semana, hora_inicio, hora_fin
+                    FROM horarios_disponibles
+                    WHERE id_horario = ?
+                """, (schedule_id,))
+                row = cursor.fetchone()
+
+        if row:
+            return {
+                'id_horario': row.id_horario,
+                'id_medico': row.id_medico,
+                'dia_semana': int(row.dia_semana),
+                'hora_inicio': _hhmm(row.hora_inicio),
+                'hora_fin': _hhmm(row.hora_fin)
+            }
+        return None
+
+    # Escrituras
+
+    def create_schedule(self, doctor_id: int, day_of_week: int,
+                        start_time: str, end_time: str) -> int:
         if not self._validate_schedule_input(doctor_id, day_of_week, start_time, end_time):
-            raise Exception("Datos de horario inválidos")
-        
+            raise ScheduleError("Datos de horario inválidos")
+
         if self._check_schedule_conflict(doctor_id, day_of_week, start_time, end_time):
-            raise Exception("Conflicto de horarios detectado")
-        
-        query = """
-        INSERT INTO asistencia_medica_clinica.dbo.horarios_disponibles 
-        (id_medico, dia_semana, hora_inicio, hora_fin)
-        OUTPUT INSERTED.id_horario
-        VALUES (?, ?, ?, ?)
-        """
-        
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, (doctor_id, day_of_week, start_time, end_time))
+            raise ScheduleError("Conflicto de horarios detectado")
+
+        with self.unit_of_work() as uow:
+            with uow.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO horarios_disponibles
+                    (id_medico, dia_semana, hora_inicio, hora_fin)
+                    OUTPUT INSERTED.id_horario
+                    VALUES (?, ?, ?, ?)
+                """, (doctor_id, day_of_week, start_time, end_time))
                 schedule_id = cursor.fetchone()[0]
-                conn.commit()
-                return schedule_id
-                
-        except Exception as e:
-            raise Exception(f"Error al crear horario: {str(e)}")
-    
+            uow.touched_doctors.add(int(doctor_id))
+            uow.on_commit(lambda: schedule_index.add(schedule_id, doctor_id, day_of_week,
+                                                     start_time, end_time))
+        return schedule_id
+
     def update_schedule(self, schedule_id: int, day_of_week: int = None,
-                       start_time: str = None, end_time: str = None) -> bool:
-        current_schedule = self.get_schedule_by_id(schedule_id)
-        if not current_schedule:
-            raise Exception("Horario no encontrado")
-        
-        new_day = day_of_week if day_of_week is not None else current_schedule['dia_semana']
-        new_start = start_time if start_time is not None else current_schedule['hora_inicio']
-        new_end = end_time if end_time is not None else current_schedule['hora_fin']
-        
-        if not self._validate_schedule_input(current_schedule['id_medico'], new_day, new_start, new_end):
-            raise Exception("Datos de horario inválidos")
-        
-        if self._check_schedule_conflict(current_schedule['id_medico'], new_day, 
-                                       new_start, new_end, exclude_id=schedule_id):
-            raise Exception("Conflicto de horarios detectado")
-        
-        query = """
-        UPDATE asistencia_medica_clinica.dbo.horarios_disponibles
-        SET dia_semana = ?, hora_inicio = ?, hora_fin = ?
-        WHERE id_horario = ?
-        """
-        
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, (new_day, new_start, new_end, schedule_id))
-                conn.commit()
-                return cursor.rowcount > 0
-                
-        except Exception as e:
-            raise Exception(f"Error al actualizar horario: {str(e)}")
-    
+                        start_time: str = None, end_time: str = None) -> bool:
+        # Lectura, validación y UPDATE con la misma conexión y transacción
+        with self.unit_of_work() as uow:
+            current_schedule = self.get_schedule_by_id(schedule_id)
+            if not current_schedule:
+                raise ScheduleError("Horario no encontrado")
+
+            doctor_id = current_schedule['id_medico']
+            new_day = day_of_week if day_of_week is not None else current_schedule['dia_semana']
+            new_start = start_time if start_time is not None else current_schedule['hora_inicio']
+            new_end = end_time if end_time is not None else current_schedule['hora_fin']
+
+            if not self._validate_schedule_input(doctor_id, new_day, new_start, new_end):
+                raise ScheduleError("Datos de horario inválidos")
+
+            if self._check_schedule_conflict(doctor_id, new_day, new_start, new_end,
+                                             exclude_id=schedule_id):
+                raise ScheduleError("Conflicto de horarios detectado")
+
+            with uow.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE horarios_disponibles
+                    SET dia_semana = ?, hora_inicio = ?, hora_fin = ?
+                    WHERE id_horario = ?
+                """, (new_day, new_start, new_end, schedule_id))
+                updated = cursor.rowcount > 0
+
+            if updated:
+                uow.touched_doctors.add(doctor_id)
+                uow.on_commit(lambda: schedule_index.update(schedule_id, doctor_id, new_day,
+                                                            new_start, new_end))
+        return updated
+
     def delete_schedule(self, schedule_id: int) -> bool:
-        query = """
-        DELETE FROM asistencia_medica_clinica.dbo.horarios_disponibles
-        WHERE id_horario = ?
+        with self.unit_of_work() as uow:
+            with uow.cursor() as cursor:
+                cursor.execute("""
+                    DELETE FROM horarios_disponibles
+                    OUTPUT DELETED.id_medico
+                    WHERE id_horario = ?
+                """, (schedule_id,))
+                row = cursor.fetchone()
+
+            if row:
+                uow.touched_doctors.add(row[0])
+                uow.on_commit(lambda: schedule_index.remove(schedule_id))
+        return row is not None
+
+    def create_many(self, blocks: Iterable[Tuple[int, int, str, str]]) -> List[int]:
+        """Crea varios bloques (id_medico, dia_semana, hora_inicio, hora_fin) o ninguno.
+
+        Valida todos los bloques y sus conflictos (contra lo existente y entre
+        sí) antes de escribir; devuelve los ids en el mismo orden.
         """
-        
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, (schedule_id,))
-                conn.commit()
-                return cursor.rowcount > 0
-                
-        except Exception as e:
-            raise Exception(f"Error al eliminar horario: {str(e)}")
-    
-    def get_schedule_by_id(self, schedule_id: int) -> Optional[Dict]:
-        query = """
-        SELECT id_horario, id_medico, dia_semana, hora_inicio, hora_fin
-        FROM asistencia_medica_clinica.dbo.horarios_disponibles
-        WHERE id_horario = ?
+        blocks = self._validated_blocks(blocks)
+        conflicts = schedule_index.check_many(blocks)
+        for block, found in zip(blocks, conflicts):
+            if found:
+                raise ScheduleError(f"Conflicto de horarios detectado: {block}")
+        return self._insert(blocks)
+
+    def replace_week(self, doctor_id: int, blocks: Iterable[Tuple[int, str, str]]) -> List[int]:
+        """Sustituye todo el horario semanal de un médico por blocks (dia, inicio, fin).
+
+        El borrado y las inserciones van en la misma transacción, así que el
+        médico nunca queda sin horario si algo falla.
         """
-        
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, (schedule_id,))
-                row = cursor.fetchone()
-                
-                if row:
-                    return {
-                        'id_horario': row.id_horario,
-                        'id_medico': row.id_medico,
-                        'dia_semana': row.dia_semana,
-                        'hora_inicio': str(row.hora_inicio),
-                        'hora_fin': str(row.hora_fin)
-                    }
-                return None
-                
-        except Exception as e:
-            raise Exception(f"Error al obtener horario: {str(e)}")
-    
+        doctor_id = int(doctor_id)
+        blocks = self._validated_blocks((doctor_id, day, start, end) for day, start, end in blocks)
+        # Los bloques nuevos solo pueden chocar entre sí: los actuales se borran
+        conflicts = schedule_index.check_many(blocks, ignore_existing=True)
+        for block, found in zip(blocks, conflicts):
+            if found:
+                raise ScheduleError(f"Conflicto de horarios detectado: {block}")
+
+        with self.unit_of_work() as uow:
+            with uow.cursor() as cursor:
+                cursor.execute("""
+                    DELETE FROM horarios_disponibles
+                    OUTPUT DELETED.id_horario
+                    WHERE id_medico = ?
+                """, (doctor_id,))
+                removed = [row[0] for row in cursor.fetchall()]
+            uow.touched_doctors.add(doctor_id)
+            uow.on_commit(lambda: [schedule_index.remove(schedule_id) for schedule_id in removed])
+            return self._insert(blocks) if blocks else []
+
+    def _insert(self, blocks: List[Tuple[int, int, str, str]]) -> List[int]:
+        rows = [(doctor_id, day, datetime.strptime(start, '%H:%M').time(),
+                 datetime.strptime(end, '%H:%M').time())
+                for doctor_id, day, start, end in blocks]
+        with self.unit_of_work() as uow:
+            with uow.cursor() as cursor:
+                created, missing = insert_blocks(cursor, rows)
+            if missing:
+                raise ScheduleError(f"Médicos inexistentes: {sorted(missing)}")
+
+            ids = [created[(doctor_id, day, start)] for doctor_id, day, start, _ in blocks]
+            uow.touched_doctors.update(block[0] for block in blocks)
+            uow.on_commit(lambda: [schedule_index.add(schedule_id, *block)
+                                   for schedule_id, block in zip(ids, blocks)])
+        return ids
+
+    def _validated_blocks(self, blocks) -> List[Tuple[int, int, str, str]]:
+        result = []
+        for doctor_id, day, start, end in blocks:
+            doctor_id, day, start, end = int(doctor_id), int(day), _hhmm(start), _hhmm(end)
+            if not self._validate_schedule_input(doctor_id, day, start, end):
+                raise ScheduleError(f"Datos de horario inválidos: {(doctor_id, day, start, end)}")
+            result.append((doctor_id, day, start, end))
+        return result
+
     def _validate_schedule_input(self, id_medico: int, dia_semana: int,
-                                hora_inicio: str, hora_fin: str) -> bool:
+                                 hora_inicio: str, hora_fin: str) -> bool:
         try:
             if not 1 <= dia_semana <= 7:
                 return False
-            
+
             start = datetime.strptime(hora_inicio, '%H:%M').time()
             end = datetime.strptime(hora_fin, '%H:%M').time()
-            
+
             if start >= end:
                 return False
-            
+
             if start < time(6, 0) or end > time(22, 0):
                 return False
-            
+
             return True
-            
+
         except ValueError:
             return False
-    
+
     def _check_schedule_conflict(self, id_medico: int, dia_semana: int,
-                               hora_inicio: str, hora_fin: str, 
-                               exclude_id: int = None) -> bool:
-        existing_schedules = self.get_doctor_schedules(id_medico)
-        
-        day_schedules = [s for s in existing_schedules 
-                        if s['dia_semana'] == dia_semana 
-                        and (exclude_id is None or s['id_horario'] != exclude_id)]
-        
-        new_start = datetime.strptime(hora_inicio, '%H:%M').time()
-        new_end = datetime.strptime(hora_fin, '%H:%M').time()
-        
-        for schedule in day_schedules:
-            existing_start = datetime.strptime(schedule['hora_inicio'], '%H:%M').time()
-            existing_end = datetime.strptime(schedule['hora_fin'], '%H:%M').time()
-            
-            if (new_start < existing_end and new_end > existing_start):
-                return True
-        
-        return False
+                                 hora_inicio: str, hora_fin: str,
+                                 exclude_id: int = None) -> bool:
+        return schedule_index.has_conflict(id_medico, dia_semana, hora_inicio, hora_fin, exclude_id)
+
+
+schedule_manager = MedicalScheduleManager()
@@ -1,44 +1,14 @@
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, current_app
 import pyodbc
 import logging
 from datetime import datetime, timedelta
 from database import get_db_connection
+from streaming import wants_db_json, stream_for_json
+from month_calendar import build_month_calendar
+from config import APPOINTMENT_SLOT_MINUTES
 from utils import validate_schedule_input, check_schedule_conflict
-def check_schedule_conflict(id_medico, dia_semana, hora_inicio, hora_fin, exclude_id=None):
-    """Verifica si hay conflictos de horario para el médico"""
-    conn = get_db_connection()
-    if not conn:
-        raise Exception("No se pudo conectar a la base de datos")
-
-    try:
-        with conn.cursor() as cursor:
-            query = """
-                SELECT id_horario
-                FROM horarios_disponibles
-                WHERE id_medico = ?
-                AND dia_semana = ?
-                AND (
-                    (hora_inicio < ? AND hora_fin > ?)
-                    OR (hora_inicio >= ? AND hora_inicio < ?)
-                    OR (hora_fin > ? AND hora_fin <= ?)
-                )
-            """
-            params = [id_medico, dia_semana, hora_fin, hora_inicio,
-                     hora_inicio, hora_fin, hora_inicio, hora_fin]
-
-            if exclude_id:
-                query += " AND id_horario != ?"
-                params.append(exclude_id)
-
-            cursor.execute(query, params)
-            conflict = cursor.fetchone()
-            return conflict is not None
-
-    except pyodbc.Error as e:
-        logging.error(f"Error al verificar conflicto de horario: {str(e)}")
-        raise
-    finally:
-        conn.close()
+from schedule_index import schedule_index, validate_day_of_week
+from schedule_manager import insert_blocks, schedule_manager, schedule_views
 schedules_bp = Blueprint('schedules', __name__)
 
 DAY_NAMES = {
@@ -51,18 +21,21 @@ DAY_NAMES = {
     7: 'Domingo'
 }
 
-def validate_day_of_week(day):
-    """Validate that day is an integer between 1-7"""
-    if not isinstance(day, int):
-        try:
-            day = int(day)
-        except (ValueError, TypeError):
-            return False
-    return 1 <= day <= 7
+def _json_view(body, hit):
+    """Respuesta con un cuerpo JSON ya serializado (de la caché o recién generado)"""
+    return Response(body, mimetype='application/json', headers={'X-Cache': 'HIT' if hit else 'MISS'})
 
 @schedules_bp.route('/api/horarios/<int:doctor_id>', methods=['GET'])
 def get_doctor_schedules(doctor_id):
     """Obtiene todos los horarios de un médico específico"""
+    # Los horarios cambian muy poco: la vista serializada se sirve de la caché
+    # hasta que una escritura del médico la invalida o caduca (SCHEDULE_VIEW_MAX_AGE)
+    cache_key = ('lista', doctor_id)
+    body = schedule_views.get(cache_key)
+    if body is not None:
+        return _json_view(body, hit=True)
+    generation = schedule_views.generation(cache_key)
+
     conn = get_db_connection()
     if not conn:
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
@@ -91,7 +64,9 @@ def get_doctor_schedules(doctor_id):
                     'hora_fin': str(row[4])
                 })
 
-            return jsonify(schedules)
+            body = current_app.json.dumps(schedules)
+            schedule_views.put(cache_key, body, generation)
+            return _json_view(body, hit=False)
 
     except pyodbc.Error as e:
         logging.error(f"Error al obtener horarios: {str(e)}")
@@ -150,6 +125,9 @@ def create_schedule():
 
             schedule_id = cursor.fetchone()[0]
             conn.commit()
+            schedule_index.add(schedule_id, data['id_medico'], dia_semana,
+                               data['hora_inicio'], data['hora_fin'])
+            schedule_manager.invalidate(data['id_medico'])
 
             return jsonify({
                 'id_horario': schedule_id,
@@ -165,6 +143,125 @@ def create_schedule():
     finally:
         conn.close()
 
+# Máximo de bloques aceptados en una carga masiva
+MAX_BULK_SCHEDULES = 5000
+
+def _expand_bulk_payload(data):
+    """Filas de la carga masiva: 'horarios' explícitos y/o 'plantilla' × 'medicos'"""
+    rows = list(data.get('horarios') or [])
+    template = data.get('plantilla') or []
+    for doctor_id in data.get('medicos') or []:
+        for block in template:
+            rows.append({**block, 'id_medico': doctor_id})
+    return rows
+
+@schedules_bp.route('/api/horarios/bulk', methods=['POST'])
+def create_schedules_bulk():
+    """Crea muchos horarios (p. ej. la plantilla semanal de varios médicos) en una transacción.
+
+    Cuerpo: {"horarios": [{id_medico, dia_semana, hora_inicio, hora_fin}, ...]}
+    y/o {"medicos": [ids], "plantilla": [{dia_semana, hora_inicio, hora_fin}, ...]}.
+    Con "atomico": true no se inserta nada si alguna fila es rechazada.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Se esperaba contenido tipo JSON'}), 400
+
+    rows = _expand_bulk_payload(data)
+    if not rows:
+        return jsonify({'error': 'No se enviaron horarios'}), 400
+    if len(rows) > MAX_BULK_SCHEDULES:
+        return jsonify({'error': f'Máximo {MAX_BULK_SCHEDULES} horarios por solicitud'}), 400
+
+    # Validación en memoria de cada fila
+    results = [None] * len(rows)
+    candidates = []
+    for i, row in enumerate(rows):
+        try:
+            doctor_id = int(row['id_medico'])
+            day = int(row['dia_semana'])
+            start, end = str(row['hora_inicio']), str(row['hora_fin'])
+        except (KeyError, ValueError, TypeError):
+            results[i] = {'fila': i, 'estado': 'invalido', 'detalle': 'Faltan campos o tienen formato inválido'}
+            continue
+        if not validate_day_of_week(day) or not validate_schedule_input(doctor_id, day, start, end):
+            results[i] = {'fila': i, 'estado': 'invalido', 'detalle': 'Datos de horario inválidos'}
+            continue
+        candidates.append((i, doctor_id, day, start, end))
+
+    # Conflictos contra los horarios existentes y entre las filas del lote
+    try:
+        conflicts = schedule_index.check_many([c[1:] for c in candidates])
+    except (pyodbc.Error, ConnectionError) as e:
+        logging.error(f"Error al verificar conflictos del lote: {str(e)}")
+        return jsonify({'error': 'Error al verificar conflictos de horario'}), 500
+
+    accepted = []
+    for (i, doctor_id, day, start, end), found in zip(candidates, conflicts):
+        if found:
+            results[i] = {
+                'fila': i,
+                'estado': 'conflicto',
+                'horarios_existentes': [c for c in found if not isinstance(c, tuple)],
+                'filas': [candidates[c[1]][0] for c in found if isinstance(c, tuple)]
+            }
+        else:
+            accepted.append((i, doctor_id, day,
+                             datetime.strptime(start, '%H:%M').time(),
+                             datetime.strptime(end, '%H:%M').time()))
+
+    atomic = bool(data.get('atomico'))
+    if atomic and len(accepted) < len(rows):
+        return jsonify({'creados': 0, 'rechazados': len(rows) - len(accepted),
+                        'resultados': [r or {'fila': i, 'estado': 'omitido'} for i, r in enumerate(results)]}), 400
+
+    if accepted:
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+
+        try:
+            cursor = conn.cursor()
+            try:
+                # Tabla temporal cargada con fast_executemany y un único INSERT ... OUTPUT
+                created, missing = insert_blocks(cursor, [a[1:] for a in accepted])
+                if missing:
+                    for a in accepted:
+                        if a[1] in missing:
+                            results[a[0]] = {'fila': a[0], 'estado': 'medico_inexistente'}
+                    accepted = [a for a in accepted if a[1] not in missing]
+
+                if atomic and missing:
+                    conn.rollback()
+                    accepted = []
+                else:
+                    conn.commit()
+            finally:
+                cursor.close()
+        except pyodbc.Error as e:
+            conn.rollback()
+            logging.error(f"Error en la carga masiva de horarios: {str(e)}")
+            return jsonify({'error': 'Error al crear horarios en la base de datos', 'detalle': str(e)}), 500
+        finally:
+            conn.close()
+
+        for doctor_id in {a[1] for a in accepted}:
+            schedule_manager.invalidate(doctor_id)
+        for i, doctor_id, day, start, end in accepted:
+            schedule_id = created.get((doctor_id, day, start.strftime('%H:%M')))
+            results[i] = {'fila': i, 'estado': 'creado', 'id_horario': schedule_id}
+            if schedule_id is not None:
+                schedule_index.add(schedule_id, doctor_id, day, start, end)
+
+    created_count = sum(1 for r in results if r and r['estado'] == 'creado')
+    if atomic and created_count < len(rows):
+        results = [r or {'fila': i, 'estado': 'omitido'} for i, r in enumerate(results)]
+    return jsonify({
+        'creados': created_count,
+        'rechazados': len(rows) - created_count,
+        'resultados': results
+    }), 201 if created_count else 400
+
 # ... (rest of your routes remain the same, just ensure they use validate_day_of_week)
 
 @schedules_bp.route('/api/horarios/<int:schedule_id>', methods=['PUT'])
@@ -290,6 +387,9 @@ def update_schedule(schedule_id):
             conn.commit()
 
             if cursor.rowcount > 0:
+                schedule_index.update(schedule_id, current_doctor_id, updated_values['dia_semana'],
+                                      updated_values['hora_inicio'], updated_values['hora_fin'])
+                schedule_manager.invalidate(current_doctor_id)
                 return jsonify({
                     'message': 'Horario actualizado correctamente',
                     'horario': {
@@ -322,12 +422,16 @@ def delete_schedule(schedule_id):
         with conn.cursor() as cursor:
             cursor.execute("""
                 DELETE FROM horarios_disponibles
+                OUTPUT DELETED.id_medico
                 WHERE id_horario = ?
             """, (schedule_id,))
+            deleted = cursor.fetchone()
 
             conn.commit()
 
-            if cursor.rowcount > 0:
+            if deleted:
+                schedule_index.remove(schedule_id)
+                schedule_manager.invalidate(deleted[0])
                 return jsonify({'message': 'Horario eliminado correctamente'})
             else:
                 return jsonify({'error': 'Horario no encontrado'}), 404
@@ -342,11 +446,36 @@ def delete_schedule(schedule_id):
 @schedules_bp.route('/api/horarios/<int:doctor_id>/semanal', methods=['GET'])
 def get_weekly_schedule(doctor_id):
     """Obtiene el horario semanal organizado por día"""
+    db_json = wants_db_json(request)
+    cache_key = ('semanal', doctor_id)
+    if not db_json:
+        body = schedule_views.get(cache_key)
+        if body is not None:
+            return _json_view(body, hit=True)
+    generation = schedule_views.generation(cache_key)
+
     conn = get_db_connection()
     if not conn:
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
 
     try:
+        if db_json:
+            # Un arreglo por día (1-7) generado por SQL Server; [] si no hay horarios
+            day_columns = ',\n'.join(f"""
+                    JSON_QUERY(ISNULL((
+                        SELECT id_horario,
+                               CONVERT(varchar(8), hora_inicio, 108) AS hora_inicio,
+                               CONVERT(varchar(8), hora_fin, 108) AS hora_fin
+                        FROM horarios_disponibles
+                        WHERE id_medico = ? AND dia_semana = {day}
+                        ORDER BY hora_inicio
+                        FOR JSON PATH
+                    ), '[]')) AS [{day}]""" for day in range(1, 8))
+            return stream_for_json(conn, f"""
+                SELECT {day_columns}
+                FOR JSON PATH, WITHOUT_ARRAY_WRAPPER
+            """, [doctor_id] * 7)
+
         with conn.cursor() as cursor:
             cursor.execute("""
                 SELECT id_horario, dia_semana, hora_inicio, hora_fin
@@ -367,7 +496,9 @@ def get_weekly_schedule(doctor_id):
                         'hora_fin': str(schedule[3])
                     })
 
-            return jsonify(weekly_schedule)
+            body = current_app.json.dumps(weekly_schedule)
+            schedule_views.put(cache_key, body, generation)
+            return _json_view(body, hit=False)
 
     except (pyodbc.Error, ValueError) as e:
         logging.error(f"Error al obtener horario semanal: {str(e)}")
@@ -375,6 +506,62 @@ def get_weekly_schedule(doctor_id):
     finally:
         conn.close()
 
+@schedules_bp.route('/api/horarios/calendario', methods=['GET'])
+def get_month_calendar():
+    """Ocupación del mes (médico × día × franja) de los médicos activos"""
+    try:
+        month = datetime.strptime(request.args.get('mes') or datetime.today().strftime('%Y-%m'), '%Y-%m')
+    except ValueError:
+        return jsonify({'error': 'Mes inválido, use el formato YYYY-MM'}), 400
+
+    duration_minutes = request.args.get('duracion', default=APPOINTMENT_SLOT_MINUTES, type=int)
+    if not duration_minutes or duration_minutes < 0 or (24 * 60) % duration_minutes:
+        return jsonify({'error': 'La duración debe ser positiva y dividir el día en franjas exactas'}), 400
+
+    first_day = month.date()
+    next_month = (first_day + timedelta(days=32)).replace(day=1)
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT m.id_medico, m.nombre_completo, m.especialidad,
+                       h.dia_semana, h.hora_inicio, h.hora_fin
+                FROM medicos m
+                LEFT JOIN horarios_disponibles h ON h.id_medico = m.id_medico
+                WHERE m.estado = 'A'
+                ORDER BY m.nombre_completo, m.id_medico
+            """)
+            doctors = {}
+            blocks = []
+            for row in cursor.fetchall():
+                doctors.setdefault(row[0], {'nombre_completo': row[1], 'especialidad': row[2]})
+                if row[3] is not None:
+                    blocks.append((row[0], row[3], row[4], row[5]))
+
+            cursor.execute("""
+                SELECT c.id_medico, c.fecha_cita, c.hora_cita
+                FROM citas c
+                JOIN medicos m ON m.id_medico = c.id_medico
+                WHERE m.estado = 'A' AND c.fecha_cita >= ? AND c.fecha_cita < ?
+            """, (first_day, next_month))
+            citas = cursor.fetchall()
+
+        month_calendar = build_month_calendar(
+            list(doctors), blocks, citas, first_day.year, first_day.month,
+            slot_minutes=duration_minutes
+        )
+        return jsonify(month_calendar.to_dict(doctors))
+
+    except pyodbc.Error as e:
+        logging.error(f"Error al obtener calendario mensual: {str(e)}")
+        return jsonify({'error': 'Error al obtener calendario mensual'}), 500
+    finally:
+        conn.close()
+
 @schedules_bp.route('/api/horarios/<int:doctor_id>/slots', methods=['GET'])
 def get_available_time_slots(doctor_id):
     """Obtiene slots de tiempo disponibles para un médico en un día específico"""
@@ -0,0 +1,73 @@
+import logging
+import threading
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaCache:
+    """Caché de metadatos de columnas de todas las tablas de la base de datos.
+
+    Se carga con una sola consulta a INFORMATION_SCHEMA.COLUMNS la primera vez
+    que se usa y se mantiene en memoria hasta que se llame a refresh(). Así los
+    blueprints pueden decidir la forma de sus sentencias sin consultar el
+    catálogo en cada escritura.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._columns = None
+
+    def has_column(self, table, column, conn=None):
+        """Indica si la tabla tiene la columna (sin distinguir mayúsculas)"""
+        return column.lower() in self.columns(table, conn)
+
+    def columns(self, table, conn=None):
+        """Diccionario columna -> tipo de dato de la tabla indicada"""
+        columns = self._columns
+        if columns is None:
+            columns = self.refresh(conn)
+        return columns.get(table.lower(), {})
+
+    def tables(self, conn=None):
+        columns = self._columns
+        if columns is None:
+            columns = self.refresh(conn)
+        return sorted(columns)
+
+    def refresh(self, conn=None):
+        """Recarga los metadatos; usa la conexión dada o toma una del pool"""
+        with self._lock:
+            own_conn = conn is None
+            if own_conn:
+                conn = get_db_connection()
+                if not conn:
+                    raise ConnectionError("No se pudo conectar a la base de datos")
+
+            try:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("""
+                        SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE
+                        FROM INFORMATION_SCHEMA.COLUMNS
+                        WHERE TABLE_SCHEMA = 'dbo'
+                    """)
+                    columns = {}
+                    for table_name, column_name, data_type in cursor.fetchall():
+                        columns.setdefault(table_name.lower(), {})[column_name.lower()] = data_type
+                finally:
+                    cursor.close()
+            finally:
+                if own_conn:
+                    conn.close()
+
+            self._columns = columns
+            logger.info(f"Metadatos de esquema cargados: {len(columns)} tablas")
+            return columns
+
+    def invalidate(self):
+        """Descarta los metadatos; se recargarán en el próximo uso"""
+        self._columns = None
+
+
+schema_cache = SchemaCache()
@@ -19,9 +19,16 @@ $(document).ready(function() {
             // 2. Inicializar DataTable con configuración mejorada
             const initializeDataTable = () => {
                 const table = $('#medicosTable').DataTable({
+                    // Paginación, orden y búsqueda en el servidor: solo viaja la página visible
+                    serverSide: true,
                     ajax: {
-                        url: '/api/medicos',
-                        dataSrc: '',
+                        url: '/api/medicos/datatables',
+                        data: function(d) {
+                            // Filtros propios: en modo server-side se aplican en el servidor
+                            d.especialidad = $('#filterEspecialidad').val() || '';
+                            d.estado = $('#filterEstado').val() || '';
+                        },
+                        dataSrc: 'data',
                         error: (xhr, error, thrown) => {
                             console.error('Error al cargar datos:', error);
                             showAlert('Error al cargar la lista de médicos', 'danger');
@@ -120,7 +127,7 @@ $(document).ready(function() {
                     },
                     drawCallback: function() {
                         const api = this.api();
-                        $('#totalMedicos').text(`${api.rows().count()} médicos`);
+                        $('#totalMedicos').text(`${api.page.info().recordsDisplay} médicos`);
                     }
                 });
 
@@ -129,28 +136,9 @@ $(document).ready(function() {
 
             // 3. Configurar filtros para DataTable
             const setupFilters = (table) => {
-                $('#filterEspecialidad').change(function() {
-                    const value = this.value;
-                    if (value === '') {
-                        table.column(2).search('').draw();
-                    } else {
-                        table.column(2).search(value, false, true, true).draw(); // Case insensitive
-                    }
-                });
-
-                $('#filterEstado').change(function() {
-                    const value = this.value;
-                    if (value === '') {
-                        table.column(5).search('').draw();
-                    } else if (value === 'A') {
-                        // Filter for active by searching exact rendered text 'Activo' with regex
-                        table.column(5).search('^Activo$', true, false).draw();
-                    } else if (value === 'I') {
-                        // Filter for inactive by searching rendered text 'Inactivo'
-                        table.column(5).search('Inactivo', false, true, true).draw();
-                    } else {
-                        table.column(5).search(value, false, true, true).draw(); // Case insensitive fallback
-                    }
+                // Especialidad y estado viajan como parámetros en ajax.data
+                $('#filterEspecialidad, #filterEstado').change(function() {
+                    table.draw();
                 });
 
                 $('#filterSearch').keyup(function() {
@@ -160,7 +148,7 @@ $(document).ready(function() {
                 $('#btnClearFilters').click(function() {
                     $('#filterEspecialidad, #filterEstado').val('');
                     $('#filterSearch').val('');
-                    table.search('').columns().search('').draw();
+                    table.search('').draw();
                 });
             };
 
@@ -29,16 +29,18 @@ $(document).ready(function() {
             
             // Inicializar DataTable con la estructura correcta de tu API
             table = $('#pacientesTable').DataTable({
+                // Paginación, orden y búsqueda en el servidor: solo viaja la página visible
+                serverSide: true,
                 ajax: {
-                    url: '/api/pacientes/detallados',
+                    url: '/api/pacientes/datatables',
                     data: function(d) {
-                        // Agregar filtros personalizados
+                        // Agregar filtros personalizados (d.search es la búsqueda propia de DataTables)
                         d.estado = currentFilters.estado || '';
-                        d.search = currentFilters.search || '';
+                        d.busqueda = currentFilters.search || '';
                         d.fecha_desde = currentFilters.fecha_desde || '';
                         d.fecha_hasta = currentFilters.fecha_hasta || '';
                     },
-                    dataSrc: '',
+                    dataSrc: 'data',
                     error: function(xhr, error, thrown) {
                         hideLoading();
                         showAlert('Error al cargar los datos de pacientes', 'danger');
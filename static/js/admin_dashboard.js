@@ -1,15 +1,30 @@
 document.addEventListener('DOMContentLoaded', function() {
-            // Cargar datos del usuario
-            fetch('/api/user-data')
+            // Datos iniciales del panel en un solo viaje al servidor
+            const datosIniciales = fetch('/api/batch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    requests: [
+                        { id: 'usuario', path: '/api/user-data' },
+                        { id: 'stats', path: '/api/admin/stats' },
+                        { id: 'actividad', path: '/api/admin/recent-activity' }
+                    ]
+                })
+            })
                 .then(response => response.json())
+                .then(data => Object.fromEntries(data.responses.map(r => [r.id, r.body])));
+
+            // Cargar datos del usuario
+            datosIniciales
+                .then(datos => datos.usuario)
                 .then(data => {
                     document.getElementById('username').textContent = data.nombre;
                     document.getElementById('userrole').textContent = data.rol;
                 });
             
             // Cargar estadísticas
-            fetch('/api/admin/stats')
-                .then(response => response.json())
+            datosIniciales
+                .then(datos => datos.stats)
                 .then(stats => {
                     const statsContainer = document.getElementById('stats-container');
                     const statsData = [
@@ -60,8 +75,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 });
             
             // Cargar actividad reciente
-            fetch('/api/admin/recent-activity')
-                .then(response => response.json())
+            datosIniciales
+                .then(datos => datos.actividad)
                 .then(activity => {
                     const tableBody = document.querySelector('#recent-records tbody');
                     tableBody.innerHTML = '';
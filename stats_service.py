@@ -0,0 +1,49 @@
+from reference_cache import ReferenceCache
+from config import DASHBOARD_STATS_TTL
+
+# Todos los contadores en una sola sentencia (un viaje a la base de datos).
+# Cada subconsulta tiene un filtro que SQL Server resuelve con un índice: los
+# rangos de fecha comparan la columna tal cual, sin CONVERT sobre ella.
+COUNTERS_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM medicos WHERE estado = 'A'),
+        (SELECT COUNT(*) FROM pacientes),
+        (SELECT COUNT(*) FROM pacientes WHERE estado = 'A'),
+        (SELECT COUNT(*) FROM pacientes
+         WHERE fecha_creacion >= DATEADD(month, DATEDIFF(month, 0, GETDATE()), 0)),
+        (SELECT COUNT(*) FROM citas
+         WHERE fecha_cita >= CAST(GETDATE() AS date)
+           AND fecha_cita < DATEADD(day, 1, CAST(GETDATE() AS date))),
+        (SELECT COUNT(*) FROM usuarios)
+"""
+
+
+def _load_counters(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(COUNTERS_QUERY)
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    return {
+        'doctors': row[0],
+        'patients': row[1],
+        'active_patients': row[2],
+        'new_patients_this_month': row[3],
+        'appointments_today': row[4],
+        'users': row[5]
+    }
+
+
+# Los contadores se sirven desde memoria durante DASHBOARD_STATS_TTL segundos;
+# las altas y bajas de médicos y pacientes los invalidan.
+stats_cache = ReferenceCache('dashboard_stats', _load_counters, ttl=DASHBOARD_STATS_TTL)
+
+
+def counters():
+    """Par (contadores, etag) del panel de administración"""
+    return stats_cache.entry()
+
+
+def invalidate():
+    stats_cache.invalidate()
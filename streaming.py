@@ -0,0 +1,148 @@
+import json
+import logging
+import pyodbc
+from flask import Response, stream_with_context
+from config import STREAM_BATCH_SIZE, DB_JSON_PASSTHROUGH
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def stream_format(request):
+    """Formato de streaming pedido por el cliente: None, 'json' o 'ndjson'.
+
+    Se activa con ?stream=1 (arreglo JSON), ?stream=ndjson o con la cabecera
+    Accept: application/x-ndjson.
+    """
+    value = (request.args.get('stream') or '').lower()
+    if value == 'ndjson' or NDJSON_MIMETYPE in request.headers.get('Accept', ''):
+        return 'ndjson'
+    if value in ('1', 'true', 'json'):
+        return 'json'
+    return None
+
+
+def wants_db_json(request):
+    """Modo en que SQL Server genera el JSON (FOR JSON PATH).
+
+    Se activa por petición con ?db_json=1 o para todos los endpoints que lo
+    soportan con la variable de entorno DB_JSON_PASSTHROUGH.
+    """
+    value = request.args.get('db_json')
+    if value is not None:
+        return value.lower() in ('1', 'true')
+    return DB_JSON_PASSTHROUGH
+
+
+def _dumps(item):
+    return json.dumps(item, ensure_ascii=False, default=str)
+
+
+def stream_query(conn, query, params, formatter, fmt='json', batch_size=None):
+    """Ejecuta la consulta y devuelve una respuesta que escribe las filas por lotes.
+
+    La consulta se ejecuta antes de devolver la respuesta, de modo que los
+    errores de base de datos siguen llegando al except del endpoint. Las
+    filas se leen con fetchmany y se serializan una a una, así que la memoria
+    no crece con el tamaño del resultado. La respuesta toma un préstamo de la
+    conexión (retain) y la devuelve al pool cuando termina de escribirse, por
+    lo que el endpoint puede cerrar su referencia normalmente.
+    """
+    batch_size = batch_size or STREAM_BATCH_SIZE
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+    except pyodbc.Error:
+        cursor.close()
+        raise
+    conn.retain()
+    state = {'closed': False}
+
+    def cleanup():
+        if not state['closed']:
+            state['closed'] = True
+            cursor.close()
+            conn.close()
+
+    def generate():
+        count = 0
+        try:
+            if fmt == 'json':
+                yield '['
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if fmt == 'json':
+                    chunk = ','.join(_dumps(formatter(row)) for row in rows)
+                    yield (',' + chunk) if count else chunk
+                else:
+                    yield ''.join(_dumps(formatter(row)) + '\n' for row in rows)
+                count += len(rows)
+            if fmt == 'json':
+                yield ']'
+        except pyodbc.Error as e:
+            # Las cabeceras ya se enviaron: solo queda cortar la respuesta
+            logger.error(f"Error en base de datos durante el streaming: {str(e)}")
+            raise
+        finally:
+            cleanup()
+
+    mimetype = 'application/json' if fmt == 'json' else NDJSON_MIMETYPE
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    # Si el cliente corta antes de empezar a leer, el generador nunca corre
+    response.call_on_close(cleanup)
+    return response
+
+
+def stream_for_json(conn, query, params, single=False, batch_size=None):
+    """Envía tal cual el JSON que produce una consulta FOR JSON PATH.
+
+    SQL Server devuelve el documento partido en varias filas de una sola
+    columna; los fragmentos se escriben directamente en la respuesta sin
+    crear filas ni diccionarios en Python. Con single=True la consulta debe
+    usar WITHOUT_ARRAY_WRAPPER y se devuelve None si no hubo resultado, para
+    que el endpoint responda 404. Un arreglo vacío se responde como [].
+    """
+    batch_size = batch_size or STREAM_BATCH_SIZE
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        first = [row[0] for row in cursor.fetchmany(batch_size) if row[0]]
+    except pyodbc.Error:
+        cursor.close()
+        raise
+
+    if not first:
+        cursor.close()
+        if single:
+            return None
+        return Response('[]', mimetype='application/json')
+
+    conn.retain()
+    state = {'closed': False}
+
+    def cleanup():
+        if not state['closed']:
+            state['closed'] = True
+            cursor.close()
+            conn.close()
+
+    def generate():
+        try:
+            yield ''.join(first)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield ''.join(row[0] for row in rows if row[0])
+        except pyodbc.Error as e:
+            logger.error(f"Error en base de datos durante el streaming: {str(e)}")
+            raise
+        finally:
+            cleanup()
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    response.call_on_close(cleanup)
+    return response
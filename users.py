@@ -3,7 +3,14 @@ import pyodbc
 import logging
 import secrets
 import smtplib
-from database import get_db_connection
+from database import get_db_connection, is_unique_violation, PoolTimeoutError
+from streaming import stream_format, stream_query
+from activity import activity_log
+from fanout import fan_out
+from datatables import datatables_page
+from pagination import (
+    is_keyset_request, parse_keyset_args, fetch_page_with_total, InvalidCursorError
+)
 from werkzeug.security import generate_password_hash, check_password_hash
 import re  # For email validation
 from datetime import datetime, timedelta
@@ -52,9 +59,27 @@ def validate_user_data(data, is_update=False):
 
     return None
 
+def format_user(user):
+    return {
+        'id_usuario': user[0],
+        'nombre_completo': user[1],
+        'usuario_login': user[2],
+        'cedula': user[3],
+        'telefono': user[4],
+        'gmail': user[5],
+        'id_rol': user[6],
+        'activo': bool(user[7])  # Convertir a booleano
+    }
+
 # Obtener lista de usuarios
 @users_bp.route('/api/users', methods=['GET'])
 def get_users():
+    """Lista usuarios paginados.
+
+    Con limit/cursor usa paginación keyset sobre (nombre_completo, id_usuario)
+    y devuelve next_cursor; sin ellos mantiene la paginación por page/per_page.
+    Con ?stream=1 o ?stream=ndjson escribe todos los usuarios filtrados por lotes.
+    """
     # Parámetros de paginación y filtrado
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
@@ -66,10 +91,7 @@ def get_users():
     if not conn:
         return jsonify({'error': 'Error de conexión a la base de datos'}), 500
 
-    cursor = None
     try:
-        cursor = conn.cursor()
-
         # Construir consulta base
         query = """
             SELECT id_usuario, nombre_completo, usuario_login, cedula, telefono, gmail, id_rol, activo
@@ -92,32 +114,55 @@ def get_users():
             query += " AND activo = ?"
             params.append(bool(status))
 
-        # Contar total de registros
-        count_query = f"SELECT COUNT(*) FROM ({query}) AS total"
-        cursor.execute(count_query, params)
-        total_users = cursor.fetchone()[0]
+        fmt = stream_format(request)
+        if fmt:
+            return stream_query(conn, query + " ORDER BY nombre_completo", params, format_user, fmt)
 
-        # Aplicar paginación
-        query += " ORDER BY nombre_completo OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
-        params.extend([(page - 1) * per_page, per_page])
+        if is_keyset_request(request.args):
+            limit, after, count_mode = parse_keyset_args(request.args)
+            filtered = bool(search) or role_id is not None or status is not None
 
-        cursor.execute(query, params)
-        users = cursor.fetchall()
+            users, next_cursor, total, total_exact = fetch_page_with_total(
+                conn, query, params, 'nombre_completo', 'id_usuario', 1, 0, after, limit,
+                'usuarios', count_mode, filtered
+            )
 
-        # Formatear resultados
-        users_list = []
-        for user in users:
-            users_list.append({
-                'id_usuario': user[0],
-                'nombre_completo': user[1],
-                'usuario_login': user[2],
-                'cedula': user[3],
-                'telefono': user[4],
-                'gmail': user[5],
-                'id_rol': user[6],
-                'activo': bool(user[7])  # Convertir a booleano
+            return jsonify({
+                'users': [format_user(user) for user in users],
+                'per_page': limit,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None,
+                'total': total,
+                'total_exact': total_exact
             })
 
+        # Página y total de registros en paralelo (el total corre en otra conexión)
+        def fetch_page(c):
+            page_cursor = c.cursor()
+            try:
+                page_cursor.execute(
+                    query + " ORDER BY nombre_completo OFFSET ? ROWS FETCH NEXT ? ROWS ONLY",
+                    params + [(page - 1) * per_page, per_page]
+                )
+                return page_cursor.fetchall()
+            finally:
+                page_cursor.close()
+
+        def fetch_total(c):
+            count_cursor = c.cursor()
+            try:
+                count_cursor.execute(f"SELECT COUNT(*) FROM ({query}) AS total", params)
+                return count_cursor.fetchone()[0]
+            finally:
+                count_cursor.close()
+
+        result = fan_out({'page': fetch_page, 'total': fetch_total}, conn=conn, required=('total',))
+        users = result.values['page']
+        total_users = result.values['total']
+
+        # Formatear resultados
+        users_list = [format_user(user) for user in users]
+
         return jsonify({
             'users': users_list,
             'total': total_users,
@@ -126,6 +171,8 @@ def get_users():
             'total_pages': (total_users + per_page - 1) // per_page
         })
 
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except pyodbc.Error as e:
         logging.error(f"Database error in get_users: {str(e)}")
         return jsonify({'error': 'Error al obtener usuarios', 'details': str(e)}), 500
@@ -133,11 +180,64 @@ def get_users():
         logging.error(f"Unexpected error in get_users: {str(e)}")
         return jsonify({'error': 'Error inesperado al obtener usuarios'}), 500
     finally:
-        if cursor:
-            cursor.close()
         if conn:
             conn.close()
 
+# Columnas de la tabla de usuarios que el cliente puede ordenar
+USERS_ORDERABLE = {
+    'id_usuario': 'id_usuario',
+    'nombre_completo': 'nombre_completo',
+    'usuario_login': 'usuario_login',
+    'cedula': 'cedula',
+    'id_rol': 'id_rol',
+    'activo': 'activo'
+}
+
+# Listado de usuarios en modo server-side de DataTables
+@users_bp.route('/api/users/datatables', methods=['GET'])
+def get_users_datatables():
+    """Página de usuarios con el protocolo de DataTables (draw/start/length).
+
+    La búsqueda es por prefijo del nombre, del login o de la cédula; role_id y status filtran igual que en /api/users.
+    """
+    role_id = request.args.get('role_id', type=int)
+    status = request.args.get('status', type=int)  # 1=activo, 0=inactivo
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'Error de conexión a la base de datos'}), 500
+
+    try:
+        query = """
+            SELECT id_usuario, nombre_completo, usuario_login, cedula, telefono, gmail, id_rol, activo
+            FROM usuarios
+            WHERE 1=1
+        """
+        params = []
+
+        if role_id is not None:
+            query += " AND id_rol = ?"
+            params.append(role_id)
+
+        if status is not None:
+            query += " AND activo = ?"
+            params.append(bool(status))
+
+        return jsonify(datatables_page(
+            conn, request.args, query, params, 'usuarios',
+            role_id is not None or status is not None,
+            ['nombre_completo', 'usuario_login', 'cedula'], USERS_ORDERABLE,
+            'id_usuario', 'nombre_completo', format_user
+        ))
+    except (TimeoutError, PoolTimeoutError, ConnectionError) as e:
+        logging.error(f"Timeout in get_users_datatables: {str(e)}")
+        return jsonify({'error': 'Error al obtener usuarios'}), 500
+    except pyodbc.Error as e:
+        logging.error(f"Database error in get_users_datatables: {str(e)}")
+        return jsonify({'error': 'Error al obtener usuarios'}), 500
+    finally:
+        conn.close()
+
 # Obtener un usuario específico
 @users_bp.route('/api/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
@@ -212,21 +312,14 @@ def create_user():
     try:
         cursor = conn.cursor()
 
-        # Verificar si el usuario o cédula ya existen
-        cursor.execute("""
-            SELECT 1 FROM usuarios 
-            WHERE usuario_login = ? OR cedula = ?
-        """, (data['usuario_login'], data['cedula']))
-
-        if cursor.fetchone():
-            return jsonify({'error': 'El nombre de usuario o cédula ya están en uso'}), 400
-
-        # Insertar nuevo usuario
+        # Insertar nuevo usuario; usuario_login y cédula duplicados los rechazan
+        # las restricciones únicas y OUTPUT devuelve el id en la misma sentencia
         cursor.execute("""
             INSERT INTO usuarios (
                 nombre_completo, usuario_login, contraseña, id_rol, 
                 cedula, telefono, gmail, activo
             )
+            OUTPUT INSERTED.id_usuario
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             data['nombre_completo'],
@@ -238,12 +331,9 @@ def create_user():
             data.get('gmail'),
             bool(data.get('activo', True))  # Por defecto activo
         ))
-
-        conn.commit()
-
-        # Obtener ID del nuevo usuario
-        cursor.execute("SELECT SCOPE_IDENTITY()")
         new_user_id = cursor.fetchone()[0]
+        conn.commit()
+        activity_log.record('Usuario', 'creado', new_user_id, data['nombre_completo'])
 
         return jsonify({
             'message': 'Usuario creado exitosamente',
@@ -252,6 +342,8 @@ def create_user():
 
     except pyodbc.Error as e:
         conn.rollback()
+        if is_unique_violation(e):
+            return jsonify({'error': 'El nombre de usuario o cédula ya están en uso'}), 400
         logging.error(f"Database error in create_user: {str(e)}")
         return jsonify({'error': 'Error al crear el usuario', 'details': str(e)}), 500
     except Exception as e:
@@ -300,32 +392,6 @@ def update_user(user_id):
     try:
         cursor = conn.cursor()
 
-        # Verificar si el usuario existe
-        cursor.execute("SELECT usuario_login, cedula FROM usuarios WHERE id_usuario = ?", (user_id,))
-        existing_user = cursor.fetchone()
-        
-        if not existing_user:
-            logging.error(f"Usuario con ID {user_id} no encontrado")
-            return jsonify({'error': 'Usuario no encontrado'}), 404
-
-        current_username, current_cedula = existing_user
-
-        # Verificar si el nuevo usuario_login o cédula ya están en uso por otro usuario
-        if ('usuario_login' in data and data['usuario_login'] != current_username) or \
-           ('cedula' in data and data['cedula'] != current_cedula):
-            
-            cursor.execute("""
-                SELECT 1 FROM usuarios 
-                WHERE id_usuario != ? AND (usuario_login = ? OR cedula = ?)
-            """, (user_id, 
-                 data.get('usuario_login', current_username), 
-                 data.get('cedula', current_cedula)))
-
-            if cursor.fetchone():
-                error_msg = 'El nombre de usuario o cédula ya están en uso por otro usuario'
-                logging.error(error_msg)
-                return jsonify({'error': error_msg}), 400
-
         # Construir consulta de actualización
         update_fields = []
         params = []
@@ -379,12 +445,24 @@ def update_user(user_id):
 
         logging.info(f"Ejecutando consulta: {update_query} con parámetros: {params}")
         cursor.execute(update_query, params)
+
+        # Sin filas afectadas: el usuario no existe
+        if cursor.rowcount == 0:
+            logging.error(f"Usuario con ID {user_id} no encontrado")
+            return jsonify({'error': 'Usuario no encontrado'}), 404
+
         conn.commit()
+        activity_log.record('Usuario', 'actualizado', user_id, data.get('nombre_completo'))
 
         return jsonify({'message': 'Usuario actualizado exitosamente'})
 
     except pyodbc.Error as e:
         conn.rollback()
+        if is_unique_violation(e):
+            # usuario_login o cédula ya en uso por otro usuario
+            error_msg = 'El nombre de usuario o cédula ya están en uso por otro usuario'
+            logging.error(error_msg)
+            return jsonify({'error': error_msg}), 400
         error_msg = f"Database error in update_user: {str(e)}"
         logging.error(error_msg)
         return jsonify({
@@ -429,6 +507,7 @@ def delete_user(user_id):
         """, (user_id,))
 
         conn.commit()
+        activity_log.record('Usuario', 'desactivado', user_id)
 
         return jsonify({'message': 'Usuario desactivado exitosamente'})
 
@@ -1,7 +1,7 @@
 from datetime import datetime, time, timedelta
 import pyodbc
 import logging
-from database import get_db_connection
+from schedule_index import schedule_index
 
 def validate_schedule_input(doctor_id: int, day_of_week: int, start_time: str, end_time: str) -> bool:
     """Valida los parámetros de entrada para horarios"""
@@ -27,34 +27,9 @@ def validate_schedule_input(doctor_id: int, day_of_week: int, start_time: str, e
         return False
 
 def check_schedule_conflict(doctor_id, dia_semana, hora_inicio, hora_fin, exclude_id=None):
-    """Check if a schedule conflicts with existing schedules"""
-    conn = get_db_connection()
-    if not conn:
-        return True  # Assume conflict if we can't check
-    
+    """Check if a schedule conflicts with existing schedules (índice en memoria)"""
     try:
-        with conn.cursor() as cursor:
-            query = """
-                SELECT COUNT(*) 
-                FROM horarios_disponibles
-                WHERE id_medico = ? 
-                AND dia_semana = ? 
-                AND (
-                    (? < hora_fin AND ? > hora_inicio)
-                )
-            """
-            params = [doctor_id, int(dia_semana), hora_inicio, hora_fin]
-            
-            if exclude_id:
-                query += " AND id_horario != ?"
-                params.append(exclude_id)
-            
-            cursor.execute(query, params)
-            count = cursor.fetchone()[0]
-            return count > 0
-            
-    except pyodbc.Error as e:
+        return schedule_index.has_conflict(doctor_id, dia_semana, hora_inicio, hora_fin, exclude_id)
+    except (pyodbc.Error, ConnectionError) as e:
         logging.error(f"Error verificando conflictos: {str(e)}")
-        return True  # Assume conflict if error occurs
-    finally:
-        conn.close()
\ No newline at end of file
+        return True  # Assume conflict if error occurs
\ No newline at end of file
@@ -1,6 +1,6 @@
 from datetime import datetime, time
 import logging
-from database import get_db_connection
+from schedule_index import schedule_index
 import pyodbc
 
 logger = logging.getLogger(__name__)
@@ -29,32 +29,9 @@ def validate_schedule_input(id_medico, dia_semana, hora_inicio, hora_fin):
         return False
 
 def check_schedule_conflict(id_medico, dia_semana, hora_inicio, hora_fin, exclude_id=None):
-    """Verifica si hay conflictos de horario para el médico"""
-    conn = get_db_connection()
-    if not conn:
-        return True  # Asumir conflicto si no podemos verificar
-        
+    """Verifica si hay conflictos de horario para el médico (índice en memoria)"""
     try:
-        with conn.cursor() as cursor:
-            query = """
-                SELECT id_horario 
-                FROM horarios_disponibles
-                WHERE id_medico = ? AND dia_semana = ?
-                AND (
-                    (? < hora_fin AND ? > hora_inicio)
-                )
-            """
-            params = [id_medico, dia_semana, hora_inicio, hora_fin]
-            
-            if exclude_id:
-                query += " AND id_horario != ?"
-                params.append(exclude_id)
-                
-            cursor.execute(query, params)
-            return cursor.fetchone() is not None
-            
-    except pyodbc.Error as e:
+        return schedule_index.has_conflict(id_medico, dia_semana, hora_inicio, hora_fin, exclude_id)
+    except (pyodbc.Error, ConnectionError) as e:
         logger.error(f"Error al verificar conflicto de horario: {str(e)}")
-        return True
-    finally:
-        conn.close()
\ No newline at end of file
+        return True  # Asumir conflicto si no podemos verificar
\ No newline at end of file